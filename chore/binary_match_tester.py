@@ -1,5 +1,13 @@
 import os
 from utils.binary_matcher import BinaryMatcher
+from utils.evidence_verifier import (
+    BLANK,
+    ERROR,
+    MISMATCHED,
+    REPORT_FILE,
+    save_report,
+    verify_evidence,
+)
 import tkinter as tk
 from tkinter import filedialog
 
@@ -14,75 +22,59 @@ def select_torrent_file(title=None):
     return source_file
 
 
-# 検証したいDL対象ファイル本体と、DL元になったtorrentファイルが存在するフォルダの選択
-source_file = select_torrent_file("ダウンロード元になったtorrentファイルを選択")
-
-if source_file:
-    source_folder = source_folder = os.path.dirname(source_file)
-    # source_folderの下の.binファイルを含むすべてのサブフォルダのリスト
-    sub_folders = [
-        os.path.join(source_folder, d)
-        for d in os.listdir(source_folder)
-        if os.path.isdir(os.path.join(source_folder, d))
-    ]
-    piece_folders_list = [
-        f for f in sub_folders if any(fn.endswith(".bin") for fn in os.listdir(f))
-    ]
-
-    if not piece_folders_list:
-        print("マッチ対象となるフォルダ・ピースファイルが見つかりませんでした。\n「ピースファイルをサブフォルダ内に含む」フォルダを選択してください。")
-    else:
-        # 結果を保存するための辞書の初期化
-        results = {}
+# プロセスプールのワーカーが読み込んだ際にダイアログを開かないよう、直接実行した場合のみ処理する
+if __name__ == "__main__":
+    # 検証したいDL対象ファイル本体と、DL元になったtorrentファイルが存在するフォルダの選択
+    source_file = select_torrent_file("ダウンロード元になったtorrentファイルを選択")
 
+    if source_file:
+        source_folder = os.path.dirname(source_file)
         print("バイナリマッチを試行中……")
 
-        # 指定したtorrentファイルに対してBinaryMatcherのインスタンスを作成
-        matcher = BinaryMatcher(source_file)
+        # 照合の基準となる本体ファイル自体が、torrentのピースハッシュと一致するか確認
+        reference = BinaryMatcher(source_file).verify_reference()
+        print(f"本体ファイルの検証：{reference.mbps:.1f} MB/s")
+        if not reference.complete:
+            print(
+                f"本体ファイルがtorrentの内容と一致しません（不一致 {len(reference.failed)} 件、"
+                f"欠損 {len(reference.missing)} 件）。照合結果は参考値です。"
+            )
 
-        # 各ピースフォルダと.binファイルを反復処理
-        for piece_folder in piece_folders_list:
-            bin_files = [
-                f
-                for f in os.listdir(piece_folder)
-                if f.endswith(".bin") and os.path.isfile(os.path.join(piece_folder, f))
-            ]
-            print(piece_folder)
-            for bin_file in bin_files:
-                result = matcher.binary_match(bin_file, piece_folder)
+        # source_folderの下の.binファイルを含むすべてのサブフォルダを、プロセスプールで一括照合
+        report = verify_evidence(source_folder)
 
-                # resultが0で、かつbin_fileの中身がすべて空白である場合
-                if result == 0:
-                    with open(os.path.join(piece_folder, bin_file), "rb") as f:
-                        file_content = f.read()
-                    if all(
-                        b == 0x20 or b == 0x00 for b in file_content
-                    ):  # すべてのバイトが空白（0x20）またはNullバイト（0x00）であるか
-                        result = None
+        if not report["files"]:
+            print("マッチ対象となるフォルダ・ピースファイルが見つかりませんでした。\n「ピースファイルをサブフォルダ内に含む」フォルダを選択してください。")
+        else:
+            report_path = os.path.join(source_folder, REPORT_FILE)
+            save_report(report, report_path)
 
-                results[bin_file] = result
+            # 結果の確認
+            mismatched_pieces = [r for r in report["results"] if r["status"] == MISMATCHED]
+            blank_pieces = [r for r in report["results"] if r["status"] == BLANK]
+            error_pieces = [r for r in report["results"] if r["status"] == ERROR]
 
-        # 結果の確認
-        # valueがFalseであるresults.items()の中身をmismatched_piecesとしてリストに収録
-        mismatched_pieces = [
-            key
-            for key, value in results.items()
-            if isinstance(value, bool) and value is False
-        ]
+            # 一致しなかったピースが存在しない場合、すべてのピースが一致したと表示
+            if not mismatched_pieces and not blank_pieces and not error_pieces:
+                print("すべてのピースが元ファイルの内容と一致しました。")
+            else:
+                if mismatched_pieces:
+                    print("次のピースは元ファイルの内容と一致しませんでした：")
+                    for r in mismatched_pieces:
+                        print(os.path.join(r["peer"], r["file"]))
 
-        # valueがNoneであるresults.items()の中身をblank_piecesとしてリストに収録
-        blank_pieces = [key for key, value in results.items() if value is None]
+                if blank_pieces:
+                    print("次のピースは元ファイルと一致せず、空白で占められたファイルでした。通信エラーの可能性があります。")
+                    for r in blank_pieces:
+                        print(os.path.join(r["peer"], r["file"]))
 
-        # mismatched_piecesとblank_piecesが存在しない場合、すべてのピースが一致したと表示
-        if not mismatched_pieces and not blank_pieces:
-            print("すべてのピースが元ファイルの内容と一致しました。")
-        else:
-            if mismatched_pieces:
-                print("次のピースは元ファイルの内容と一致しませんでした：")
-                for piece in mismatched_pieces:
-                    print(piece)
+                if error_pieces:
+                    print("次のピースは照合できませんでした：")
+                    for r in error_pieces:
+                        print(f"{os.path.join(r['evidence'], r['peer'], r['file'])}（{r['error']}）")
 
-            if blank_pieces:
-                print("次のピースは空白で占められたファイルでした。piece_indexが0ではないなら、通信エラーの可能性があります。")
-                for piece in blank_pieces:
-                    print(piece)
+            print(
+                f"{report['files']} 件（{report['bytes'] / 1048576:.1f} MB）を {report['elapsed']:.1f} 秒で照合"
+                f"（{report['mbps']:.1f} MB/s）"
+            )
+            print(f"結果を {report_path} に保存しました。")
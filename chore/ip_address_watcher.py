@@ -4,7 +4,7 @@ from kivy.uix.label import Label
 from kivy.uix.button import Button
 from kivy.uix.scrollview import ScrollView
 from kivy.clock import Clock
-from torrent.client import _get_public_ips
+from utils.public_ip import get_public_ip_service
 from utils.time import get_jst_str
 import os
 
@@ -64,10 +64,12 @@ class IPAddressWatcherApp(App):
         super(IPAddressWatcherApp, self).__init__(**kwargs)
         self.last_ipv4 = None
         self.last_ipv6 = None
+        # クローラと同じ問い合わせ先・有効期限で、IPアドレスを共有のサービスから取得する
+        self.ip_service = get_public_ip_service()
 
     def update_log(self, dt):
         current_time = get_jst_str()
-        ipv4, ipv6 = _get_public_ips()
+        ipv4, ipv6 = self.ip_service.get()
         self.current_ipv4_label.text = f"IPv4: {ipv4}"
         self.current_ipv6_label.text = f"IPv6: {ipv6}"
 
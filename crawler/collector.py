@@ -1,8 +1,10 @@
 # 対象フォルダのsource.torrentをもとに、本体ファイルのDLとピース収集を行うモジュール
 # 標準ライブラリ
+import asyncio
 import json
 import logging
 import os
+import time
 
 # サードパーティライブラリ
 from torrent.client import Client
@@ -11,6 +13,8 @@ from torrent.client import Client
 from utils.config import Config
 import utils.time as ut
 
+STATS_FILE = ".collector.json"  # 前回の収集結果（シーダー数・所要時間）を記録するファイル
+
 
 def execute():
     logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
@@ -22,6 +26,8 @@ def execute():
 
     EVI_FOLDER = con.EVI_FOLDER
     MAX_LIST_SIZE = con.MAX_LIST_SIZE
+    MAX_CONCURRENT = con.MAX_CONCURRENT
+    SINGLE_PASS = con.SINGLE_PASS
 
     folder_list = []  # 「.process」ファイルを含む証拠フォルダパスのリスト
 
@@ -35,34 +41,137 @@ def execute():
                 folder_list.append(root)
                 break
 
-    source_files = []  # 証拠採取の対象とする「source.torrent」ファイルへのパスを格納するリスト
-
-    # 「folder_list」内の各フォルダパスを取得
-    for folder in folder_list:
-        # 「source.torrent」へのパスを生成
-        source_file_path = os.path.join(folder, "source.torrent")
-        # パスを「source_files」リストに追加
-        source_files.append(source_file_path)
+    # 前回シーダーが見つかったフォルダから順に処理する
+    folder_list = schedule_folders(folder_list)
 
     client = Client()
+    asyncio.run(
+        _collect_all(
+            client, folder_list, MAX_LIST_SIZE, MAX_CONCURRENT, logger, SINGLE_PASS
+        )
+    )
 
-    for i in range(len(source_files)):
-        # 本体ファイルをダウンロード
-        download_result = client.download(source_files[i], folder_list[i])
 
-        # ダウンロードの成否をチェック
-        if not download_result:
-            logger.info("本体ファイルがダウンロードできていないため、ピア取得をスキップします。")
-            logger.info(ut.get_jst_str().split(".", 1)[0])
-            continue  # 存在しない、またはダウンロード失敗の場合は以降の処理をスキップ
+async def _collect_all(
+    client, folder_list, max_list_size, max_concurrent, logger, single_pass=False
+):
+    # 同時に処理するtorrentの数を制限しつつ、1つのセッション内で並行して収集する
+    semaphore = asyncio.Semaphore(max(1, int(max_concurrent)))
+
+    async with client.engine:
+        results = await asyncio.gather(
+            *(
+                _collect_folder(
+                    client, folder, max_list_size, semaphore, logger, single_pass
+                )
+                for folder in folder_list
+            ),
+            return_exceptions=True,
+        )
+
+    for folder, result in zip(folder_list, results):
+        if isinstance(result, Exception):
+            logger.warning(f"{folder} の処理中に例外が発生: {result}")
+
 
-        # ピースの収集対象とするピアの一覧を取得
-        logger.info("ピアの一覧を取得しています...")
-        log = client.get_peer_log(source_files[i], MAX_LIST_SIZE)
+async def _collect_folder(
+    client, folder, max_list_size, semaphore, logger, single_pass=False
+):
+    # 「source.torrent」へのパスを生成
+    source_file_path = os.path.join(folder, "source.torrent")
 
-        if not len(log) == 0:
+    async with semaphore:
+        started = time.time()
+        log = []
+
+        if single_pass:
+            # 本体ファイルのダウンロード中に、ピースの収集対象とするピアを取得
+            download_result, log = await client.collect_async(
+                source_file_path, folder, max_list_size
+            )
+        else:
+            # 本体ファイルをダウンロード
+            download_result = await client.download_async(source_file_path, folder)
+            if download_result:
+                # ピースの収集対象とするピアの一覧を取得
+                logger.info("ピアの一覧を取得しています...")
+                log = await client.get_peer_log_async(source_file_path, max_list_size)
+
+        seeders = len({p.ip for p in log})
+
+        # ダウンロードの成否をチェック
+        if not download_result:
+            if single_pass:
+                logger.info("本体ファイルのダウンロードが完了しませんでした。")
+            else:
+                logger.info("本体ファイルがダウンロードできていないため、ピア取得をスキップします。")
+        elif not len(log) == 0:
             logger.info("ピース収集が完了しました。")
-            logger.info(ut.get_jst_str().split(".", 1)[0])
         else:
             logger.info("対象となるピアがありませんでした。")
-            logger.info(ut.get_jst_str().split(".", 1)[0])
+
+        elapsed = time.time() - started
+        save_stats(folder, seeders, elapsed)
+        logger.info(f"{os.path.basename(folder)}：所要時間 {elapsed:.1f} 秒、シーダー {seeders} 件")
+        logger.info(ut.get_jst_str().split(".", 1)[0])
+
+
+def load_stats(folder: str) -> dict:
+    """
+    証拠フォルダに記録された前回の収集結果を読み込む。
+
+    Parameters
+    ----------
+    folder : str
+        証拠フォルダのパス。
+
+    Returns
+    -------
+    stats : dict
+        "seeders", "elapsed", "last_run" を持つ辞書。記録がなければ空の辞書。
+    """
+    stats_path = os.path.join(folder, STATS_FILE)
+    try:
+        with open(stats_path, "r", encoding="utf-8") as f:
+            stats = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return stats if isinstance(stats, dict) else {}
+
+
+def save_stats(folder: str, seeders: int, elapsed: float) -> None:
+    # 収集結果を記録し、次回のスケジューリングに使う
+    stats = {"seeders": seeders, "elapsed": round(elapsed, 3), "last_run": time.time()}
+    try:
+        with open(os.path.join(folder, STATS_FILE), "w", encoding="utf-8") as f:
+            json.dump(stats, f, ensure_ascii=False, indent=4)
+    except OSError as e:
+        logging.warning(f"収集結果の記録に失敗しました: {e}")
+
+
+def schedule_folders(folder_list: list[str]) -> list[str]:
+    """
+    証拠フォルダを処理する順に並べ替える。
+
+    まだ一度も処理していないフォルダ、前回シーダーが多かったフォルダの順に並べ、
+    同じ条件のフォルダは最後に処理した時刻が古いものを先にする。
+    シーダーが見つからなかったフォルダは最後に回される。
+
+    Parameters
+    ----------
+    folder_list : list of str
+        証拠フォルダのパスのリスト。
+
+    Returns
+    -------
+    folders : list of str
+        並べ替えたリスト。
+    """
+
+    def sort_key(folder):
+        stats = load_stats(folder)
+        if not stats:
+            return (0, 0, 0.0)
+        return (1, -stats.get("seeders", 0), stats.get("last_run", 0.0))
+
+    return sorted(folder_list, key=sort_key)
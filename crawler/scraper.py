@@ -2,6 +2,7 @@
 # ユーザーが入力した検索語にもとづき自動巡回・収集するモジュール
 # 標準ライブラリ
 from datetime import datetime, timedelta, timezone
+import functools
 import gzip
 import json
 import logging
@@ -21,6 +22,7 @@ from torrentool.api import Torrent
 
 # 独自モジュール
 from utils.config import Config
+from utils.piece_index import PIECE_INDEX_FILE, PieceIndex
 import utils.time as ut
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -59,6 +61,41 @@ def process_query(query):
     return query
 
 
+@functools.lru_cache(maxsize=None)
+def _get_piece_index() -> PieceIndex:
+    # 既知のtorrentのピースハッシュの索引（プロセス内で共有）
+    return PieceIndex(os.path.join(SETTING_FOLDER, PIECE_INDEX_FILE))
+
+
+def compare_pieces(torrent_path):
+    # 既知のtorrent（誤検出を除く）とピースハッシュを比較検証し、索引に加える
+    # 証拠フォルダのログに追記する文字列を返す
+    try:
+        index = _get_piece_index()
+        matches = index.match(torrent_path)
+        index.add(torrent_path)
+    except Exception as e:
+        logger.warning(f"比較検証に失敗しました: {e}")
+        return ""
+
+    lines = []
+    for match in matches:
+        line = (
+            "比較検証：既知のtorrent「"
+            + match.name
+            + "」（"
+            + match.info_hash
+            + "）とピースが一致（"
+            + str(match.shared)
+            + "/"
+            + str(match.num_pieces)
+            + "）"
+        )
+        logger.info(line)
+        lines.append(line + "\n")
+    return "".join(lines)
+
+
 def url_in_r18_site_urls(url):
     # JSONファイルを開き、内容を読み込む
     with open(SETTING_FILE, "r", encoding="utf-8") as f:
@@ -351,6 +388,10 @@ def scraper(url, file_path):
                                                 + "\n"
                                             )
                                             log_file.write(LOG)
+                                            # 同じ内容の既知のtorrentがあれば記録
+                                            log_file.write(
+                                                compare_pieces(new_file_name)
+                                            )
                                         # 成人向け作品をマーク
                                         if url_in_r18_site_urls(url):
                                             r18_file_path = os.path.join(
@@ -376,6 +417,12 @@ def execute():
     with file_lock:
         with open(SETTING_FILE, "r", encoding="utf-8") as f:
             data = json.load(f)
+
+    # 比較検証に使う索引を、TORRENT_FOLDER内のsource.torrentの現状に合わせる
+    try:
+        _get_piece_index().build(TORRENT_FOLDER)
+    except Exception as e:
+        logger.warning(f"比較検証の索引を更新できませんでした: {e}")
     site_urls = data["site_urls"]
     r18_site_urls = data["r18_site_urls"]
     mail_user = data["mail_user"]
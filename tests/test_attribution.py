@@ -0,0 +1,63 @@
+import asyncio
+import os
+import tempfile
+from unittest import TestCase, main
+from torrent.attribution import PieceAttribution
+from torrent.engine import TorrentEvent
+
+PEER_A = ("192.0.2.1", 6881)
+PEER_B = ("2001:db8::1", 51413)
+
+
+class _FakeHandle:
+    def __init__(self):
+        self.reads = []
+
+    def read_piece(self, piece):
+        self.reads.append(piece)
+
+
+class TestPieceAttribution(TestCase):
+    def test_attribution(self):
+        attribution = PieceAttribution()
+        attribution.block_finished(0, 0, PEER_A)
+        attribution.block_finished(0, 1, PEER_B)
+        attribution.block_finished(1, 0, PEER_B)
+
+        self.assertEqual(attribution.piece_finished(0), {PEER_A, PEER_B})
+        self.assertEqual(attribution.hash_failed(1), {PEER_B})
+        self.assertEqual(attribution.verified_count(PEER_A), 1)
+        self.assertTrue(attribution.is_valid(PEER_A))
+        self.assertFalse(attribution.is_valid(PEER_B))
+        self.assertEqual(attribution.piece_finished(5), set())
+
+    def test_capture(self):
+        async def run(attribution, handle):
+            events = [
+                TorrentEvent("block_finished", None, (3, 0, PEER_B)),
+                TorrentEvent("block_finished", None, (3, 1, PEER_B)),
+                TorrentEvent("block_finished", None, (4, 0, PEER_A)),
+                TorrentEvent("block_finished", None, (4, 1, PEER_B)),
+                TorrentEvent("piece_finished", None, 3),
+                TorrentEvent("piece_finished", None, 4),
+                TorrentEvent("read_piece", None, (3, b"piece-3")),
+            ]
+            for event in events:
+                await attribution.handle_event(event, handle)
+
+        with tempfile.TemporaryDirectory() as folder:
+            attribution = PieceAttribution(folder)
+            handle = _FakeHandle()
+            asyncio.run(run(attribution, handle))
+
+            # 複数のピアから受け取ったピース4は保存しない
+            self.assertEqual(handle.reads, [3])
+            self.assertEqual(attribution.pending_reads, 0)
+            path = os.path.join(folder, "2001-db8--1_51413", "3.bin")
+            self.assertEqual(attribution.captured, [path])
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"piece-3")
+
+
+if __name__ == "__main__":
+    main()
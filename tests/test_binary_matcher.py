@@ -0,0 +1,70 @@
+import os
+import tempfile
+from unittest import TestCase, main
+import libtorrent as lt
+from utils.binary_matcher import BinaryMatcher
+
+PIECE_LENGTH = 16 * 1024
+
+
+class TestBinaryMatcher(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        # 先頭の3ピースは内容が同じ（すべて0）
+        self.payload = bytes(PIECE_LENGTH * 3) + os.urandom(PIECE_LENGTH * 2 + 100)
+        with open(os.path.join(self.folder, "payload.bin"), "wb") as f:
+            f.write(self.payload)
+
+        fs = lt.file_storage()
+        lt.add_files(fs, os.path.join(self.folder, "payload.bin"))
+        t = lt.create_torrent(fs, PIECE_LENGTH)
+        lt.set_piece_hashes(t, self.folder)
+        self.torrent_path = os.path.join(self.folder, "source.torrent")
+        with open(self.torrent_path, "wb") as f:
+            f.write(lt.bencode(t.generate()))
+
+        self.piece_folder = os.path.join(self.folder, "127.0.0.1_6881")
+        os.makedirs(self.piece_folder)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def piece(self, piece_index):
+        return self.payload[piece_index * PIECE_LENGTH : (piece_index + 1) * PIECE_LENGTH]
+
+    def write_bin(self, name, data):
+        with open(os.path.join(self.piece_folder, name), "wb") as f:
+            f.write(data)
+        return name
+
+    def test_lookup(self):
+        matcher = BinaryMatcher(self.torrent_path)
+        self.assertEqual(len(matcher.piece_table), 4)
+        self.assertEqual(matcher.lookup(self.piece(0)), [0, 1, 2])
+        self.assertEqual(matcher.lookup(self.piece(5)), [5])
+        self.assertEqual(matcher.lookup(b"unknown"), [])
+
+    def test_binary_match(self):
+        matcher = BinaryMatcher(self.torrent_path)
+        self.assertEqual(matcher.binary_match(self.write_bin("1.bin", self.piece(1)), self.piece_folder), 0)
+        self.assertEqual(matcher.binary_match(self.write_bin("4.bin", self.piece(4)), self.piece_folder), 4)
+        self.assertEqual(matcher.binary_match(self.write_bin("5.bin", self.piece(5)), self.piece_folder), 5)
+        self.assertFalse(matcher.binary_match(self.write_bin("x.bin", os.urandom(PIECE_LENGTH)), self.piece_folder))
+        self.assertFalse(matcher.binary_match(self.write_bin("empty.bin", b""), self.piece_folder))
+
+    def test_confirm_with_reference(self):
+        # 本体ファイルの該当ピースが異なる場合、ハッシュが一致しても一致とはしない
+        with open(os.path.join(self.folder, "payload.bin"), "r+b") as f:
+            f.seek(PIECE_LENGTH * 4)
+            f.write(b"\xff")
+        matcher = BinaryMatcher(self.torrent_path)
+        self.assertFalse(matcher.binary_match(self.write_bin("4.bin", self.piece(4)), self.piece_folder))
+
+        os.remove(os.path.join(self.folder, "payload.bin"))
+        matcher = BinaryMatcher(self.torrent_path)
+        self.assertFalse(matcher.binary_match(self.write_bin("5.bin", self.piece(5)), self.piece_folder))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import random
+import tempfile
+from unittest import TestCase, main
+from torrent.bitfield_store import BitfieldStore, has_bit, pack_bits
+
+PEER_A = ("192.0.2.1", 6881)
+PEER_B = ("2001:db8::1", 51413)
+
+
+class TestBitfieldStore(TestCase):
+    def test_pack_bits(self):
+        packed = pack_bits([True, False, False, False, False, False, False, True, True])
+        self.assertEqual(packed, b"\x81\x80")
+        self.assertTrue(has_bit(packed, 8))
+        self.assertFalse(has_bit(packed, 1))
+
+    def test_history(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "bitfields_abc.jsonl")
+            store = BitfieldStore(path, 1000)
+            rng = random.Random(0)
+            first = [rng.random() < 0.5 for _ in range(1000)]
+            first[0], first[1], first[500] = True, False, False
+            second = list(first)
+            second[500] = True
+
+            self.assertTrue(store.record(PEER_A, first, "t1"))
+            self.assertFalse(store.record(PEER_A, first, "t2"))  # 変化がなければ記録しない
+            self.assertTrue(store.record(PEER_B, [True] * 1000, "t2"))
+            self.assertTrue(store.record(PEER_A, second, "t3"))
+            self.assertEqual(store.flush(), 3)
+            self.assertEqual(store.flush(), 0)
+
+            self.assertTrue(store.available(500))
+            self.assertEqual(store.peers_with(1), [PEER_B])
+            self.assertEqual(sorted(store.peers_with(0)), [PEER_A, PEER_B])
+
+            history = list(BitfieldStore.history(path))
+            self.assertEqual(
+                history,
+                [
+                    (PEER_A, "t1", pack_bits(first)),
+                    (PEER_B, "t2", pack_bits([True] * 1000)),
+                    (PEER_A, "t3", pack_bits(second)),
+                ],
+            )
+            # 差分は全体よりも小さく記録される
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            self.assertIn('"delta"', lines[2])
+            self.assertLess(len(lines[2]), len(lines[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase, main
+import libtorrent as lt
+from utils.evidence_verifier import find_piece_folders, is_blank, main as cli_main, verify_evidence
+
+PIECE_LENGTH = 16 * 1024
+
+
+def make_evidence(folder, payload):
+    # 本体ファイルとsource.torrentを含む証拠フォルダを作成する
+    os.makedirs(folder)
+    with open(os.path.join(folder, "payload.bin"), "wb") as f:
+        f.write(payload)
+    fs = lt.file_storage()
+    lt.add_files(fs, os.path.join(folder, "payload.bin"))
+    t = lt.create_torrent(fs, PIECE_LENGTH)
+    lt.set_piece_hashes(t, folder)
+    with open(os.path.join(folder, "source.torrent"), "wb") as f:
+        f.write(lt.bencode(t.generate()))
+
+
+def write_bin(folder, name, data):
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, name), "wb") as f:
+        f.write(data)
+
+
+class TestEvidenceVerifier(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "tor")
+        self.payloads = {}
+        for case in ("case1", "case2"):
+            payload = os.urandom(PIECE_LENGTH * 4 + 10)
+            self.payloads[case] = payload
+            make_evidence(os.path.join(self.root, case), payload)
+
+        peer = os.path.join(self.root, "case1", "1.0.16.1_6881")
+        write_bin(peer, "0.bin", self.payloads["case1"][:PIECE_LENGTH])
+        write_bin(peer, "4.bin", self.payloads["case1"][PIECE_LENGTH * 4 :])
+        write_bin(peer, "2.bin", os.urandom(PIECE_LENGTH))
+        write_bin(peer, "3.bin", b" " * PIECE_LENGTH)
+        write_bin(os.path.join(self.root, "case1", "peers"), "1.0.16.1_6881_x.log", b"log")
+        write_bin(
+            os.path.join(self.root, "case2", "2001-db8--1_51413"),
+            "1.bin",
+            self.payloads["case2"][PIECE_LENGTH : PIECE_LENGTH * 2],
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_find_piece_folders(self):
+        folders = find_piece_folders(self.root)
+        self.assertEqual(
+            folders,
+            {
+                os.path.join(self.root, "case1", "source.torrent"): [
+                    os.path.join(self.root, "case1", "1.0.16.1_6881")
+                ],
+                os.path.join(self.root, "case2", "source.torrent"): [
+                    os.path.join(self.root, "case2", "2001-db8--1_51413")
+                ],
+            },
+        )
+
+    def test_is_blank(self):
+        self.assertTrue(is_blank(b"\x00 \x00"))
+        self.assertFalse(is_blank(b""))
+        self.assertFalse(is_blank(b"\x00a"))
+
+    def test_verify_evidence(self):
+        report = verify_evidence(self.root, workers=2)
+        self.assertEqual(report["files"], 5)
+        self.assertEqual(report["summary"], {"matched": 3, "mismatched": 1, "blank": 1, "error": 0})
+        self.assertEqual(report["bytes"], PIECE_LENGTH * 4 + 10)
+        results = {(os.path.basename(r["evidence"]), r["file"]): r for r in report["results"]}
+        self.assertEqual(results[("case1", "0.bin")]["piece_index"], 0)
+        self.assertEqual(results[("case1", "4.bin")]["piece_index"], 4)
+        self.assertEqual(results[("case1", "2.bin")]["status"], "mismatched")
+        self.assertEqual(results[("case1", "3.bin")]["status"], "blank")
+        self.assertEqual(results[("case2", "1.bin")]["piece_index"], 1)
+        self.assertEqual(results[("case2", "1.bin")]["peer"], "2001-db8--1_51413")
+
+    def test_blank_piece_matched(self):
+        # 本体ファイルのピースと一致すれば、内容がすべて0でも一致として扱う
+        payload = bytes(PIECE_LENGTH) + os.urandom(PIECE_LENGTH)
+        make_evidence(os.path.join(self.root, "case3"), payload)
+        write_bin(os.path.join(self.root, "case3", "1.0.16.2_6881"), "0.bin", bytes(PIECE_LENGTH))
+        report = verify_evidence(os.path.join(self.root, "case3"), workers=1)
+        self.assertEqual(report["results"][0]["status"], "matched")
+        self.assertEqual(report["results"][0]["piece_index"], 0)
+
+    def test_broken_torrent(self):
+        # 読み込めないsource.torrentがあっても、他の証拠フォルダの結果は残す
+        folder = os.path.join(self.root, "broken")
+        write_bin(folder, "source.torrent", b"not bencoded")
+        write_bin(os.path.join(folder, "1.0.16.3_6881"), "0.bin", b"data")
+        report = verify_evidence(self.root, workers=2)
+        self.assertEqual(report["summary"], {"matched": 3, "mismatched": 1, "blank": 1, "error": 1})
+        errors = [r for r in report["results"] if r["status"] == "error"]
+        self.assertEqual([(r["peer"], r["file"]) for r in errors], [("1.0.16.3_6881", "0.bin")])
+        self.assertIn("error", errors[0])
+
+    def test_missing_payload(self):
+        # 本体ファイルがない証拠フォルダのピースは、不一致ではなくエラーとする
+        os.remove(os.path.join(self.root, "case1", "payload.bin"))
+        report = verify_evidence(self.root, workers=2)
+        self.assertEqual(report["summary"], {"matched": 1, "mismatched": 0, "blank": 0, "error": 4})
+        errors = [r for r in report["results"] if r["status"] == "error"]
+        self.assertEqual({os.path.basename(r["evidence"]) for r in errors}, {"case1"})
+        self.assertTrue(all("FileNotFoundError" in r["error"] for r in errors))
+
+    def test_cli(self):
+        output = os.path.join(self.tmp.name, "report.json")
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            cli_main([os.path.join(self.root, "case2"), "-o", output, "-w", "1"])
+        self.assertIn("MB/s", out.getvalue())
+        with open(output, encoding="utf-8") as f:
+            report = json.load(f)
+        self.assertEqual(report["summary"]["matched"], 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from ipaddress import ip_network
+from types import SimpleNamespace
+from unittest import TestCase, main
+from torrent.bitfield_store import BitfieldStore
+from torrent.harvest import Harvest
+from torrent.ip_index import IPRangeIndex
+from torrent.piece_window import PRIORITY_WINDOW, PieceWindow
+
+
+def peer(ip, port, seed=True, speed=20480, last_active=0, pieces=(True, False)):
+    # libtorrentのpeer_infoのうち、収録の判定に使う属性だけを持つオブジェクト
+    return SimpleNamespace(
+        ip=(ip, port),
+        seed=seed,
+        payload_down_speed=speed,
+        last_active=last_active,
+        client="qBittorrent",
+        pieces=list(pieces),
+    )
+
+
+class TestHarvest(TestCase):
+    def setUp(self):
+        self.index = IPRangeIndex(["1.0.16.0/20", "2001:200::/32"])
+        self.harvest = Harvest(
+            self.index,
+            "1.0.16.100",
+            "2001:200:0:1::100",
+            ip_network("2001:200:0:1::/64"),
+            round_interval=3,
+        )
+
+    def test_collect(self):
+        peers = [
+            peer("1.0.16.1", 6881),
+            peer("1.0.16.1", 6882),  # 同じIPアドレスのピアは重複して収録しない
+            peer("1.0.16.2", 6881, seed=False),
+            peer("1.0.16.3", 6881, speed=1000),
+            peer("1.0.16.4", 6881, last_active=5),
+            peer("8.8.8.8", 6881),  # 範囲外
+            peer("1.0.16.100", 6881),  # 自分自身
+            peer("2001:200:0:1::5", 6881),  # 自分自身の/64
+            peer("2001:200:0:2::5", 6881),
+        ]
+        self.assertEqual(self.harvest.collect(peers, "t1", 10.0), 2)
+        self.assertEqual(
+            self.harvest.registry.peers(), [("1.0.16.1", 6881), ("2001:200:0:2::5", 6881)]
+        )
+
+        # 既知のピアはround_interval秒ごとに追加収録する
+        self.assertEqual(self.harvest.collect(peers, "t2", 11.0), 0)
+        self.assertEqual(self.harvest.collect(peers, "t3", 13.0), 2)
+        self.assertEqual(len(self.harvest), 2)
+        self.assertEqual(len(self.harvest.registry.records), 4)
+
+    def test_add_all_peers(self):
+        self.harvest.add_all_peers = True
+        self.harvest.collect([peer("8.8.8.8", 6881), peer("1.0.16.100", 6881)], "t1", 1.0)
+        self.assertEqual(self.harvest.registry.peers(), [("8.8.8.8", 6881)])
+
+    def test_valid_piece(self):
+        self.harvest.valid_piece = False
+        self.harvest.collect([peer("1.0.16.1", 6881)], "t1", 1.0)
+        self.assertFalse(self.harvest.registry.records[0].valid)
+
+    def test_bitfields(self):
+        bitfields = BitfieldStore("unused.jsonl", 2)
+        self.harvest.bitfields = bitfields
+        self.harvest.collect(
+            [peer("1.0.16.1", 6881, speed=0), peer("8.8.8.8", 6881)], "t1", 1.0
+        )
+        # 収録の条件を満たさなくても、範囲内のシーダーのビットフィールドは記録する
+        self.assertEqual(len(bitfields), 1)
+        self.assertTrue(bitfields.available(0))
+        self.assertFalse(bitfields.available(1))
+
+    def test_partial_peer_bitfields(self):
+        # シーダーでないピアのビットフィールドも周回ごとに記録し、窓の進め方に反映する
+        bitfields = BitfieldStore("unused.jsonl", 6)
+        self.harvest.bitfields = bitfields
+        window = PieceWindow(6, size=1, start=0)
+        leecher = (True, True, False, True, False, False)
+        self.harvest.collect([peer("1.0.16.2", 6881, seed=False, pieces=leecher)], "t1", 1.0)
+        self.assertEqual(len(self.harvest.registry), 0)  # シーダーでないため収録しない
+
+        # ピース2を保有するピアがいないため、3を先に取得する
+        self.assertEqual(window.complete(0, bitfields.available), [(1, PRIORITY_WINDOW)])
+        self.assertEqual(window.complete(1, bitfields.available), [(3, PRIORITY_WINDOW)])
+
+        # 次の周回でピアがピース2と4を取得した
+        leecher = (True, True, True, True, True, False)
+        self.harvest.collect([peer("1.0.16.2", 6881, seed=False, pieces=leecher)], "t2", 4.0)
+        self.assertEqual(window.complete(3, bitfields.available), [(4, PRIORITY_WINDOW)])
+        self.assertEqual(window.complete(4, bitfields.available), [(2, PRIORITY_WINDOW)])
+
+
+if __name__ == "__main__":
+    main()
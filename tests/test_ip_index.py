@@ -0,0 +1,83 @@
+from ipaddress import ip_network
+import os
+import tempfile
+from unittest import TestCase, main
+from torrent.ip_index import IPRangeCache, IPRangeIndex
+
+
+class TestIPRangeIndex(TestCase):
+    def setUp(self):
+        self.index = IPRangeIndex(
+            [
+                "1.0.16.0/20",
+                "1.0.32.0/21",  # 1.0.16.0/20と隣接するため統合される
+                "1.0.48.0/21",  # どの範囲とも隣接しないため別の区間
+                "1.0.64.0/18",
+                "1.0.64.0/19",  # 1.0.64.0/18に含まれるため統合される
+                "2001:200::/35",
+                "2001:200:2000::/35",  # 隣接するため統合される
+            ]
+        )
+
+    def test_merge(self):
+        self.assertEqual(len(self.index.intervals(4)), 3)
+        self.assertEqual(len(self.index.intervals(6)), 1)
+
+    def test_contains(self):
+        self.assertTrue(self.index.contains("1.0.16.1"))
+        self.assertTrue(self.index.contains("1.0.127.255"))
+        self.assertTrue(self.index.contains("1.0.39.255"))
+        self.assertFalse(self.index.contains("1.0.40.0"))
+        self.assertFalse(self.index.contains("8.8.8.8"))
+        self.assertTrue("2001:200:3fff::1" in self.index)
+        self.assertFalse("2001:200:4000::1" in self.index)
+        self.assertFalse(self.index.contains("不正なアドレス"))
+
+    def test_classify(self):
+        ips = ["1.0.16.1", "8.8.8.8", "2001:200::1", "2001:200:10::1", "不正"]
+        excluded = [ip_network("2001:200::/64"), None]
+
+        self.assertEqual(
+            self.index.classify(ips, excluded), [True, False, False, True, False]
+        )
+        self.assertEqual(
+            self.index.classify(ips), [True, False, True, True, False]
+        )
+
+    def test_classify_matches_contains(self):
+        # まとめて判定した結果は、1件ずつの判定と一致する
+        ips = [f"1.0.{i}.{j}" for i in range(0, 140, 3) for j in (0, 255)]
+        ips += ["2001:200:3fff::1", "2001:200:4000::1", "1.0.16.1"]
+        self.assertEqual(
+            self.index.classify(iter(ips)), [self.index.contains(ip) for ip in ips]
+        )
+
+
+class TestIPRangeCache(TestCase):
+    def test_reload_on_modification(self):
+        with tempfile.TemporaryDirectory() as setting_folder:
+            ipv4_file = os.path.join(setting_folder, "ipv4.txt")
+            with open(ipv4_file, "w") as f:
+                f.write("1.0.16.0/20\n\n")
+
+            cache = IPRangeCache(setting_folder)
+            index = cache.get_index()
+            self.assertTrue(index.contains("1.0.16.1"))
+            self.assertEqual(cache.get_ranges(6), [])
+
+            # 更新時刻が変わらなければ同じ索引を返す
+            self.assertIs(cache.get_index(), index)
+
+            with open(ipv4_file, "w") as f:
+                f.write("8.8.8.0/24\n")
+            stat = os.stat(ipv4_file)
+            os.utime(ipv4_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+            reloaded = cache.get_index()
+            self.assertIsNot(reloaded, index)
+            self.assertFalse(reloaded.contains("1.0.16.1"))
+            self.assertTrue(reloaded.contains("8.8.8.8"))
+
+
+if __name__ == "__main__":
+    main()
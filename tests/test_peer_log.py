@@ -0,0 +1,80 @@
+import os
+import tempfile
+from unittest import TestCase, main
+from torrent.peer_log import PeerLogIndex, PeerLogWriter, ip_from_log_name
+
+
+class TestPeerLogWriter(TestCase):
+    def test_flush(self):
+        with tempfile.TemporaryDirectory() as save_path:
+            writer = PeerLogWriter(save_path, "abc", "sample.mp4", "ver.1.0", fsync=True)
+            writer.add("2001:db8::1", 51413, "qBittorrent", 12.34, "t1", True)
+            writer.add("2001:db8::1", 51413, "qBittorrent", 5.0, "t2", False)
+            writer.add("1.0.16.1", 6881, "Transmission", 0, "t1", True)
+            self.assertEqual(len(writer), 3)
+
+            path = writer.path_for("2001:db8::1", 51413)
+            self.assertEqual(os.path.basename(path), "2001-db8--1_51413_abc.log")
+            self.assertEqual(len(writer.flush()), 2)
+            self.assertEqual(len(writer), 0)
+
+            # 既存のファイルにはヘッダーを書き込まずに追記する
+            writer.add("2001:db8::1", 51413, "qBittorrent", 1.0, "t3", True)
+            self.assertEqual(writer.flush(), [])
+
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+
+            self.assertEqual(lines[0], "IPアドレス：2001:db8::1")
+            self.assertEqual(lines[3], "プロバイダ：未取得")
+            self.assertEqual(lines[7], "証拠収集開始時刻: t1")
+            self.assertEqual(
+                lines[10:],
+                [
+                    "t1　qBittorrent　速度：12.3 KB/s　",
+                    "t2　qBittorrent　速度：5.0 KB/s　破損ピース：あり",
+                    "t3　qBittorrent　速度：1.0 KB/s　",
+                ],
+            )
+
+
+class TestPeerLogIndex(TestCase):
+    def test_backfill(self):
+        with tempfile.TemporaryDirectory() as save_path:
+            writer = PeerLogWriter(save_path, "abc", "sample.mp4", "ver.1.0")
+            writer.add("1.0.16.1", 6881, "Transmission", 0, "t1", True)
+            writer.flush()
+
+            # 既存のファイルは最初の一覧で索引化される
+            index = PeerLogIndex(writer.peers_folder)
+            writer.index = index
+            writer.add("1.0.16.1", 6882, "Transmission", 0, "t1", True)
+            writer.add("1.0.16.10", 6881, "Transmission", 0, "t1", True)
+            writer.flush()
+
+            self.assertEqual(len(index), 3)
+            self.assertEqual(len(index.paths("1.0.16.1")), 2)
+            self.assertEqual(
+                index.backfill({"1.0.16.1": ("host.example.jp", "サンプル通信")}), 2
+            )
+            self.assertEqual(index.unfilled("1.0.16.1"), [])
+            self.assertEqual(len(index.unfilled("1.0.16.10")), 1)
+
+            with open(index.paths("1.0.16.1")[0], encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            self.assertEqual(lines[3], "プロバイダ：サンプル通信")
+            self.assertEqual(lines[4], "リモートホスト：host.example.jp")
+
+            # 書き換え済みのファイルは再び開かない
+            self.assertEqual(
+                index.backfill({"1.0.16.1": ("host.example.jp", "サンプル通信")}), 0
+            )
+
+    def test_ip_from_log_name(self):
+        self.assertEqual(ip_from_log_name("2001-db8--1_51413_abc.log"), "2001:db8::1")
+        self.assertEqual(ip_from_log_name("1.0.16.1_6881_abc.log"), "1.0.16.1")
+        self.assertIsNone(ip_from_log_name("peers_abc.csv"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+from unittest import TestCase, main
+from torrent.peer_registry import PeerRecord, PeerRegistry
+
+
+class TestPeerRegistry(TestCase):
+    def test_log(self):
+        registry = PeerRegistry()
+        self.assertFalse(registry)
+
+        registry.log(PeerRecord("1.0.16.1", 6881, "qBittorrent", 12.3, "t1", True), 1.0)
+        registry.log(PeerRecord("2001:db8:0:1::1", 51413, "Transmission", 20, "t1", True), 1.0)
+        registry.log(PeerRecord("1.0.16.1", 6881, "qBittorrent", 15.0, "t2", False), 4.0)
+
+        self.assertEqual(len(registry), 2)
+        self.assertEqual(len(registry.records), 3)
+        self.assertIn(("1.0.16.1", 6881), registry)
+        self.assertNotIn(("1.0.16.1", 6882), registry)
+        self.assertTrue(registry.has_ip("1.0.16.1"))
+        self.assertFalse(registry.has_ip("1.0.16.2"))
+        self.assertEqual(registry.last_logged(("1.0.16.1", 6881)), 4.0)
+        self.assertEqual(registry.last_logged(("1.0.16.2", 6881)), 0.0)
+        self.assertEqual(registry.peers(), [("1.0.16.1", 6881), ("2001:db8:0:1::1", 51413)])
+        self.assertEqual([r.timestamp for r in registry], ["t1", "t1", "t2"])
+
+    def test_record_slots(self):
+        record = PeerRecord("1.0.16.1", 6881, "qBittorrent", 12.3, "t1", True)
+        self.assertEqual(record.key, ("1.0.16.1", 6881))
+        with self.assertRaises(AttributeError):
+            record.extra = 1
+
+
+if __name__ == "__main__":
+    main()
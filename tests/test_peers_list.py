@@ -0,0 +1,56 @@
+import csv
+import os
+import tempfile
+from unittest import TestCase, main
+from torrent.client import _make_peers_list
+
+
+class TestMakePeersList(TestCase):
+    def test_merge(self):
+        with tempfile.TemporaryDirectory() as folder:
+            csv_path = os.path.join(folder, "peers_test.csv")
+            with open(csv_path, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(
+                    ["1.0.16.1", "6881", "host.example", "プロバイダ", "2", "t0", "t0"]
+                )
+
+            entries = [
+                (("2001:db8::1", 51413), "t1", True),
+                (("1.0.16.1", 6881), "t1", True),
+                (("2001:db8::1", 51413), "t2", False),
+                (("1.0.16.1", 6882), "t2", True),
+            ]
+            self.assertTrue(_make_peers_list(entries, csv_path))
+
+            with open(csv_path, newline="", encoding="utf-8") as f:
+                rows = list(csv.reader(f))
+
+            self.assertEqual(
+                rows,
+                [
+                    ["1.0.16.1", "6881", "host.example", "プロバイダ", "3", "t0", "t1"],
+                    ["2001:db8::1", "51413", "未取得", "未取得", "1", "t1", "t2"],
+                    ["1.0.16.1", "6882", "未取得", "未取得", "1", "t2", "t2"],
+                ],
+            )
+            self.assertEqual(os.listdir(folder), ["peers_test.csv"])
+
+    def test_file_mode(self):
+        # 置き換え後も、既存のファイル（新規の場合はumaskに従った）権限を保つ
+        with tempfile.TemporaryDirectory() as folder:
+            csv_path = os.path.join(folder, "peers_test.csv")
+            entries = [(("1.0.16.1", 6881), "t1", True)]
+            self.assertTrue(_make_peers_list(entries, csv_path))
+            open(os.path.join(folder, "plain.csv"), "w").close()
+            self.assertEqual(
+                os.stat(csv_path).st_mode & 0o777,
+                os.stat(os.path.join(folder, "plain.csv")).st_mode & 0o777,
+            )
+
+            os.chmod(csv_path, 0o640)
+            self.assertTrue(_make_peers_list(entries, csv_path))
+            self.assertEqual(os.stat(csv_path).st_mode & 0o777, 0o640)
+
+
+if __name__ == "__main__":
+    main()
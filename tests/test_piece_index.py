@@ -0,0 +1,97 @@
+import os
+import tempfile
+from unittest import TestCase, main
+import libtorrent as lt
+from utils.piece_index import FALSE_MARK, PieceIndex, read_torrent
+
+PIECE_LENGTH = 16 * 1024
+
+
+def make_torrent(folder, name, payload):
+    # 本体ファイルとsource.torrentを含む証拠フォルダを作成する
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, name), "wb") as f:
+        f.write(payload)
+    fs = lt.file_storage()
+    lt.add_files(fs, os.path.join(folder, name))
+    t = lt.create_torrent(fs, PIECE_LENGTH, flags=lt.create_torrent.v1_only)
+    lt.set_piece_hashes(t, folder)
+    path = os.path.join(folder, "source.torrent")
+    with open(path, "wb") as f:
+        f.write(lt.bencode(t.generate()))
+    return path
+
+
+class TestPieceIndex(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "tor")
+        self.payload = os.urandom(PIECE_LENGTH * 4 + 10)
+        self.known = make_torrent(os.path.join(self.root, "known"), "a.bin", self.payload)
+        self.other = make_torrent(os.path.join(self.root, "other"), "b.bin", os.urandom(PIECE_LENGTH * 2))
+        self.index = PieceIndex(os.path.join(self.tmp.name, "piece_index.sqlite3"))
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def test_build(self):
+        self.assertEqual(self.index.build(self.root), (2, 0))
+        self.assertEqual(len(self.index), 2)
+        # 変更がなければ読み直さない
+        self.assertEqual(self.index.build(self.root), (0, 0))
+        self.assertFalse(self.index.add(self.known))
+
+        os.remove(self.other)
+        self.assertEqual(self.index.build(self.root), (0, 1))
+        self.assertEqual(len(self.index), 1)
+
+    def test_match(self):
+        self.index.build(self.root)
+        # 名前が異なる（info_hashが異なる）が、内容の一部が同じtorrent
+        reupload = make_torrent(
+            os.path.join(self.tmp.name, "new"), "renamed.bin", self.payload[: PIECE_LENGTH * 2] + os.urandom(PIECE_LENGTH)
+        )
+        self.assertNotEqual(read_torrent(reupload)[0], read_torrent(self.known)[0])
+
+        matches = self.index.match(reupload)
+        self.assertEqual(len(matches), 1)
+        match = matches[0]
+        self.assertEqual(match.info_hash, read_torrent(self.known)[0])
+        self.assertEqual(match.name, "a.bin")
+        self.assertEqual(match.path, os.path.abspath(self.known))
+        self.assertEqual((match.shared, match.num_pieces), (2, 5))
+        self.assertEqual(match.pieces, [(0, 0), (1, 1)])
+
+        # 照合したtorrent自身は含まない
+        self.assertEqual(self.index.match(self.known), [])
+
+        # 誤検出として分類された証拠フォルダは除く
+        open(os.path.join(self.root, "known", FALSE_MARK), "w").close()
+        self.assertEqual(self.index.match(reupload), [])
+        self.assertEqual(len(self.index.match(reupload, exclude_false=False)), 1)
+
+    def test_same_torrent_in_other_folder(self):
+        self.index.build(self.root)
+        copy = os.path.join(self.tmp.name, "copy", "source.torrent")
+        os.makedirs(os.path.dirname(copy))
+        with open(self.known, "rb") as src, open(copy, "wb") as dst:
+            dst.write(src.read())
+
+        matches = self.index.match(copy)
+        self.assertEqual([(m.path, m.shared) for m in matches], [(os.path.abspath(self.known), 5)])
+        # 同じinfo_hashでも、別のフォルダのtorrentとして両方を保持する
+        self.assertTrue(self.index.add(copy))
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(len(self.index.match(self.known)), 1)
+
+    def test_lookup(self):
+        self.index.build(self.root)
+        _, _, _, pieces = read_torrent(self.known)
+        info_hash = read_torrent(self.known)[0]
+        self.assertEqual(self.index.lookup(pieces[20:40]), [(info_hash, 1)])
+        self.assertEqual(self.index.lookup(b"\x00" * 20), [])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import os
+import tempfile
+from unittest import TestCase, main
+import libtorrent as lt
+from utils.binary_matcher import BinaryMatcher
+from utils.piece_reader import PieceReader
+
+PIECE_LENGTH = 16 * 1024
+SIZES = {"b.bin": PIECE_LENGTH + 5, "a/z.bin": PIECE_LENGTH // 3, "a/c.bin": 2 * PIECE_LENGTH}
+
+
+class TestPieceReader(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        payload = os.path.join(self.folder, "payload")
+        for name, size in SIZES.items():
+            path = os.path.join(payload, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(os.urandom(size))
+
+        # torrent内のファイルの順序は、os.walkでファイル名を並べた順序とは一致しない
+        fs = lt.file_storage()
+        for name in ("b.bin", "a/z.bin", "a/c.bin"):
+            fs.add_file(os.path.join("payload", name), SIZES[name])
+        t = lt.create_torrent(fs, PIECE_LENGTH, flags=lt.create_torrent.v1_only)
+        lt.set_piece_hashes(t, self.folder)
+        self.torrent_path = os.path.join(self.folder, "source.torrent")
+        with open(self.torrent_path, "wb") as f:
+            f.write(lt.bencode(t.generate()))
+
+        self.payload = b""
+        for name in ("b.bin", "a/z.bin", "a/c.bin"):
+            with open(os.path.join(payload, name), "rb") as f:
+                self.payload += f.read()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_spans(self):
+        with PieceReader(self.torrent_path) as reader:
+            self.assertEqual(len(reader), 4)
+            self.assertEqual(reader.spans(0), [(0, 0, PIECE_LENGTH)])
+            self.assertEqual(
+                reader.spans(1),
+                [(0, PIECE_LENGTH, 5), (1, 0, PIECE_LENGTH // 3), (2, 0, PIECE_LENGTH - 5 - PIECE_LENGTH // 3)],
+            )
+            self.assertEqual(reader.piece_size(3), len(self.payload) - 3 * PIECE_LENGTH)
+            with self.assertRaises(IndexError):
+                reader.spans(4)
+
+    def test_read(self):
+        with PieceReader(self.torrent_path) as reader:
+            for piece in range(len(reader)):
+                data = reader.read(piece)
+                self.assertEqual(bytes(data), self.payload[piece * PIECE_LENGTH : (piece + 1) * PIECE_LENGTH])
+            # 1つのファイルに収まるピースはコピーせずに返す
+            self.assertIsInstance(reader.read(0), memoryview)
+
+        os.remove(os.path.join(self.folder, "payload", "a", "z.bin"))
+        with PieceReader(self.torrent_path) as reader:
+            self.assertIsNotNone(reader.read(0))
+            self.assertIsNone(reader.read(1))
+
+    def test_binary_match(self):
+        matcher = BinaryMatcher(self.torrent_path)
+        piece_folder = os.path.join(self.folder, "127.0.0.1_6881")
+        os.makedirs(piece_folder)
+        for piece in range(4):
+            with open(os.path.join(piece_folder, f"{piece}.bin"), "wb") as f:
+                f.write(self.payload[piece * PIECE_LENGTH : (piece + 1) * PIECE_LENGTH])
+            self.assertEqual(matcher.binary_match(f"{piece}.bin", piece_folder), piece)
+
+        data = self.payload[PIECE_LENGTH : 2 * PIECE_LENGTH]
+        self.assertEqual(matcher.instant_binary_match(data, 1), 1)
+        self.assertFalse(matcher.instant_binary_match(data, 2))
+        self.assertFalse(matcher.instant_binary_match(data, 4))
+        self.assertTrue(matcher.verify_reference().complete)
+
+
+class TestPieceReaderV2(TestCase):
+    # ピースハッシュ（pieces）とfilesを持たない、v2のみのtorrent
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_torrent(self, path):
+        fs = lt.file_storage()
+        lt.add_files(fs, path)
+        t = lt.create_torrent(fs, PIECE_LENGTH, flags=lt.create_torrent.v2_only)
+        lt.set_piece_hashes(t, self.folder)
+        torrent_path = os.path.join(self.folder, "source.torrent")
+        with open(torrent_path, "wb") as f:
+            f.write(lt.bencode(t.generate()))
+        return torrent_path
+
+    def test_single_file(self):
+        payload = os.urandom(2 * PIECE_LENGTH + 7)
+        with open(os.path.join(self.folder, "payload.bin"), "wb") as f:
+            f.write(payload)
+        torrent_path = self.make_torrent(os.path.join(self.folder, "payload.bin"))
+
+        with PieceReader(torrent_path) as reader:
+            self.assertEqual(reader.hashes, b"")
+            self.assertEqual(reader.files, [(os.path.join(self.folder, "payload.bin"), len(payload))])
+            self.assertEqual(len(reader), 3)
+            self.assertEqual(bytes(reader.read(2)), payload[2 * PIECE_LENGTH :])
+
+        # v2のみのtorrentでも、すべてのピースとの比較で照合できる
+        matcher = BinaryMatcher(torrent_path)
+        self.assertEqual(matcher.match_bytes(payload[PIECE_LENGTH : 2 * PIECE_LENGTH]), 1)
+        self.assertFalse(matcher.match_bytes(os.urandom(PIECE_LENGTH)))
+
+    def test_multi_file(self):
+        sizes = {"a.bin": PIECE_LENGTH + 5, "b.bin": PIECE_LENGTH // 2, "c/d.bin": PIECE_LENGTH}
+        data = {}
+        for name, size in sizes.items():
+            path = os.path.join(self.folder, "payload", name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data[name] = os.urandom(size)
+            with open(path, "wb") as f:
+                f.write(data[name])
+        torrent_path = self.make_torrent(os.path.join(self.folder, "payload"))
+        info = lt.torrent_info(torrent_path)
+
+        with PieceReader(torrent_path) as reader:
+            # 各ファイルはピースの境界から始まり、間はパディング（libtorrentと同じ配置）
+            self.assertEqual(len(reader), info.num_pieces())
+            self.assertEqual(reader.total_size, info.total_size())
+            self.assertEqual(bytes(reader.read(0)), data["a.bin"][:PIECE_LENGTH])
+            self.assertEqual(bytes(reader.read(1)), data["a.bin"][PIECE_LENGTH:] + bytes(PIECE_LENGTH - 5))
+            self.assertEqual(bytes(reader.read(2)), data["b.bin"] + bytes(PIECE_LENGTH // 2))
+            self.assertEqual(bytes(reader.read(3)), data["c/d.bin"])
+
+
+if __name__ == "__main__":
+    main()
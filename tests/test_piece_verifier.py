@@ -0,0 +1,82 @@
+import os
+import tempfile
+from unittest import TestCase, main
+import libtorrent as lt
+from utils.piece_verifier import PieceVerifier
+
+PIECE_LENGTH = 16 * 1024
+
+
+def make_torrent(folder, name, sizes, flags=0):
+    # folder/nameに指定したサイズのファイル（複数の場合はフォルダ）を作成し、source.torrentを書き出す
+    target = os.path.join(folder, name)
+    if len(sizes) == 1:
+        with open(target, "wb") as f:
+            f.write(os.urandom(sizes[0]))
+    else:
+        os.makedirs(os.path.join(target, "sub"))
+        for i, size in enumerate(sizes):
+            with open(os.path.join(target, "sub" if i % 2 else "", f"{i}.bin"), "wb") as f:
+                f.write(os.urandom(size))
+
+    fs = lt.file_storage()
+    lt.add_files(fs, target)
+    t = lt.create_torrent(fs, PIECE_LENGTH, flags=flags)
+    lt.set_piece_hashes(t, folder)
+    torrent_path = os.path.join(folder, "source.torrent")
+    with open(torrent_path, "wb") as f:
+        f.write(lt.bencode(t.generate()))
+    return torrent_path
+
+
+class TestPieceVerifier(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_single_file(self):
+        torrent_path = make_torrent(self.folder, "payload.bin", [PIECE_LENGTH * 5 + 100])
+        verifier = PieceVerifier(torrent_path, workers=2)
+        self.assertEqual(verifier.num_pieces, 6)
+
+        result = verifier.verify()
+        self.assertTrue(result.complete)
+        self.assertEqual(result.bytes_hashed, PIECE_LENGTH * 5 + 100)
+        self.assertGreater(result.mbps, 0)
+
+        # 1バイトだけ書き換えたピースのみ不一致になる
+        with open(os.path.join(self.folder, "payload.bin"), "r+b") as f:
+            f.seek(PIECE_LENGTH * 2 + 10)
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        result = verifier.verify()
+        self.assertFalse(result.complete)
+        self.assertEqual(result.failed, [2])
+
+        # 指定しなかったピースは検証しない
+        result = verifier.verify([0, 1])
+        self.assertEqual(result.pieces[:2], [True, True])
+        self.assertEqual(result.missing, [2, 3, 4, 5])
+
+    def test_multi_file(self):
+        sizes = [PIECE_LENGTH // 2, PIECE_LENGTH * 2 + 3, 0, PIECE_LENGTH + 7]
+        for flags in (lt.create_torrent.v1_only, 0):  # 0はパディングファイルを含むハイブリッド形式
+            with self.subTest(flags=flags):
+                with tempfile.TemporaryDirectory() as folder:
+                    torrent_path = make_torrent(folder, "payload", sizes, flags)
+                    self.assertTrue(PieceVerifier(torrent_path).verify().complete)
+
+                    os.remove(os.path.join(folder, "payload", "sub", "3.bin"))
+                    result = PieceVerifier(torrent_path).verify()
+                    self.assertFalse(result.complete)
+                    self.assertFalse(result.failed)
+                    self.assertIn(len(result) - 1, result.missing)
+                    self.assertIs(result.pieces[0], True)
+
+
+if __name__ == "__main__":
+    main()
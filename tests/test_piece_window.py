@@ -0,0 +1,80 @@
+from unittest import TestCase, main
+from torrent.piece_window import LOOKAHEAD, PRIORITY_SKIP, PRIORITY_WINDOW, PieceWindow
+
+
+class TestPieceWindow(TestCase):
+    def test_rotation(self):
+        window = PieceWindow(10, size=3, have=[2], start=8)
+        # 8, 9, 0, 1, 3, 4, 5, 6, 7 の順に取得し、最後の7は取得しない
+        self.assertEqual(window.window, {8, 9, 0})
+        self.assertEqual(window.reserved, 7)
+
+        priorities = window.priorities()
+        self.assertEqual(
+            [i for i, p in enumerate(priorities) if p == PRIORITY_WINDOW], [0, 8, 9]
+        )
+        self.assertEqual(priorities[2], PRIORITY_SKIP)
+
+        self.assertEqual(window.complete(9), [(1, PRIORITY_WINDOW)])
+        self.assertEqual(window.complete(9), [])  # 重複した通知は無視する
+        self.assertEqual(window.complete(5), [])  # 窓の外のピース
+        self.assertEqual(window.complete(8), [(3, PRIORITY_WINDOW)])
+        self.assertEqual(window.complete(0), [(4, PRIORITY_WINDOW)])
+        # 窓の外で完了していた5は飛ばす
+        self.assertEqual(window.complete(1), [(6, PRIORITY_WINDOW)])
+
+        for piece in (3, 4):
+            window.complete(piece)
+        self.assertFalse(window.exhausted)
+        window.complete(6)
+        self.assertTrue(window.exhausted)
+        self.assertNotIn(7, window.completed)
+
+    def test_available(self):
+        window = PieceWindow(6, size=2, start=0)
+        self.assertEqual(window.window, {0, 1})
+        # 保有するピアがいないピース2は後回しにする
+        self.assertEqual(window.complete(0, lambda piece: piece != 2), [(3, PRIORITY_WINDOW)])
+        self.assertEqual(window.complete(1, lambda piece: piece != 2), [(4, PRIORITY_WINDOW)])
+        window.complete(3, lambda piece: False)
+        # 窓が空になる場合は、保有するピアがいなくても加える
+        self.assertEqual(window.complete(4, lambda piece: False), [(2, PRIORITY_WINDOW)])
+
+    def test_lookahead(self):
+        # 保有するピアがいないピースが続いても、1回に確認するのはLOOKAHEAD個まで
+        window = PieceWindow(1000, size=2, start=0)
+        checked = []
+
+        def available(piece):
+            checked.append(piece)
+            return False
+
+        window.complete(0, available)
+        self.assertEqual(len(checked), LOOKAHEAD)
+        self.assertEqual(checked[0], 2)
+        # 後回しにしたピースはキューの末尾に戻り、次の確認は続きから始まる
+        checked.clear()
+        window.complete(5, available)  # 窓の外のピース
+        window.complete(1, available)
+        self.assertEqual(checked[0], 2 + LOOKAHEAD)
+
+    def test_small_torrent(self):
+        # 1ピースのtorrentは、そのピースを取得するまでシーダーを観測する
+        window = PieceWindow(1, size=16)
+        self.assertFalse(window.exhausted)
+        self.assertIsNone(window.reserved)
+        self.assertEqual(window.priorities(), [PRIORITY_WINDOW])
+        self.assertEqual(window.complete(0), [])
+        self.assertTrue(window.exhausted)
+
+        window = PieceWindow(1, size=16, have=[0])
+        self.assertTrue(window.exhausted)
+        self.assertEqual(window.priorities(), [PRIORITY_SKIP])
+
+        window = PieceWindow(2, size=16, start=0)
+        self.assertEqual(window.window, {0})
+        self.assertEqual(window.reserved, 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import threading
+from unittest import TestCase, main
+from utils.public_ip import PublicIPService
+
+
+class _IPHandler(BaseHTTPRequestHandler):
+    # パスごとに返すアドレスと、受け付けたリクエスト数を保持する
+    addresses = {"/v4": "203.0.113.1", "/v6": "2001:db8::1"}
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        address = self.addresses.get(self.path)
+        if address is None:
+            self.send_response(500)
+            self.end_headers()
+            return
+        body = json.dumps({"ip": address}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestPublicIPService(TestCase):
+    def setUp(self):
+        _IPHandler.addresses = {"/v4": "203.0.113.1", "/v6": "2001:db8::1"}
+        _IPHandler.requests = 0
+        self.server = HTTPServer(("127.0.0.1", 0), _IPHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{self.server.server_port}"
+        self.service = PublicIPService(base + "/v4", base + "/v6", ttl=60, timeout=5)
+
+    def tearDown(self):
+        self.service.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_cache_within_ttl(self):
+        self.assertEqual(self.service.get(), ("203.0.113.1", "2001:db8::1"))
+        self.assertEqual(self.service.get(), ("203.0.113.1", "2001:db8::1"))
+        self.assertEqual(_IPHandler.requests, 2)  # IPv4とIPv6の1回ずつのみ
+
+    def test_notify_on_change(self):
+        changes = []
+        self.service.subscribe(lambda ipv4, ipv6: changes.append((ipv4, ipv6)))
+        self.service.refresh()
+        self.service.refresh()  # 変化がなければ通知しない
+
+        _IPHandler.addresses["/v4"] = "203.0.113.2"
+        self.service.refresh()
+
+        self.assertEqual(
+            changes,
+            [("203.0.113.1", "2001:db8::1"), ("203.0.113.2", "2001:db8::1")],
+        )
+
+    def test_keep_last_address_on_failure(self):
+        self.service.refresh()
+        del _IPHandler.addresses["/v6"]
+        self.assertEqual(self.service.refresh(), ("203.0.113.1", "2001:db8::1"))
+
+    def test_retry_after_failure(self):
+        # 取得に失敗した結果は、ttlではなくretry_interval秒だけ再利用する
+        self.service.retry_interval = 0
+        _IPHandler.addresses = {}
+        self.assertEqual(self.service.get(), (None, None))
+        self.assertEqual(self.service.get(), (None, None))
+        self.assertEqual(_IPHandler.requests, 4)
+
+        _IPHandler.addresses = {"/v4": "203.0.113.1"}
+        self.assertEqual(self.service.get(), ("203.0.113.1", None))
+        self.assertEqual(self.service.get(), ("203.0.113.1", None))
+        self.assertEqual(_IPHandler.requests, 6)  # IPv6のみ使えない場合は失敗としない
+
+
+if __name__ == "__main__":
+    main()
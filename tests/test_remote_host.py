@@ -0,0 +1,68 @@
+import os
+import random
+import tempfile
+from unittest import TestCase, main
+from utils.remote_host import ProviderMatcher, ProviderTable
+
+ROWS = [
+    ("ocn.ne.jp", "NTTコミュニケーションズ"),
+    ("ppp.dion.ne.jp", "KDDI（DION）"),
+    ("dion.ne.jp", "KDDI"),
+    ("bbtec.net", "ソフトバンク"),
+    ("ne.jp", "その他"),
+]
+
+
+def _linear_scan(rows, remote_host):
+    # 従来の実装（ファイルの先頭から部分一致を探す）
+    for pattern, provider in rows:
+        if pattern in remote_host:
+            return provider
+    return None
+
+
+class TestProviderMatcher(TestCase):
+    def test_match(self):
+        matcher = ProviderMatcher(ROWS)
+        self.assertEqual(matcher.match("p123-ipngn.tokyo.ocn.ne.jp"), "NTTコミュニケーションズ")
+        self.assertEqual(matcher.match("abc.ppp.dion.ne.jp"), "KDDI（DION）")
+        self.assertEqual(matcher.match("abc.dion.ne.jp"), "KDDI")
+        self.assertEqual(matcher.match("softbank1.bbtec.net"), "ソフトバンク")
+        self.assertEqual(matcher.match("example.ne.jp"), "その他")
+        self.assertIsNone(matcher.match("dns.google"))
+        self.assertEqual(ProviderMatcher([("", "空")]).match("dns.google"), "空")
+
+    def test_same_as_linear_scan(self):
+        rng = random.Random(0)
+        rows = [
+            ("".join(rng.choice("abn.") for _ in range(rng.randint(1, 4))), str(i))
+            for i in range(200)
+        ]
+        matcher = ProviderMatcher(rows)
+        for _ in range(500):
+            host = "".join(rng.choice("abcn.") for _ in range(rng.randint(0, 12)))
+            self.assertEqual(matcher.match(host), _linear_scan(rows, host), host)
+
+
+class TestProviderTable(TestCase):
+    def test_reload_on_modification(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "remote_host.csv")
+            table = ProviderTable(path)
+            self.assertIsNone(table.match("abc.ocn.ne.jp"))
+
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("ocn.ne.jp,NTTコミュニケーションズ\n")
+            matcher = table.get_matcher()
+            self.assertEqual(table.match("abc.ocn.ne.jp"), "NTTコミュニケーションズ")
+            self.assertIs(table.get_matcher(), matcher)
+
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("ocn.ne.jp,OCN\n")
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            self.assertEqual(table.match("abc.ocn.ne.jp"), "OCN")
+
+
+if __name__ == "__main__":
+    main()
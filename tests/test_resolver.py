@@ -0,0 +1,144 @@
+import asyncio
+import socket
+import threading
+import time
+from unittest import TestCase, main
+from utils.resolver import HostResolver, ReverseResolver
+
+
+class _FakeDNS:
+    # ホスト名ごとに決めたアドレスを返す、getaddrinfo互換の名前解決
+    def __init__(self):
+        self.records = {
+            "tracker.example": ["192.0.2.1", "2001:db8::1"],
+            "slow.example": ["192.0.2.2"],
+        }
+        self.calls = []
+
+    def __call__(self, hostname, port):
+        self.calls.append(hostname)
+        if hostname == "slow.example":
+            time.sleep(1)
+        if hostname not in self.records:
+            raise socket.gaierror("名前解決できません")
+        return [
+            (socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, 0))
+            for address in self.records[hostname]
+        ]
+
+
+class TestHostResolver(TestCase):
+    def setUp(self):
+        self.dns = _FakeDNS()
+        self.resolver = HostResolver(
+            positive_ttl=60, negative_ttl=60, timeout=0.3, backend=self.dns
+        )
+
+    def test_resolve_many(self):
+        results = self.resolver.resolve_many(
+            ["tracker.example", "dead.example", "slow.example", "tracker.example", None]
+        )
+        self.assertEqual(results["tracker.example"], ["192.0.2.1", "2001:db8::1"])
+        self.assertEqual(results["dead.example"], [])
+        self.assertEqual(results["slow.example"], [])  # タイムアウト
+        self.assertEqual(sorted(self.dns.calls), sorted(set(self.dns.calls)))
+
+    def test_cache(self):
+        self.resolver.resolve("tracker.example")
+        self.resolver.resolve("dead.example")
+        self.resolver.resolve("tracker.example")
+        self.resolver.resolve("dead.example")
+        self.assertEqual(self.dns.calls, ["tracker.example", "dead.example"])
+
+    def test_cache_expiry(self):
+        resolver = HostResolver(positive_ttl=0, negative_ttl=0, backend=self.dns)
+        resolver.resolve("tracker.example")
+        resolver.resolve("tracker.example")
+        self.assertEqual(self.dns.calls, ["tracker.example", "tracker.example"])
+
+
+class _FakePTR:
+    # 同時に処理中の問い合わせ数を記録する、逆引きの代用サーバー
+    def __init__(self):
+        self.records = {"192.0.2.1": "host1.example.jp", "192.0.2.2": "host2.example.jp"}
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, ip):
+        self.calls.append(ip)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(1 if ip == "192.0.2.9" else 0.05)
+            if ip not in self.records:
+                raise socket.herror("PTRレコードがありません")
+            return self.records[ip]
+        finally:
+            self.active -= 1
+
+
+class TestReverseResolver(TestCase):
+    def setUp(self):
+        self.ptr = _FakePTR()
+        self.resolver = ReverseResolver(concurrency=2, timeout=0.3, backend=self.ptr)
+
+    def test_resolve_many(self):
+        ips = ["192.0.2.1", "192.0.2.2", "192.0.2.3", "192.0.2.9", "不正", "192.0.2.1"]
+        results = self.resolver.resolve_many_sync(ips)
+        self.assertEqual(
+            results,
+            {
+                "192.0.2.1": "host1.example.jp",
+                "192.0.2.2": "host2.example.jp",
+                "192.0.2.3": None,
+                "192.0.2.9": None,  # タイムアウト
+                "不正": None,
+            },
+        )
+        self.assertEqual(self.ptr.max_active, 2)
+
+    def test_cache(self):
+        self.resolver.resolve_many_sync(["192.0.2.1", "192.0.2.3"])
+        self.assertEqual(asyncio.run(self.resolver.resolve("192.0.2.1")), "host1.example.jp")
+        self.assertIsNone(asyncio.run(self.resolver.resolve("192.0.2.3")))
+        self.assertEqual(self.ptr.calls, ["192.0.2.1", "192.0.2.3"])
+
+    def test_blocking_backend(self):
+        resolver = ReverseResolver(backend=lambda ip: "host.example.jp")
+        self.assertEqual(resolver.resolve_many_sync(["192.0.2.1"]), {"192.0.2.1": "host.example.jp"})
+
+    def test_queued_behind_timeout(self):
+        # タイムアウトしたgethostbyaddrがスレッドを占有していても、後続の逆引きは失敗にしない
+        def backend(ip):
+            if ip == "192.0.2.9":
+                time.sleep(0.6)
+            return "host.example.jp"
+
+        resolver = ReverseResolver(concurrency=1, timeout=0.2, backend=backend)
+        results = resolver.resolve_many_sync(["192.0.2.9", "192.0.2.1"])
+        self.assertEqual(results, {"192.0.2.9": None, "192.0.2.1": "host.example.jp"})
+
+    def test_queue_timeout(self):
+        # スレッドが空かないままqueue_timeout秒を過ぎた逆引きは、実行せずに失敗とする
+        release = threading.Event()
+        calls = []
+
+        def backend(ip):
+            calls.append(ip)
+            release.wait(5)
+            return "host.example.jp"
+
+        resolver = ReverseResolver(concurrency=1, timeout=0.1, queue_timeout=0.2, backend=backend)
+        started = time.monotonic()
+        try:
+            results = resolver.resolve_many_sync(["192.0.2.9", "192.0.2.1"])
+        finally:
+            release.set()
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(results, {"192.0.2.9": None, "192.0.2.1": None})
+        self.assertEqual(calls, ["192.0.2.9"])
+
+
+if __name__ == "__main__":
+    main()
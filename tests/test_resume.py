@@ -0,0 +1,82 @@
+import os
+import tempfile
+from unittest import TestCase, main
+import libtorrent as lt
+from torrent.resume import file_signature, load_resume, resume_paths, save_resume
+
+
+class TestResume(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        with open(os.path.join(self.folder, "payload.bin"), "wb") as f:
+            f.write(os.urandom(64 * 1024))
+
+        fs = lt.file_storage()
+        lt.add_files(fs, os.path.join(self.folder, "payload.bin"))
+        t = lt.create_torrent(fs, 16 * 1024)
+        lt.set_piece_hashes(t, self.folder)
+        self.torrent_path = os.path.join(self.folder, "source.torrent")
+        with open(self.torrent_path, "wb") as f:
+            f.write(lt.bencode(t.generate()))
+        self.info = lt.torrent_info(self.torrent_path)
+
+        params = lt.add_torrent_params()
+        params.ti = self.info
+        params.save_path = self.folder
+        params.info_hashes = self.info.info_hashes()
+        self.data = lt.write_resume_data_buf(params)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        self.assertIsNone(load_resume(self.torrent_path, self.folder, self.info))
+        self.assertTrue(save_resume(self.torrent_path, self.folder, self.info, self.data))
+        for path in resume_paths(self.torrent_path):
+            self.assertTrue(os.path.exists(path))
+
+        params = load_resume(self.torrent_path, self.folder, self.info)
+        self.assertIsNotNone(params)
+        self.assertEqual(str(params.info_hashes.v1), str(self.info.info_hashes().v1))
+
+    def test_changed_file(self):
+        save_resume(self.torrent_path, self.folder, self.info, self.data)
+        payload = os.path.join(self.folder, "payload.bin")
+        st = os.stat(payload)
+        os.utime(payload, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        self.assertIsNone(load_resume(self.torrent_path, self.folder, self.info))
+
+        os.remove(payload)
+        self.assertIsNone(file_signature(self.info, self.folder))
+        self.assertIsNone(load_resume(self.torrent_path, self.folder, self.info))
+        self.assertFalse(save_resume(self.torrent_path, self.folder, self.info, self.data))
+
+    def test_pad_files(self):
+        # 複数ファイルのハイブリッドtorrentは、ディスクに存在しないパディングファイルを含む
+        payload = os.path.join(self.folder, "multi")
+        os.makedirs(payload)
+        for name, size in (("a.bin", 20 * 1024), ("b.bin", 5 * 1024)):
+            with open(os.path.join(payload, name), "wb") as f:
+                f.write(os.urandom(size))
+        fs = lt.file_storage()
+        lt.add_files(fs, payload)
+        t = lt.create_torrent(fs, 16 * 1024)
+        lt.set_piece_hashes(t, self.folder)
+        torrent_path = os.path.join(self.folder, "multi", "source.torrent")
+        info = lt.torrent_info(lt.bencode(t.generate()))
+        files = info.files()
+        self.assertTrue(
+            any(files.file_flags(i) & lt.file_storage.flag_pad_file for i in range(files.num_files()))
+        )
+
+        signature = file_signature(info, self.folder)
+        self.assertEqual(
+            [entry[0] for entry in signature],
+            [os.path.join("multi", "a.bin"), os.path.join("multi", "b.bin")],
+        )
+        self.assertTrue(save_resume(torrent_path, self.folder, info, self.data))
+
+
+if __name__ == "__main__":
+    main()
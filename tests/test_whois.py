@@ -0,0 +1,172 @@
+import asyncio
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+from ipaddress import ip_network
+from unittest import TestCase, main
+from utils.whois import WhoisCache, WhoisScheduler, parse_whois_reply
+
+REPLY = """
+Network Information:
+a. [IPネットワークアドレス]     202.224.0.0/16
+a. [IPネットワークアドレス]     202.224.32.0-202.224.63.255
+b. [ネットワーク名]             EXAMPLE-NET
+f. [組織名]                     株式会社サンプル通信
+"""
+
+
+class TestParseWhoisReply(TestCase):
+    def test_parse(self):
+        provider, network = parse_whois_reply(REPLY, "202.224.40.1")
+        self.assertEqual(provider, "サンプル通信")
+        self.assertEqual(network, ip_network("202.224.32.0/19"))
+
+        _, network = parse_whois_reply(REPLY, "202.224.1.1")
+        self.assertEqual(network, ip_network("202.224.0.0/16"))
+
+        provider, network = parse_whois_reply("No match!!", "8.8.8.8")
+        self.assertEqual(provider, "取得失敗(JPNIC管理外)")
+        self.assertIsNone(network)
+
+
+class TestWhoisCache(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = WhoisCache(os.path.join(self.folder.name, "whois.sqlite3"))
+
+    def tearDown(self):
+        self.cache.close()
+        self.folder.cleanup()
+
+    def test_block(self):
+        self.cache.store("202.224.40.1", "広域", ip_network("202.224.0.0/16"))
+        self.cache.store("202.224.40.1", "サンプル通信", ip_network("202.224.32.0/19"))
+        self.assertEqual(self.cache.lookup("202.224.63.255"), "サンプル通信")
+        self.assertEqual(self.cache.lookup("202.224.64.0"), "広域")
+        self.assertIsNone(self.cache.lookup("202.225.0.0"))
+
+    def test_ipv6_aggregation(self):
+        self.cache.store("2001:db8:1:2::1", "サンプル通信")
+        self.assertEqual(self.cache.lookup("2001:db8:1:ffff::1"), "サンプル通信")
+        self.assertIsNone(self.cache.lookup("2001:db8:2::1"))
+
+        self.cache.store("2001:db8:9:1::1", "取得失敗(JPNIC管理外)", failed=True)
+        self.assertEqual(self.cache.lookup("2001:db8:9:1::2"), "取得失敗(JPNIC管理外)")
+        self.assertIsNone(self.cache.lookup("2001:db8:9:2::1"))
+
+    def test_persistence_and_failure_ttl(self):
+        self.cache.store("192.0.2.1", "取得失敗(JPNIC管理外)", failed=True)
+        self.cache.store("198.51.100.1", "サンプル通信", ip_network("198.51.100.0/24"))
+        self.cache.close()
+
+        self.cache = WhoisCache(self.cache.db_path, failure_ttl=0)
+        time.sleep(0.01)
+        self.assertIsNone(self.cache.lookup("192.0.2.1"))
+        self.assertEqual(self.cache.lookup("198.51.100.200"), "サンプル通信")
+
+
+class _WhoisStandIn:
+    # 最初のrefuse件の接続をリセットし、以降は遅延を入れて応答するWHOISサーバーの代用
+    def __init__(self, refuse=0, delay=0.05):
+        self.refuse = refuse
+        self.delay = delay
+        self.queries = []
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self.handle, "127.0.0.1", 0)
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    async def handle(self, reader, writer):
+        ip = (await reader.readline()).decode().strip()
+        self.queries.append(ip)
+        if self.refuse > 0:
+            self.refuse -= 1
+            sock = writer.get_extra_info("socket")
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            writer.transport.abort()
+            return
+        await asyncio.sleep(self.delay)
+        reply = REPLY if ip.startswith("202.224.") else "No match!!"
+        writer.write(reply.encode("iso-2022-jp"))
+        await writer.drain()
+        writer.close()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class TestWhoisScheduler(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = WhoisCache(os.path.join(self.folder.name, "whois.sqlite3"))
+
+    def tearDown(self):
+        self.cache.close()
+        self.folder.cleanup()
+
+    def test_backoff_and_dedupe(self):
+        server = _WhoisStandIn(refuse=2)
+        scheduler = WhoisScheduler(
+            "127.0.0.1",
+            server.port,
+            interval=0.01,
+            cache=self.cache,
+            initial_backoff=0.1,
+        )
+        streamed = []
+        try:
+            results = scheduler.lookup_many(
+                ["202.224.40.1", "202.224.40.2", "202.224.40.1", "8.8.8.8"],
+                callback=lambda ip, provider: streamed.append(ip),
+            )
+        finally:
+            scheduler.stop()
+            server.close()
+
+        self.assertEqual(
+            results,
+            {
+                "202.224.40.1": "サンプル通信",
+                "202.224.40.2": "サンプル通信",  # 同じブロックのためキャッシュから解決
+                "8.8.8.8": "取得失敗(JPNIC管理外)",
+            },
+        )
+        self.assertEqual(sorted(streamed), sorted(results))
+        # 2回拒否された後に成功し、同じブロックのIPアドレスは問い合わせない
+        self.assertEqual(
+            server.queries, ["202.224.40.1"] * 3 + ["8.8.8.8"]
+        )
+        self.assertEqual(self.cache.lookup("202.224.50.1"), "サンプル通信")
+
+    def test_give_up_after_retries(self):
+        server = _WhoisStandIn(refuse=10)
+        scheduler = WhoisScheduler(
+            "127.0.0.1",
+            server.port,
+            interval=0.01,
+            max_retries=1,
+            initial_backoff=0.05,
+        )
+        try:
+            started = time.monotonic()
+            self.assertEqual(
+                scheduler.lookup("202.224.40.1"), "取得失敗（Whoisサーバーからの拒否）"
+            )
+            self.assertGreaterEqual(time.monotonic() - started, 0.05)
+            self.assertGreater(scheduler.backoff, 0)
+        finally:
+            scheduler.stop()
+            server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# ピースを構成するブロックを送ってきたピアを記録し、ハッシュ検証の結果をピアごとに帰属させるモジュール
+# 標準ライブラリ
+import asyncio
+from collections import defaultdict
+import logging
+import os
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PieceAttribution:
+    """
+    block_finished・piece_finished・hash_failedのイベントから、どのピアが
+    検証済みのピース（または破損したピース）を送ってきたかを記録する。
+
+    capture_folderを指定した場合、1つのピアだけから受け取った検証済みのピースを
+    read_pieceで読み出し、<capture_folder>/<IPアドレス>_<ポート番号>/<ピース番号>.bin
+    として保存する（chore/binary_match_tester.pyで照合できる配置）。
+    """
+
+    def __init__(self, capture_folder: Optional[str] = None) -> None:
+        """
+        Parameters
+        ----------
+        capture_folder : str
+            ピースを保存する証拠フォルダのパス。Noneの場合は保存しない。
+        """
+        self.capture_folder = capture_folder
+        self.verified: dict[tuple[str, int], set[int]] = defaultdict(set)  # ピア→検証済みのピース
+        self.failed: dict[tuple[str, int], set[int]] = defaultdict(set)  # ピア→破損したピース
+        self.captured: list[str] = []  # 保存したファイルのパス
+        self._blocks: dict[int, dict[int, tuple[str, int]]] = defaultdict(dict)  # ピース→ブロック→ピア
+        self._pending_reads: dict[int, tuple[str, int]] = {}  # 読み出し中のピース→保存先のピア
+
+    @property
+    def pending_reads(self) -> int:
+        # 保存を待っているピースの数
+        return len(self._pending_reads)
+
+    def is_valid(self, peer: tuple[str, int]) -> bool:
+        """
+        ピアから破損したピースを受け取っていなければTrue。
+        """
+        return peer not in self.failed
+
+    def verified_count(self, peer: tuple[str, int]) -> int:
+        """
+        ピアが送ってきた（一部のブロックを含む）検証済みのピースの数を返す。
+        """
+        return len(self.verified.get(peer, ()))
+
+    def block_finished(self, piece: int, block: int, peer: tuple[str, int]) -> None:
+        self._blocks[piece][block] = (peer[0], peer[1])
+
+    def piece_finished(self, piece: int) -> set[tuple[str, int]]:
+        """
+        検証済みのピースを、ブロックを送ってきたピアに帰属させる。
+
+        Returns
+        -------
+        peers : set of (str, int)
+            ピースのブロックを送ってきたピア。
+        """
+        peers = set(self._blocks.pop(piece, {}).values())
+        for peer in peers:
+            self.verified[peer].add(piece)
+        return peers
+
+    def hash_failed(self, piece: int) -> set[tuple[str, int]]:
+        """
+        ハッシュが一致しなかったピースを、ブロックを送ってきたピアに帰属させる。
+        libtorrentはこのピースを再度ダウンロードするため、ブロックの記録は破棄する。
+        """
+        peers = set(self._blocks.pop(piece, {}).values())
+        for peer in peers:
+            self.failed[peer].add(piece)
+        return peers
+
+    async def handle_event(self, event, handle) -> None:
+        """
+        AlertEngineのイベントを反映する。対象外のイベントは無視する。
+
+        Parameters
+        ----------
+        event : TorrentEvent
+            block_finished, piece_finished, hash_failed, read_pieceのいずれか。
+        handle : torrent_handle
+            ピースを読み出すtorrentのハンドル。
+        """
+        if event.kind == "block_finished":
+            self.block_finished(*event.data)
+        elif event.kind == "hash_failed":
+            peers = self.hash_failed(event.data)
+            logger.info(f"ピース {event.data} のハッシュが一致しませんでした: {sorted(peers)}")
+        elif event.kind == "piece_finished":
+            peers = self.piece_finished(event.data)
+            if self.capture_folder and len(peers) == 1:
+                # 1つのピアだけから受け取ったピースのみ、そのピアの証拠として保存する
+                self._pending_reads[event.data] = next(iter(peers))
+                handle.read_piece(event.data)
+        elif event.kind == "read_piece":
+            piece, data = event.data
+            peer = self._pending_reads.pop(piece, None)
+            if peer is None:
+                return
+            if data is None:
+                logger.warning(f"ピース {piece} の読み出しに失敗しました。")
+                return
+            loop = asyncio.get_running_loop()
+            path = await loop.run_in_executor(None, self.save_piece, peer, piece, data)
+            self.captured.append(path)
+
+    def save_piece(self, peer: tuple[str, int], piece: int, data: bytes) -> str:
+        """
+        ピースを<capture_folder>/<IPアドレス>_<ポート番号>/<ピース番号>.binに保存する。
+        """
+        if self.capture_folder is None:
+            raise ValueError("ピースの保存先（capture_folder）が指定されていません。")
+        peer_folder = os.path.join(
+            self.capture_folder, f"{peer[0].replace(':', '-')}_{peer[1]}"
+        )
+        os.makedirs(peer_folder, exist_ok=True)
+        path = os.path.join(peer_folder, f"{piece}.bin")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
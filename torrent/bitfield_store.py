@@ -0,0 +1,162 @@
+# ピアが保有するピースのビットフィールドを、周回ごとの差分として記録するモジュール
+# 標準ライブラリ
+import base64
+import json
+import logging
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+def pack_bits(pieces) -> bytes:
+    """
+    bool値のリスト（peer_info.pieces）を、BitTorrentのbitfieldメッセージと同じ
+    上位ビットから詰めたバイト列に変換する。
+    """
+    packed = bytearray((len(pieces) + 7) // 8)
+    for i, have in enumerate(pieces):
+        if have:
+            packed[i >> 3] |= 0x80 >> (i & 7)
+    return bytes(packed)
+
+
+def has_bit(packed: bytes, piece: int) -> bool:
+    """
+    パック済みのビットフィールドで、指定したピースを保有しているかを返す。
+    """
+    return bool(packed[piece >> 3] & (0x80 >> (piece & 7)))
+
+
+def _xor(a: bytes, b: bytes) -> bytes:
+    return (int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).to_bytes(len(a), "big")
+
+
+def _encode(data: bytes) -> str:
+    return base64.b64encode(zlib.compress(data)).decode("ascii")
+
+
+def _decode(text: str) -> bytes:
+    return zlib.decompress(base64.b64decode(text))
+
+
+class BitfieldStore:
+    """
+    torrentごとに、ピアのビットフィールドの履歴を保持する。
+
+    ピアごとに最初の記録は全体（full）、以降は前回との排他的論理和（delta）を
+    zlibで圧縮して記録し、変化がない周回は記録しない。
+    記録は証拠フォルダのbitfields_<info_hash>.jsonlに1行1件で追記する。
+    """
+
+    def __init__(self, path: str, num_pieces: int) -> None:
+        """
+        Parameters
+        ----------
+        path : str
+            記録ファイルのパス。
+        num_pieces : int
+            torrentのピース数。
+        """
+        self.path = path
+        self.num_pieces = num_pieces
+        self._latest: dict[tuple[str, int], bytes] = {}  # ピア→最新のビットフィールド
+        self._pending: list[str] = []  # 未書き込みの行
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def record(self, peer: tuple[str, int], pieces, timestamp: str) -> bool:
+        """
+        ピアのビットフィールドを記録する。前回から変化がなければ何もしない。
+
+        Parameters
+        ----------
+        peer : (str, int)
+            ピアのIPアドレスとポート番号。
+        pieces : list of bool or bytes
+            peer_info.pieces、またはパック済みのビットフィールド。
+        timestamp : str
+            記録時刻の文字列。
+
+        Returns
+        -------
+        changed : bool
+            記録した場合はTrue。
+        """
+        packed = pieces if isinstance(pieces, bytes) else pack_bits(pieces)
+        previous = self._latest.get(peer)
+        if previous == packed:
+            return False
+
+        entry = {"ip": peer[0], "port": peer[1], "time": timestamp}
+        if previous is None or len(previous) != len(packed):
+            entry["full"] = _encode(packed)
+        else:
+            entry["delta"] = _encode(_xor(previous, packed))
+        self._latest[peer] = packed
+        self._pending.append(json.dumps(entry, ensure_ascii=False))
+        return True
+
+    def latest(self, peer: tuple[str, int]):
+        """
+        ピアの最新のビットフィールド（パック済み）を返す。記録がなければNone。
+        """
+        return self._latest.get(peer)
+
+    def peers_with(self, piece: int) -> list[tuple[str, int]]:
+        """
+        最新の記録で、指定したピースを保有しているピアのリストを返す。
+        """
+        return [peer for peer, packed in self._latest.items() if has_bit(packed, piece)]
+
+    def available(self, piece: int) -> bool:
+        """
+        記録したピアのいずれかが、指定したピースを保有していればTrue。
+        """
+        return any(has_bit(packed, piece) for packed in self._latest.values())
+
+    def flush(self) -> int:
+        """
+        未書き込みの記録をファイルに追記する。
+
+        Returns
+        -------
+        count : int
+            書き込んだ行数。
+        """
+        if not self._pending:
+            return 0
+        lines, self._pending = self._pending, []
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return len(lines)
+
+    @staticmethod
+    def history(path: str):
+        """
+        記録ファイルを読み込み、各記録時点のビットフィールドを復元する。
+
+        Yields
+        ------
+        (peer, timestamp, packed) : ((str, int), str, bytes)
+            ピア、記録時刻、その時点のパック済みのビットフィールド。
+        """
+        latest: dict[tuple[str, int], bytes] = {}
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                peer = (entry["ip"], entry["port"])
+                if "full" in entry:
+                    packed = _decode(entry["full"])
+                elif peer in latest:
+                    packed = _xor(latest[peer], _decode(entry["delta"]))
+                else:
+                    logger.warning(f"{peer} の差分に対応する記録がありません。")
+                    continue
+                latest[peer] = packed
+                yield peer, entry["time"], packed
@@ -1,29 +1,55 @@
 # 標準ライブラリ
+import asyncio
 import csv
 from datetime import datetime
+import functools
 import ipaddress
 from ipaddress import ip_address, ip_network
 import json
 import logging
 import os
-import re
 import shutil
-import socket
 import tempfile
+import threading
 import time
+from typing import Awaitable, Optional, TypeVar
 import urllib.parse
 
 # サードパーティライブラリ
 import libtorrent as lt
-import requests
-from requests.exceptions import RequestException
 
 # 独自モジュール
+from torrent.attribution import PieceAttribution
+from torrent.bitfield_store import BitfieldStore
+from torrent.engine import AlertEngine, next_event
+from torrent.harvest import Harvest
+from torrent.ip_index import IPRangeCache, IPRangeIndex
+from torrent.peer_log import PeerLogWriter, get_peer_log_index
+from torrent.peer_registry import PeerRecord
+from torrent.piece_window import PieceWindow
+from torrent.resume import load_resume, save_resume
+from torrent.session import SessionManager
 from utils.config import Config
+from utils.piece_verifier import PieceVerifier
+from utils.public_ip import PublicIPService, get_public_ip_service
+from utils.remote_host import ProviderTable
+from utils.resolver import HostResolver, ReverseResolver
 import utils.time as ut
+from utils.whois import WHOIS_CACHE_FILE, WhoisCache, WhoisScheduler
+
+T = TypeVar("T")  # _run_with_engineで実行するコルーチンの戻り値の型
 
 
 class Client:
+    STATUS_INTERVAL = 5  # ダウンロード状況を表示する間隔（秒）
+    STALL_TIMEOUT = 30  # この秒数だけ進捗がなければダウンロードを打ち切る
+    ROUND_INTERVAL = 3  # 既知のピアを追加収録する周回の間隔（秒）
+    MIN_ROUND_INTERVAL = 0.5  # ピアの接続をきっかけに周回する場合の最短間隔（秒）
+    HARVEST_TIMEOUT = 30  # ピア収集を続ける最大時間（秒）
+    IDLE_TIMEOUT = 10  # 対象ピアが1件も見つからない場合に打ち切るまでの時間（秒）
+    CAPTURE_TIMEOUT = 5  # 収集の終了後、読み出し中のピースの保存を待つ最大時間（秒）
+    RESUME_TIMEOUT = 10  # ダウンロード完了後、resumeデータの書き出しを待つ最大時間（秒）
+
     def __init__(self) -> None:
         logging.basicConfig(level=logging.INFO)
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -34,11 +60,82 @@ class Client:
         self.MAX_UPLOAD_LIMIT = int(self.UPLOAD_LIMIT) * 1000
         self.SETTING_FILE = con.SETTING_FILE
         self.REMOTE_HOST = con.REMOTE_HOST
+        self.PEER_LOG_FSYNC = con.PEER_LOG_FSYNC
+        self.PIECE_WINDOW = int(con.PIECE_WINDOW)
+        self.PIECE_ATTRIBUTION = con.PIECE_ATTRIBUTION
+        self.CAPTURE_PIECES = con.CAPTURE_PIECES
+        self.RECORD_BITFIELDS = con.RECORD_BITFIELDS
         self.logger = logging.getLogger(__name__)
+        # プロセス内で共有するセッション（torrentごとに作り直さない）
+        self.session_manager = SessionManager.get_instance(self.MY_PORT)
+        # セッションのアラートをコルーチンへ配信するエンジン
+        self.engine = AlertEngine.get_instance(self.session_manager)
+        if self.PIECE_ATTRIBUTION:
+            # ブロックごとの送信元を記録するため、block_finishedアラートを受け取る
+            self.engine.enable_alerts(lt.alert_category.block_progress)
+        # 自分自身のIPアドレスはバックグラウンドで更新し、変化したらIPフィルタに反映する
+        self.public_ips = _get_public_ip_service()
+
+    def download(self, torrent_path: str, save_path: str) -> bool:
+        """
+        指定した.torrentファイルをもとに本体ファイルをダウンロードする。
+        処理の内容はdownload_asyncを参照。
+
+        Parameters
+        ----------
+        torrent_path : str
+            .torrentファイルへのパス。
+        save_path : str
+            本体ファイルのダウンロード先のパス。
+
+        Returns
+        -------
+        result : bool
+            ダウンロードが完了した場合はTrue。
+        """
+        return asyncio.run(
+            self._run_with_engine(self.download_async(torrent_path, save_path))
+        )
+
+    def get_peer_log(
+        self, torrent_path: str, max_list_size: int = 20
+    ) -> list[PeerRecord]:
+        """
+        swarmに含まれるpeerのリストを取得する。
+        処理の内容はget_peer_log_asyncを参照。
+        """
+        return asyncio.run(
+            self._run_with_engine(self.get_peer_log_async(torrent_path, max_list_size))
+        )
+
+    def collect(
+        self, torrent_path: str, save_path: str, max_list_size: int = 20
+    ) -> tuple[bool, list[PeerRecord]]:
+        """
+        本体ファイルをダウンロードしながら、swarmに含まれるpeerのリストを取得する。
+        処理の内容はcollect_asyncを参照。
+        """
+        return asyncio.run(
+            self._run_with_engine(
+                self.collect_async(torrent_path, save_path, max_list_size)
+            )
+        )
+
+    async def _run_with_engine(self, coro: Awaitable[T]) -> T:
+        # アラートの配信を開始した状態でコルーチンを実行する
+        async with self.engine:
+            return await coro
 
-    def download(self, torrent_path: str, save_path: str) -> None:
+    async def download_async(self, torrent_path: str, save_path: str) -> bool:
         """
         指定した.torrentファイルをもとに本体ファイルをダウンロードする。
+        AlertEngineが動作しているイベントループ上で実行すること。
+
+        ダウンロードが完了したら、.torrentファイルと同じフォルダにresumeデータを保存する。
+        次回は本体ファイルのサイズ・更新時刻が変わっていなければ、それを読み込んで
+        ハッシュの再チェックを省く。resumeデータが使えない場合は、PieceVerifierで
+        全ピースを並列に検証し、すべて一致すればシードモードで、一部が一致すれば
+        そのピースを取得済み（have_pieces）として追加する。
 
         Parameters
         ----------
@@ -46,6 +143,11 @@ class Client:
             .torrentファイルへのパス。
         save_path : str
             本体ファイルのダウンロード先のパス。
+
+        Returns
+        -------
+        result : bool
+            ダウンロードが完了した場合はTrue。
         """
         info = lt.torrent_info(torrent_path)  # 当該証拠フォルダ内にあるsource.torrentの情報
         target_file_path = os.path.join(save_path, info.name())  # ダウンロード対象ファイルのパス
@@ -57,63 +159,105 @@ class Client:
             self.logger.info("本体ファイル" + target_file_path + "の状態を確認中...")
             new_file = False
 
-        # 設定ファイルで指定したポートをリスナーに設定し、セッションを開始
-        session = lt.session(
-            {"listen_interfaces": f"0.0.0.0:{self.MY_PORT},[::]:{self.MY_PORT}"}
-        )
+        # 前回の完了時に保存したresumeデータか、並列のハッシュ検証で再チェックを省く
+        resume_params, seed_mode, resumed = None, False, False
+        if not new_file:
+            resume_params, seed_mode, resumed = await self._check_existing(
+                torrent_path, save_path, info
+            )
 
-        # 本体ファイルのダウンロ－ドを開始
-        handle = session.add_torrent({"ti": info, "save_path": save_path})
+        # 共有セッションに追加して本体ファイルのダウンロ－ドを開始
+        # （本体ファイルの取得ではピア収集用のIPフィルタを適用しない）
+        handle = self.session_manager.add_torrent(
+            info,
+            save_path,
+            apply_ip_filter=False,
+            resume_params=resume_params,
+            seed_mode=seed_mode,
+        )
         handle.set_upload_limit(self.MAX_UPLOAD_LIMIT)
+        events = self.engine.subscribe(handle)
 
         # 進捗を追跡する変数
         last_downloaded = 0
 
         # 現在の時刻を記録
         last_time = time.time()
+        last_print = 0.0
 
-        while not handle.status().is_seeding:
+        try:
             current_status = handle.status()
-            if new_file:
-                _print_download_status(current_status, self.logger)
+            while not current_status.is_seeding:
+                # 状態の更新やダウンロード完了のアラートを待つ
+                event = await next_event(events, 1.0)
+                if event is not None and event.kind == "status":
+                    current_status = event.alert
+                else:
+                    current_status = handle.status()
+
+                if current_status.is_seeding:
+                    break
 
-            # 現在の進捗を取得
-            current_downloaded = current_status.total_done
+                # 現在の時刻を取得
+                current_time = time.time()
 
-            # 現在の時刻を取得
-            current_time = time.time()
+                if new_file and current_time - last_print >= self.STATUS_INTERVAL:
+                    _print_download_status(current_status, self.logger)
+                    last_print = current_time
 
-            # 経過時間を確認
-            if current_time - last_time >= 30:
-                # 進捗があるかどうかを確認
-                if current_downloaded == last_downloaded:
-                    self.logger.info("ダウンロードが進捗していないため、スキップします。")
-                    return False
+                # 経過時間を確認
+                if current_time - last_time >= self.STALL_TIMEOUT:
+                    # 現在の進捗を取得し、進捗があるかどうかを確認
+                    current_downloaded = current_status.total_done
+                    if current_downloaded == last_downloaded:
+                        self.logger.info("ダウンロードが進捗していないため、スキップします。")
+                        return False
 
-                # 進捗と時刻を更新
-                last_downloaded = current_downloaded
-                last_time = current_time
+                    # 進捗と時刻を更新
+                    last_downloaded = current_downloaded
+                    last_time = current_time
 
-            time.sleep(5)
+            if not resumed:
+                await self._save_resume(events, handle, torrent_path, save_path, info)
+        finally:
+            self.engine.unsubscribe(handle, events)
+            # 共有セッションから取り除き、シードは行わない
+            self.session_manager.remove_torrent(handle)
 
         self.logger.info("ダウンロード済み： %s", info.name())
         self.logger.info(
             "ハッシュ: %s, ファイルサイズ: %.2f MB, 時刻: %s"
             % (
-                handle.info_hash(),
+                info.info_hash(),
                 info.total_size() / 1048576,  # バイトをメガバイトに変換
                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             )
         )
         return True
 
-    def get_peer_log(
+    async def get_peer_log_async(
         self, torrent_path: str, max_list_size: int = 20
-    ) -> list[tuple[str, int]]:
+    ) -> list[PeerRecord]:
         """
         swarmに含まれるpeerのリストを取得する。
         swarm: all peers (including seeds) sharing a torrent
 
+        ピアの接続アラートを受け取るたびに（最短MIN_ROUND_INTERVAL秒間隔で）、
+        それ以外はROUND_INTERVAL秒ごとに接続済みピアを確認する。
+        AlertEngineが動作しているイベントループ上で実行すること。
+
+        設定のpiece_windowが1以上の場合、ダウンロードするピースをその数の窓に限定し、
+        ピースが完了するたびに窓を進める（一時フォルダへの書き込みは窓の分だけになる）。
+        0の場合は全体をダウンロードし、進捗が80%を超えた時点で打ち切る。
+
+        設定のpiece_attributionが有効な場合、各ブロックの送信元を記録し、ピースの
+        ハッシュ検証の結果をピアごとに帰属させる（破損ピースの有無はピアごとに判定する）。
+        capture_piecesも有効な場合、1つのピアだけから受け取った検証済みのピースを
+        証拠フォルダの<IPアドレス>_<ポート番号>フォルダに保存する。
+
+        設定のrecord_bitfieldsが有効な場合、対象範囲の接続済みピアが保有するピースの
+        ビットフィールドを周回ごとに記録する（証拠フォルダのbitfields_<info_hash>.jsonl）。
+
         Parameters
         ----------
         torrent_path : str
@@ -123,50 +267,43 @@ class Client:
 
         Returns
         -------
-        peers : list of (str, int)
-            ピアのリスト。
+        log : list of PeerRecord
+            収録したピアの記録。同じピアを複数の周回で収録した場合は、その回数分含まれる。
         """
-        session = lt.session(
-            {"listen_interfaces": f"0.0.0.0:{self.MY_PORT},[::]:{self.MY_PORT}"}
-        )
-
+        loop = asyncio.get_running_loop()
         info = lt.torrent_info(torrent_path)
 
         # 自分のIPを取得する_get_public_ips()を呼び出し、結果を2つの変数に格納
-        ipv4, ipv6 = _get_public_ips()
+        ipv4, ipv6 = await loop.run_in_executor(None, _get_public_ips)
 
         # 自分のIPアドレスの、最初の4つのセクションを取得して除外リストに追加
+        excluded_ipv6_network = None
         if ipv6:
             excluded_ipv6_network = get_excluded_ipv6(ipv6)
 
         # 設定ファイル（ipv4.txt, ipv6.txt）で指定した範囲のみ許可する
-        ipv4_ranges = load_ip_ranges(4)
-        ipv6_ranges = load_ip_ranges(6)
+        # （統合済みの整数区間として索引化したものを、更新時刻が変わるまで再利用）
+        ip_index = _get_ip_range_cache().get_index()
 
         # すべてのピアを追加するフラグを、設定ファイルから読み込み
         add_all_peers = _load_peer_setting()
 
         if not add_all_peers:
-            ip_filter = _default_ip_filter(torrent_path)
-            # IPv4とIPv6の範囲を許可リストに追加
-            _add_ip_ranges_to_filter(ip_filter, ipv4_ranges, allow=True)
-            _add_ip_ranges_to_filter(ip_filter, ipv6_ranges, allow=True)
-
-            # excluded_ipv6_networkを禁止リストに追加
-            if excluded_ipv6_network:
-                start = str(excluded_ipv6_network[0])
-                end = str(excluded_ipv6_network[-1])
-                ip_filter.add_rule(start, end, 1)  # 1は禁止を意味する
-            if ipv4:
-                ip_filter.add_rule(ipv4, ipv4, 1)
-            if ipv6:
-                ip_filter.add_rule(ipv6, ipv6, 1)
-
-            session.set_ip_filter(ip_filter)
+            # 構築済みのIPフィルタに、自分自身のIPアドレスの禁止範囲を加えてセッションに適用
+            self.session_manager.apply_ip_filter(
+                _get_ip_filter_template(ip_index),
+                _get_self_blocked_ranges(ipv4, ipv6),
+            )
+            # トラッカーのIPアドレスを許可リストに追加
+            tracker_ips = await loop.run_in_executor(None, _get_tracker_ips, info)
+            self.session_manager.allow_addresses(tracker_ips)
 
         # ピア情報の取得時に使う一時フォルダの格納場所を、TORRENT_FOLDER内に作成
+        # 並行して収集する他のtorrentと衝突しないよう、info_hashごとに分ける
         torrent_folder = os.path.dirname(torrent_path)
-        tmp_path = os.path.join(os.path.dirname(torrent_folder), "tmp")  # 一時ファイル格納用
+        tmp_path = os.path.join(
+            os.path.dirname(torrent_folder), "tmp", str(info.info_hash())
+        )  # 一時ファイル格納用
 
         if os.path.exists(tmp_path):  # 自動削除に至らなかったケースに備え、いったん全て消す
             shutil.rmtree(tmp_path)
@@ -174,120 +311,378 @@ class Client:
         if not os.path.exists(tmp_path):  # 再生成
             os.makedirs(tmp_path, exist_ok=True)
 
-        peers: list[tuple[str, int]] = []  # 判定用にピアのIP（p.ip）だけを格納するリスト
-        RETRY_COUNTER = 10
-        log = []
+        bitfields = None  # 対象範囲のピアのビットフィールドの履歴
+        if self.RECORD_BITFIELDS:
+            bitfields = BitfieldStore(
+                os.path.join(torrent_folder, f"bitfields_{info.info_hash()}.jsonl"),
+                info.num_pieces(),
+            )
+        attribution = None
+        if self.PIECE_ATTRIBUTION:
+            attribution = PieceAttribution(
+                torrent_folder if self.CAPTURE_PIECES else None
+            )
+        harvest = Harvest(
+            ip_index,
+            ipv4,
+            ipv6,
+            excluded_ipv6_network,
+            add_all_peers,
+            self.ROUND_INTERVAL,
+            bitfields,
+            attribution,
+        )
 
         try:
             with tempfile.TemporaryDirectory(prefix="tmp", dir=tmp_path) as tmpdir:
                 # 一時ファイルとして対象ファイルを作成し、ダウンロードの進捗0％からスタート
-                handle = session.add_torrent({"ti": info, "save_path": tmpdir})
+                window = None
+                if self.PIECE_WINDOW > 0:
+                    window = PieceWindow(info.num_pieces(), self.PIECE_WINDOW)
+                handle = self.session_manager.add_torrent(
+                    info,
+                    tmpdir,
+                    apply_ip_filter=not add_all_peers,
+                    piece_priorities=window.priorities() if window else None,
+                )
                 handle.set_upload_limit(
                     self.MAX_UPLOAD_LIMIT
                 )  # 設定値（KB/s）をもとにアップロード速度を制限
+                events = self.engine.subscribe(handle)
 
-                valid_piece = True  # 破損ピースが検出されていなければTrue
+                started = time.time()
+                last_round = 0.0
+                cnt = 0
 
-                # アラートをポーリングして、破損したピースがあるかチェック
-                alerts = session.pop_alerts()
-                for alert in alerts:
-                    if isinstance(alert, lt.hash_failed_alert):
-                        valid_piece = False
-                        break
+                try:
+                    while True:
+                        wait = self.ROUND_INTERVAL - (time.time() - last_round)
+                        event = await next_event(events, wait)
+
+                        if event is not None:
+                            if attribution is not None:
+                                await attribution.handle_event(event, handle)
+                            if event.kind == "piece_finished" and window is not None:
+                                # 完了したピースを窓から外し、次の未取得のピースを加える
+                                piece = event.data
+                                available = bitfields.available if bitfields else None
+                                for next_piece, priority in window.complete(
+                                    piece, available
+                                ):
+                                    handle.piece_priority(next_piece, priority)
+                                continue
+                            if event.kind == "hash_failed":
+                                harvest.valid_piece = False  # 破損したピースを受信した
+                                continue
+                            if event.kind != "peer_connected":
+                                continue
+                            if time.time() - last_round < self.MIN_ROUND_INTERVAL:
+                                continue
 
-                cnt = 0
-                while cnt < RETRY_COUNTER:
-                    try:
-                        peer_info_list = handle.get_peer_info()  # 接続済みピアの情報を取得
-                        timestamp = ut.get_jst_str()
+                        last_round = time.time()
+                        cnt += 1
+                        try:
+                            # 接続済みピアの情報を取得し、条件を満たすシーダーを収録
+                            harvest.collect(
+                                handle.get_peer_info(), ut.get_jst_str(), last_round
+                            )
+                        except Exception as e:
+                            self.logger.warning(f"ループ中に例外が発生: {e}")
+
+                        if len(harvest) >= max_list_size:
+                            self.logger.info("取得ピア数の上限に達しました。")
+                            break
+
+                        if window is not None and window.exhausted:
+                            self.logger.info(
+                                "ダウンロードできる残りのピースがないため、ピア取得を終了します。(ループ" + str(cnt) + "回目)"
+                            )
+                            break
+
+                        if window is None and _over_progress(handle):
+                            self.logger.info(
+                                "ダウンロードの進捗が80%を超えたため、ピア取得を中断します。(ループ" + str(cnt) + "回目)"
+                            )
+                            break
+
+                        elapsed = time.time() - started
+                        if elapsed >= self.HARVEST_TIMEOUT:
+                            break
+
+                        if not harvest.registry and elapsed >= self.IDLE_TIMEOUT:
+                            self.logger.info("対象となるピアが見つからないため、ピア取得を終了します。")
+                            break
+
+                    await self._drain_piece_reads(events, handle, attribution)
+                finally:
+                    self.engine.unsubscribe(handle, events)
+                    # ログ書き込み処理の前に、ダウンロード・アップロードを完全に停止
+                    self.session_manager.remove_torrent(handle)
 
-                        for p in peer_info_list:
-                            if not p.seed:
-                                continue  # シーダーでなければ収録しない
+        except Exception:
+            try:
+                if os.path.exists(tmp_path):
+                    shutil.rmtree(tmp_path)
+                    logging.info("一時ファイルを削除しました。")
 
-                            key = (p.ip[0], p.ip[1])
-                            if key in peers and p.last_active == 0:
-                                p.timestamp = timestamp
-                                p.valid = valid_piece
-                                log.append(p)
-                                continue  # すでに存在するピアは、最終接続時刻（int秒前）が0なら追加収録
+            except Exception as e:
+                logging.warning(f"一時ファイルの削除に失敗しました: {e}")
 
-                            peer_ip = p.ip[0]
-                            if peer_ip == ipv4 or peer_ip == ipv6:
-                                continue  # 自分自身のIPと一致する場合は収録しない
+        return await self._save_harvest(info, torrent_folder, harvest)
 
-                            if not p.last_active == 0 or p.payload_down_speed <= 10240:
-                                continue  # 最終接続時刻が0秒前で、10KB/s以上のUP速度があるピアのみ収録
+    async def collect_async(
+        self, torrent_path: str, save_path: str, max_list_size: int = 20
+    ) -> tuple[bool, list[PeerRecord]]:
+        """
+        本体ファイルのダウンロードとピア収集を、1つのtorrentの追加で同時に行う。
+        AlertEngineが動作しているイベントループ上で実行すること。
 
-                            # IPアドレスが同じでポート番号が異なるピアは、同じ周回では重複して収録しない
-                            if any(peer[0] == peer_ip for peer in peers):
-                                continue
+        本体ファイルのダウンロードにはIPフィルタを適用しないため、対象範囲の判定は
+        周回ごとにIP範囲の索引で行い、条件はget_peer_log_asyncと同じにする。
+        ダウンロード中に接続したシーダーを収録し、max_list_size件に達した後は
+        ダウンロードだけを続ける。ダウンロード中に1件も収録できなかった場合
+        （本体ファイルがすでに揃っていた場合を含む）は、get_peer_log_asyncで収集する。
+        resumeデータの扱いはdownload_asyncと同じ。
 
-                            if add_all_peers:  # IP範囲を問わず、シーダーをすべて収録する場合
-                                if p.ip not in peers:
-                                    p.timestamp = timestamp
-                                    p.valid = valid_piece
-                                    log.append(p)
-                                    peers.append(p.ip)
-                                    continue
-
-                            if ip_address(peer_ip).version == 4:  # IPv4アドレスの場合
-                                if p.ip not in peers and _ip_in_range(
-                                    peer_ip, ipv4_ranges
-                                ):
-                                    p.timestamp = timestamp
-                                    p.valid = valid_piece
-                                    log.append(p)
-                                    peers.append(p.ip)
-
-                            elif ip_address(peer_ip).version == 6:
-                                # excluded_ipv6_networkがNoneでないかどうかを確認
-                                is_not_in_self_network = True
-                                if excluded_ipv6_network is not None:
-                                    is_not_in_self_network = (
-                                        ip_address(peer_ip) not in excluded_ipv6_network
-                                    )
-
-                                # その他の条件と組み合わせる
-                                if is_not_in_self_network and _ip_in_range(
-                                    peer_ip, ipv6_ranges
-                                ):
-                                    p.timestamp = timestamp
-                                    p.valid = valid_piece
-                                    log.append(p)
-                                    peers.append(p.ip)
-                    except Exception as e:
-                        self.logger.warning(f"ループ中に例外が発生: {e}")
+        Parameters
+        ----------
+        torrent_path : str
+            .torrentファイルへのパス。
+        save_path : str
+            本体ファイルのダウンロード先のパス。
+        max_list_size : int
+            取得されるピアのリストの最大長。
 
-                    cnt += 1
-                    if len(peers) == max_list_size:
-                        self.logger.info("取得ピア数の上限に達しました。")
-                        break
+        Returns
+        -------
+        result : bool
+            ダウンロードが完了した場合はTrue。
+        log : list of PeerRecord
+            収録したピアの記録。ダウンロードが完了しなかった場合も、それまでの記録を返す。
+        """
+        loop = asyncio.get_running_loop()
+        info = lt.torrent_info(torrent_path)
+        torrent_folder = os.path.dirname(torrent_path)
+        target_file_path = os.path.join(save_path, info.name())
+        new_file = not os.path.exists(target_file_path)
+        if new_file:
+            self.logger.info("本体ファイル" + target_file_path + "のダウンロードとピア収集を行います。")
+        else:
+            self.logger.info("本体ファイル" + target_file_path + "の状態を確認中...")
+
+        ipv4, ipv6 = await loop.run_in_executor(None, _get_public_ips)
+        excluded_ipv6_network = get_excluded_ipv6(ipv6) if ipv6 else None
+        ip_index = _get_ip_range_cache().get_index()
+        add_all_peers = _load_peer_setting()
+
+        bitfields = None
+        if self.RECORD_BITFIELDS:
+            bitfields = BitfieldStore(
+                os.path.join(torrent_folder, f"bitfields_{info.info_hash()}.jsonl"),
+                info.num_pieces(),
+            )
+        attribution = None
+        if self.PIECE_ATTRIBUTION:
+            attribution = PieceAttribution(
+                torrent_folder if self.CAPTURE_PIECES else None
+            )
+        harvest = Harvest(
+            ip_index,
+            ipv4,
+            ipv6,
+            excluded_ipv6_network,
+            add_all_peers,
+            self.ROUND_INTERVAL,
+            bitfields,
+            attribution,
+        )
 
-                    if _over_progress(handle):
-                        self.logger.info(
-                            "ダウンロードの進捗が80%を超えたため、ピア取得を中断します。(ループ" + str(cnt + 1) + "回目)"
+        resume_params, seed_mode, resumed = None, False, False
+        if not new_file:
+            resume_params, seed_mode, resumed = await self._check_existing(
+                torrent_path, save_path, info
+            )
+
+        handle = self.session_manager.add_torrent(
+            info,
+            save_path,
+            apply_ip_filter=False,
+            resume_params=resume_params,
+            seed_mode=seed_mode,
+        )
+        handle.set_upload_limit(self.MAX_UPLOAD_LIMIT)
+        events = self.engine.subscribe(handle)
+
+        last_downloaded = 0
+        last_time = time.time()
+        last_print = 0.0
+        last_round = 0.0
+
+        try:
+            current_status = handle.status()
+            while not current_status.is_seeding:
+                # 次の周回まで、状態の更新やピアの接続などのアラートを待つ
+                wait = 1.0
+                if len(harvest) < max_list_size:
+                    wait = min(wait, self.ROUND_INTERVAL - (time.time() - last_round))
+                event = await next_event(events, wait)
+                kind = event.kind if event is not None else None
+                if event is not None and attribution is not None:
+                    await attribution.handle_event(event, handle)
+                if kind == "hash_failed":
+                    harvest.valid_piece = False  # 破損したピースを受信した
+                if kind == "status":
+                    current_status = event.alert
+                else:
+                    current_status = handle.status()
+
+                if current_status.is_seeding:
+                    break
+
+                current_time = time.time()
+                since = current_time - last_round
+                # ピアの接続時（最短MIN_ROUND_INTERVAL秒間隔）と、ROUND_INTERVAL秒ごとに周回する
+                if len(harvest) < max_list_size and (
+                    since >= self.ROUND_INTERVAL
+                    or (kind == "peer_connected" and since >= self.MIN_ROUND_INTERVAL)
+                ):
+                    last_round = current_time
+                    try:
+                        harvest.collect(
+                            handle.get_peer_info(), ut.get_jst_str(), last_round
                         )
+                    except Exception as e:
+                        self.logger.warning(f"ループ中に例外が発生: {e}")
+                    if len(harvest) >= max_list_size:
+                        self.logger.info("取得ピア数の上限に達しました。ダウンロードを続けます。")
+
+                if new_file and current_time - last_print >= self.STATUS_INTERVAL:
+                    _print_download_status(current_status, self.logger)
+                    last_print = current_time
+
+                if current_time - last_time >= self.STALL_TIMEOUT:
+                    # 現在の進捗を取得し、進捗があるかどうかを確認
+                    current_downloaded = current_status.total_done
+                    if current_downloaded == last_downloaded:
+                        self.logger.info("ダウンロードが進捗していないため、スキップします。")
                         break
 
-                    time.sleep(3)
+                    last_downloaded = current_downloaded
+                    last_time = current_time
+
+            result = current_status.is_seeding
+            await self._drain_piece_reads(events, handle, attribution)
+            if result and not resumed:
+                await self._save_resume(events, handle, torrent_path, save_path, info)
+        finally:
+            self.engine.unsubscribe(handle, events)
+            # 共有セッションから取り除き、シードは行わない
+            self.session_manager.remove_torrent(handle)
+
+        if result:
+            self.logger.info("ダウンロード済み： %s", info.name())
+
+        if result and not harvest.registry:
+            # ダウンロード中に収録できなかった場合は、IPフィルタを適用して改めて収集する
+            if bitfields is not None and len(bitfields):
+                await loop.run_in_executor(None, bitfields.flush)
+            self.logger.info("ピアの一覧を取得しています...")
+            return result, await self.get_peer_log_async(torrent_path, max_list_size)
+
+        return result, await self._save_harvest(info, torrent_folder, harvest)
+
+    async def _check_existing(self, torrent_path, save_path, info):
+        # 既存の本体ファイルについて、libtorrentのハッシュの再チェックを省けるか確認する
+        # （resumeデータが使えなければ、全ピースを並列に検証した結果をlibtorrentに渡す）
+        # 戻り値は(追加パラメータ, シードモードかどうか, resumeデータを読み込んだかどうか)
+        loop = asyncio.get_running_loop()
+        resume_params = await loop.run_in_executor(
+            None, load_resume, torrent_path, save_path, info
+        )
+        if resume_params is not None:
+            return resume_params, False, True
 
-        except Exception:
-            try:
-                if os.path.exists(tmp_path):
-                    shutil.rmtree(tmp_path)
-                    logging.info("一時ファイルを削除しました。")
+        try:
+            verifier = PieceVerifier(torrent_path, save_path)
+            result = await loop.run_in_executor(None, verifier.verify)
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.warning(f"本体ファイルのピースを検証できませんでした: {e}")
+            return None, False, False
 
-            except Exception as e:
-                logging.warning(f"一時ファイルの削除に失敗しました: {e}")
+        have = [ok is True for ok in result.pieces]
+        self.logger.info(
+            "ピースの検証：%d/%d 件一致（%.1f MB/s）"
+            % (sum(have), len(result), result.mbps)
+        )
+        if result.complete:
+            return None, True, False
+        if not any(have):
+            return None, False, False  # 検証できるピースがなければ、libtorrentのチェックに任せる
+
+        # 一致したピースを取得済みとして渡し、libtorrentが同じピースを再びハッシュしないようにする
+        params = lt.add_torrent_params()
+        params.have_pieces = have
+        return params, False, False
+
+    async def _save_resume(self, events, handle, torrent_path, save_path, info) -> None:
+        # 完了した本体ファイルのresumeデータを保存し、次回の追加時の再チェックを省く
+        # （書き込みを確定させてから、本体ファイルのサイズ・更新時刻を記録する）
+        handle.save_resume_data(lt.torrent_handle.flush_disk_cache)
+        deadline = time.time() + self.RESUME_TIMEOUT
+        while time.time() < deadline:
+            event = await next_event(events, deadline - time.time())
+            if event is None:
+                break
+            if event.kind == "resume_saved":
+                saved = await asyncio.get_running_loop().run_in_executor(
+                    None, save_resume, torrent_path, save_path, info, event.data
+                )
+                if not saved:
+                    self.logger.warning(
+                        "resumeデータを保存できませんでした。次回は本体ファイルを再チェックします。"
+                    )
+                return
+            if event.kind == "resume_failed":
+                self.logger.warning(f"resumeデータの書き出しに失敗しました: {event.data}")
+                return
+        self.logger.warning("resumeデータの書き出しがタイムアウトしました。")
+
+    async def _drain_piece_reads(self, events, handle, attribution) -> None:
+        # 収集の終了後、読み出し中のピースが保存されるのを待つ
+        if attribution is None:
+            return
+        deadline = time.time() + self.CAPTURE_TIMEOUT
+        while attribution.pending_reads and time.time() < deadline:
+            event = await next_event(events, deadline - time.time())
+            if event is not None:
+                await attribution.handle_event(event, handle)
+        if attribution.captured:
+            self.logger.info(
+                f"検証済みのピースを {len(attribution.captured)} 件保存しました。"
+            )
 
-        session.remove_torrent(handle)  # ログ書き込み処理の前に、ダウンロード・アップロードを完全に停止
+    async def _save_harvest(
+        self, info, save_path: str, harvest: Harvest
+    ) -> list[PeerRecord]:
+        # ビットフィールドとピアのログを、イベントループの外で証拠フォルダに書き込む
+        loop = asyncio.get_running_loop()
+        if harvest.bitfields is not None and len(harvest.bitfields):
+            await loop.run_in_executor(None, harvest.bitfields.flush)
 
-        logging.info("取得ピア数：" + str(len(peers)) + "　ログを記録しています...")
+        log = harvest.registry.records
+        logging.info("取得ピア数：" + str(len(harvest)) + "　ログを記録しています...")
         if log:
-            save_path = os.path.dirname(torrent_path)
-            _save_peer_log(
-                log, info, save_path, self.REMOTE_HOST, self.version, add_all_peers
+            # ファイル書き込みとプロバイダ取得はイベントループの外で行う
+            await loop.run_in_executor(
+                None,
+                _save_peer_log,
+                log,
+                info,
+                save_path,
+                self.REMOTE_HOST,
+                self.version,
+                harvest.add_all_peers,
+                self.PEER_LOG_FSYNC,
             )
 
         return log
@@ -297,10 +692,78 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def _load_peer_setting():
+@functools.lru_cache(maxsize=None)
+def _get_config() -> Config:
+    # Configの生成時には設定ファイルの確認・作成が走るため、プロセス内で1度だけ生成する
     current_dir = os.path.dirname(os.path.abspath(__file__))
-    con = Config(base_path=current_dir, level=1)
-    SETTING_FILE = con.SETTING_FILE
+    return Config(base_path=current_dir, level=1)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_host_resolver() -> HostResolver:
+    # トラッカーの名前解決結果を、プロセス内の収集全体で共有する
+    return HostResolver()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_reverse_resolver() -> ReverseResolver:
+    # ピアの逆引き結果を、プロセス内の収集全体で共有する
+    return ReverseResolver()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_provider_table(remote_host_path: str) -> ProviderTable:
+    # 対応表は更新時刻が変わったときだけ読み込み直す
+    return ProviderTable(remote_host_path)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_whois_cache() -> WhoisCache:
+    # WHOISの結果は設定フォルダに保存し、torrentや実行をまたいで再利用する
+    return WhoisCache(os.path.join(_get_config().SETTING_FOLDER, WHOIS_CACHE_FILE))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_whois_scheduler() -> WhoisScheduler:
+    # すべてのtorrentのWHOIS問い合わせを、1つのスケジューラで間隔を空けて処理する
+    con = _get_config()
+    return WhoisScheduler(
+        con.WHOIS_SERVER, con.WHOIS_PORT, con.WHOIS_INTERVAL, cache=_get_whois_cache()
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_ip_range_cache() -> IPRangeCache:
+    # 設定ファイル（ipv4.txt, ipv6.txt）の解析結果を保持するキャッシュ
+    return IPRangeCache(_get_config().SETTING_FOLDER)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_public_ip_service() -> PublicIPService:
+    # 共有のPublicIPServiceへの購読と更新スレッドの開始は、プロセス内で1度だけ行う
+    service = get_public_ip_service()
+    service.subscribe(_on_public_ip_changed)
+    service.start()
+    return service
+
+
+def _on_public_ip_changed(ipv4: Optional[str], ipv6: Optional[str]) -> None:
+    # 収集中のIPフィルタの自己除外範囲を、新しいアドレスで置き換える
+    manager = SessionManager.current()
+    if manager is not None:
+        manager.update_blocked(_get_self_blocked_ranges(ipv4, ipv6))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_umask() -> int:
+    # umaskは設定しないと取得できないため、プロセス内で1度だけ取得して元に戻す
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def _load_peer_setting():
+    SETTING_FILE = _get_config().SETTING_FILE
 
     # 設定ファイルから "peer_setting" の値を読み込む関数
     try:
@@ -311,104 +774,110 @@ def _load_peer_setting():
         return False
 
 
-def _default_ip_filter(torrent_path: str) -> tuple:
+def _default_ip_filter(ip_index: IPRangeIndex):
     # IPフィルタを作成
     ip_filter = lt.ip_filter()
     # 最初にすべてのアドレスを禁止し、以降は許可した範囲とだけ接続する
     ip_filter.add_rule("0.0.0.0", "255.255.255.255", 1)
     ip_filter.add_rule("::", "ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff", 1)
 
-    # torrentファイルを読み込む
-    info = lt.torrent_info(torrent_path)
+    # IPv4とIPv6の範囲（統合済みの区間）を許可リストに追加
+    for version, to_address in (
+        (4, ipaddress.IPv4Address),
+        (6, ipaddress.IPv6Address),
+    ):
+        for start, end in ip_index.intervals(version):
+            ip_filter.add_rule(str(to_address(start)), str(to_address(end)), 0)
+    return ip_filter
 
-    # トラッカーの一覧を取得
-    trackers = info.trackers()
 
-    # 各トラッカーのIPアドレスを取得し、許可リストに追加
-    for tracker in trackers:
-        url = tracker.url
-        parsed_url = urllib.parse.urlparse(url)
-        hostname = parsed_url.hostname
-        port = parsed_url.port
-        try:
-            addr_infos = socket.getaddrinfo(hostname, port)
-            for family, type, proto, canonname, sockaddr in addr_infos:
-                tracker_ip = sockaddr[0]
-                ip_filter.add_rule(tracker_ip, tracker_ip, 0)
-        except socket.gaierror:
-            # ホスト名を解決できない場合、スキップ
-            pass
-    return ip_filter
+def _get_self_blocked_ranges(
+    ipv4: Optional[str], ipv6: Optional[str]
+) -> list[tuple[str, str]]:
+    # 自分自身のIPアドレスと、同じ/64に含まれるIPv6アドレスを禁止範囲として返す
+    blocked = []
+    excluded_ipv6_network = get_excluded_ipv6(ipv6) if ipv6 else None
+    if excluded_ipv6_network:
+        blocked.append(
+            (str(excluded_ipv6_network[0]), str(excluded_ipv6_network[-1]))
+        )
+    if ipv4:
+        blocked.append((ipv4, ipv4))
+    if ipv6:
+        blocked.append((ipv6, ipv6))
+    return blocked
 
 
-def _add_ip_ranges_to_filter(ip_filter, ip_ranges, allow=True):
-    # IPフィルタに範囲を追加する関数
-    for ip_range in ip_ranges:
-        # IPアドレス範囲の開始と終了を取得
-        start = str(ip_range[0])
-        end = str(ip_range[-1])
-        # 許可する場合は0、禁止する場合は1を使用
-        ip_filter.add_rule(start, end, 0 if allow else 1)
+_ip_filter_template = None  # (元になった索引, 構築済みのip_filter)
+_ip_filter_template_lock = threading.Lock()
+
+
+def _get_ip_filter_template(ip_index: IPRangeIndex):
+    """
+    索引から構築したIPフィルタを返す。索引が同じ間は構築済みのものを再利用する。
+
+    Parameters
+    ----------
+    ip_index : IPRangeIndex
+        _get_ip_range_cache().get_index()で取得した索引。
+    """
+    global _ip_filter_template
+    with _ip_filter_template_lock:
+        if _ip_filter_template is None or _ip_filter_template[0] is not ip_index:
+            _ip_filter_template = (ip_index, _default_ip_filter(ip_index))
+        return _ip_filter_template[1]
+
+
+def _get_tracker_ips(info) -> list[str]:
+    """
+    torrentに含まれるトラッカーのIPアドレスを返す。
+    全トラッカーのホスト名を並行して名前解決し、結果はプロセス内でキャッシュされる。
+
+    Parameters
+    ----------
+    info : torrent_info
+        対象のtorrentの情報。
+    """
+    # トラッカーの一覧からホスト名を取得
+    hostnames = [
+        urllib.parse.urlparse(tracker.url).hostname for tracker in info.trackers()
+    ]
+
+    # 各トラッカーのIPアドレスを取得（ホスト名を解決できない場合はスキップ）
+    tracker_ips = []
+    for addresses in _get_host_resolver().resolve_many(hostnames).values():
+        tracker_ips.extend(addresses)
+    return tracker_ips
 
 
 def _save_peer_log(
-    log, info, save_path: str, remote_host_path: str, version: str, add_all_pears: bool
+    log,
+    info,
+    save_path: str,
+    remote_host_path: str,
+    version: str,
+    add_all_pears: bool,
+    fsync: bool = False,
 ):
     # save_path内のファイルをリストアップ
     csv_name = f"peers_{info.info_hash()}.csv"
     csv_path = os.path.join(save_path, csv_name)
 
-    # ログの生データを記録
-    for p in log:
-        peer = p.ip
-        _make_peers_list(peer, p.timestamp, p.valid, csv_path)
-
-    # ピア別のログ記録
+    # ログの生データをまとめて記録
+    _make_peers_list(((p.key, p.timestamp, p.valid) for p in log), csv_path)
+
+    # ピア別のログ記録（ファイルごとにまとめて書き込む）
+    writer = PeerLogWriter(
+        save_path,
+        info.info_hash(),
+        info.name(),
+        version,
+        fsync,
+        get_peer_log_index(os.path.join(save_path, "peers")),
+    )
     for p in log:
-        peers_folder = os.path.join(save_path, "peers")
-        if not os.path.exists(peers_folder):
-            os.makedirs(peers_folder, exist_ok=True)
-
-        # peer_infoオブジェクトの値を文字列に変換
-        port = str(p.ip[1])
-        client = p.client.decode("utf-8")
-        speed = f"{p.payload_down_speed / 1000:.1f}"
-        if not p.valid:
-            validity_str = "破損ピース：あり"
-        else:
-            validity_str = ""  # 破損ピースがなかった場合、なにも記入しない
-
-        log_line = (
-            p.timestamp + "　" + client + "　速度：" + speed + " KB/s　" + validity_str + "\n"
-        )
-
-        # ファイル名を決定
-        peer_modified = p.ip[0].replace(":", "-") if ":" in p.ip[0] else p.ip[0]
-        peer_file_name = (
-            peer_modified + "_" + port + "_" + str(info.info_hash()) + ".log"
-        )
-
-        peer_file_path = os.path.join(peers_folder, peer_file_name)
-        if not os.path.exists(peer_file_path):
-            file_mode = "w"
-        else:
-            file_mode = "a"
-
-        with open(peer_file_path, file_mode, encoding="utf-8") as f:
-            if file_mode == "w":
-                # 新規ファイルの場合はヘッダーを書き込み
-                f.write(f"IPアドレス：{p.ip[0]}\n")
-                f.write(f"ポート番号：{port}\n")
-                f.write(f"クライアント：{client}\n")
-                f.write("プロバイダ：未取得\n")
-                f.write("リモートホスト：未取得\n")
-                f.write(f"ファイル名：{info.name()}\n")
-                f.write(f"ファイルハッシュ: {info.info_hash()}\n")
-                f.write(f"証拠収集開始時刻: {p.timestamp}\n")
-                f.write(f"P2Pクローラ {version}\n")
-                f.write("------------------------------------\n")
-
-            f.write(log_line)
+        writer.add(p.ip, p.port, p.client, p.speed, p.timestamp, p.valid)
+    writer.flush()
 
     if not add_all_pears:
         _write_provider(csv_path, remote_host_path)
@@ -451,72 +920,78 @@ def _print_download_status(torrent_status, logger: logging.Logger) -> None:
     )
 
 
-def _make_peers_list(
-    peer: tuple[str, int], timestamp: str, valid_piece: bool, csv_path: str
-) -> None:
+def _make_peers_list(entries, csv_path: str) -> bool:
     """
     ピアの一覧をファイルに記録または更新する。
 
+    既存のファイルを一度だけ読み込み、(IPアドレス, ポート番号)をキーとした辞書に
+    今回の記録をすべて反映したうえで、一時ファイルへ書き出してから置き換える。
+
     Parameters
     ----------
-    peer : (str, int)
-        ピアを表すタプル。
-    timestamp : str
-        完了タイムスタンプ。
-    valid_piece : bool
-        取得できたのが正常なピースかどうか。
+    entries : iterable of ((str, int), str, bool)
+        ピアを表すタプル、完了タイムスタンプ、取得できたのが正常なピースかどうか、の組。
     csv_path : str
         記録ファイルのパス。
+
+    Returns
+    -------
+    result : bool
+        書き込みに成功した場合はTrue。
     """
     provider = "未取得"
     remote_host = "未取得"
-    num = 1 if valid_piece else 0
-    updated = False
-
-    new_data = []
+    rows: dict[tuple[str, str], list[str]] = {}  # 挿入順（ファイルの行順）を保つ
 
     try:
         if os.path.exists(csv_path):
-            with open(csv_path, "r+", newline="", encoding="utf-8") as f:
-                reader = csv.reader(f)
-                for row in reader:
-                    if row[:2] == [peer[0], str(peer[1])]:
-                        row[4] = str(int(row[4]) + num) if valid_piece else row[4]
-                        row[6] = timestamp
-                        updated = True
-                    new_data.append(row)
-
-                f.seek(0)  # ファイルポインタを先頭に戻す
-                f.truncate()  # ファイル内容を削除
-
-                writer = csv.writer(f)
-                for row in new_data:
-                    writer.writerow(row)
-
-                if not updated:
-                    # ピアが新規である場合は追加
-                    writer.writerow(
-                        peer + (provider, remote_host, num, timestamp, timestamp)
-                    )
-        else:
-            with open(csv_path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(
-                    peer + (provider, remote_host, num, timestamp, timestamp)
-                )
+            with open(csv_path, "r", newline="", encoding="utf-8") as f:
+                for row in csv.reader(f):
+                    if len(row) >= 2:
+                        rows[(row[0], row[1])] = row
+
+        for peer, timestamp, valid_piece in entries:
+            num = 1 if valid_piece else 0
+            key = (peer[0], str(peer[1]))
+            existing = rows.get(key)
+            if existing is not None:
+                existing[4] = str(int(existing[4]) + num) if valid_piece else existing[4]
+                existing[6] = timestamp
+            else:
+                # ピアが新規である場合は追加
+                rows[key] = [
+                    key[0], key[1], provider, remote_host, str(num), timestamp, timestamp
+                ]
+
+        # 書き込み途中で中断されても元のファイルが壊れないよう、置き換えで反映する
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=".peers_", suffix=".tmp", dir=os.path.dirname(csv_path) or "."
+        )
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows(rows.values())
+            # mkstempのファイルは0600で作られるため、既存のファイル（なければumask）の権限に合わせる
+            try:
+                mode = os.stat(csv_path).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o666 & ~_get_umask()
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, csv_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
 
     except PermissionError:
         logger.warning("パーミッションエラー：ピア履歴のcsvに書き込みできません。ファイルが開かれている場合は閉じてください。")
         return False  # download_pieceを中断するための戻り値
 
+    return True
+
 
 def _get_provider(remote_host, remote_host_path):
-    with open(remote_host_path, mode="r", encoding="utf-8") as file:
-        reader = csv.reader(file)
-        for row in reader:
-            if row[0] in remote_host:
-                return row[1]  # プロバイダ名を返す
-    return None  # 一致するものがない場合
+    # 対応表のうち、ホスト名に含まれる最初の行のプロバイダ名を返す（一致しなければNone）
+    return _get_provider_table(remote_host_path).match(remote_host)
 
 
 def _write_provider(csv_path, remote_host_path):
@@ -533,21 +1008,26 @@ def _write_provider(csv_path, remote_host_path):
         if row[2] != "未取得":
             processed_ips[ip_address] = (row[2], row[3])
 
+    # リモートホストが未取得のIPアドレスを、まとめて並行して逆引きする
+    remote_hosts = _get_remote_hosts(
+        row[0] for row in rows if row[0] not in processed_ips and row[2] == "未取得"
+    )
+
+    # リモートホストからプロバイダ名を判定できないIPアドレスは、まとめてWHOISに問い合わせる
+    providers = {}
+    for ip_address, remote_host in remote_hosts.items():
+        if remote_host != "取得失敗":
+            providers[ip_address] = _get_provider(remote_host, remote_host_path)
+    providers.update(
+        _query_jpnic_whois_many(ip for ip in remote_hosts if not providers.get(ip))
+    )
+
     for row in rows:
         ip_address = row[0]
         if ip_address not in processed_ips:  # 未処理のIPアドレスの場合のみ処理
             if row[2] == "未取得":  # リモートホストが未取得の場合のみ処理
-                # リモートホストの取得
-                remote_host = _get_remote_host(ip_address)
-                row[2] = remote_host if remote_host else "取得失敗"
-
-                # プロバイダ名の取得
-                if remote_host and remote_host != "取得失敗":
-                    provider = _get_provider(remote_host, remote_host_path)
-                    row[3] = provider if provider else _query_jpnic_whois(ip_address)
-                else:
-                    row[3] = _query_jpnic_whois(ip_address)
-
+                row[2] = remote_hosts[ip_address]
+                row[3] = providers[ip_address]
                 processed_ips[ip_address] = (row[2], row[3])
             else:
                 # 既にリモートホストが取得されている場合は、処理済みの情報を使用
@@ -558,25 +1038,8 @@ def _write_provider(csv_path, remote_host_path):
         writer = csv.writer(file)
         writer.writerows(rows)
 
-    # 'peers'フォルダ内の対象.logファイルに書き込む
-    for ip, (remote_host, provider) in processed_ips.items():
-        ip_filename = ip.replace(":", "-")  # IPv6アドレスの場合の置換
-        for filename in os.listdir(peers_folder):
-            if filename.startswith(ip_filename) and filename.endswith(".log"):
-                log_file_path = os.path.join(peers_folder, filename)
-
-                if os.path.exists(log_file_path):
-                    with open(log_file_path, "r+", encoding="utf-8") as log_file:
-                        lines = log_file.readlines()
-                        if len(lines) >= 5 and "未取得" in lines[4]:
-                            lines[4] = lines[4].replace(
-                                "未取得", remote_host
-                            )  # 5行目の「未取得」を置換
-                        if len(lines) >= 4 and "未取得" in lines[3]:
-                            lines[3] = lines[3].replace("未取得", provider)  # 4行目の「未取得」を置換
-                            log_file.seek(0)  # ファイルの先頭に戻る
-                            log_file.writelines(lines)  # 変更内容を書き込む
-                            log_file.truncate()  # ファイルの末尾を現在の位置で切り捨てる
+    # 'peers'フォルダ内の、ヘッダーが未取得のままの.logファイルだけに書き込む
+    get_peer_log_index(peers_folder).backfill(processed_ips)
 
 
 def get_excluded_ipv6(ipv6):
@@ -611,135 +1074,55 @@ def is_segment_in_peers(ipv6, peers_list):
 
 
 def load_ip_ranges(version: int) -> list:
-    # IP範囲をファイルから読み込む
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    con = Config(base_path=current_dir, level=1)
+    # IP範囲を設定ファイルから読み込む（更新されていなければキャッシュを返す）
+    return _get_ip_range_cache().get_ranges(version)
 
-    SETTING_FOLDER = con.SETTING_FOLDER
 
-    ip_range_file = os.path.join(
-        SETTING_FOLDER, "ipv4.txt" if version == 4 else "ipv6.txt"
-    )
-
-    if not os.path.exists(ip_range_file):
-        return []
-
-    with open(ip_range_file, "r") as f:
-        ip_ranges = [
-            ipaddress.ip_network(line.strip(), strict=False) for line in f.readlines()
-        ]
-
-    return ip_ranges
+def _get_remote_host(ip_address):
+    # リバースDNSルックアップを実行してホスト名を取得
+    return _get_remote_hosts([ip_address])[ip_address]
 
 
-def _ip_in_range(ip: str, ip_ranges: list) -> bool:
+def _get_remote_hosts(ip_addresses) -> dict:
     """
-    指定されたIPアドレスが、設定ファイル（ipv4.txt, ipv6.txt）の範囲に収まっているかを返す。
+    複数のIPアドレスを並行して逆引きする。
 
-    Parameters
-    ----------
-    ip : str
-        判定対象のIPアドレス。
-    ip_ranges : list
-        load_ip_rangesで取得したIPアドレス範囲の設定。
+    Returns
+    -------
+    remote_hosts : dict
+        IPアドレスをキー、ホスト名（取得できなかった場合は「取得失敗」）を値とする辞書。
     """
-    try:
-        ip_obj = ipaddress.ip_address(ip)
-    except ValueError:
-        logger.warning(f"{ip} はIPアドレスとして不正な形式です。")
-        return False
-
-    for ip_range in ip_ranges:
-        if ip_obj in ip_range:
-            return True
-
-    return False
-
-
-def _get_remote_host(ip_address):
-    try:
-        # IPアドレスの形式を確認（IPv4またはIPv6）
-        ip = ipaddress.ip_address(ip_address)
-
-        # リバースDNSルックアップを実行してホスト名を取得
-        host_name = socket.gethostbyaddr(ip_address)[0]
-        time.sleep(1)
-        return host_name
-    except ValueError:
-        time.sleep(1)
-        return "取得失敗"
-    except Exception:
-        time.sleep(1)
-        return "取得失敗"
+    results = _get_reverse_resolver().resolve_many_sync(ip_addresses)
+    return {ip: host_name or "取得失敗" for ip, host_name in results.items()}
 
 
-def _get_public_ips() -> tuple[str, str]:
+def _get_public_ips() -> tuple[Optional[str], Optional[str]]:
     """
     現在のIPv4とIPv6アドレスを取得する。
+    共有のPublicIPServiceが有効期限内のアドレスを保持していれば、問い合わせは行わない。
 
     Returns
     -------
     tuple:
-        現在のIPv4, IPv6アドレスのタプル。
+        現在のIPv4, IPv6アドレスのタプル。取得できなかったものはNone。
     """
-    ipv4, ipv6 = None, None
-    # IPv4アドレスの取得
-    try:
-        response_ipv4 = requests.get("https://api.ipify.org?format=json")
-        response_ipv4.raise_for_status()
-        ipv4 = response_ipv4.json().get("ip")
-        time.sleep(1)
-    except RequestException as e:
-        logger.warning(f"IPv4の取得に失敗しました: {e}")
-
-    # IPv6アドレスの取得
-    try:
-        response_ipv6 = requests.get("https://api6.ipify.org?format=json")
-        response_ipv6.raise_for_status()
-        ipv6 = response_ipv6.json().get("ip")
-    except RequestException as e:
-        logger.warning(f"IPv6の取得に失敗しました: {e}")
-
-    return ipv4, ipv6
+    return get_public_ip_service().get()
 
 
 def _query_jpnic_whois(ip_address):
-    # JPNICのWHOISサービスに接続
-    whois_server = "whois.nic.ad.jp"
-    whois_port = 43
+    # JPNICのWHOISサービスに問い合わせ、プロバイダ名を取得する
+    return _get_whois_scheduler().lookup(ip_address)
 
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((whois_server, whois_port))
-        sock.send((ip_address + "\r\n").encode("utf-8"))
-
-        data = b""
-        while True:
-            buffer = sock.recv(4096)
-            if not buffer:
-                break
-            data += buffer
-    except ConnectionResetError:
-        logger.warning("プロバイダ取得エラー：Whoisサーバーによって接続がリセットされました。")
-        time.sleep(5)
-        return "取得失敗（Whoisサーバーからの拒否）"
-    except socket.error as e:
-        logger.warning(f"プロバイダ取得エラー：ソケットエラーが発生しました: {e}")
-        return "取得失敗（ソケットエラー）"
-    finally:
-        sock.close()
-        time.sleep(5)
-
-    result = data.decode("iso-2022-jp", "ignore")
-
-    match = re.search(r"\[組織名\]\s+(.+)", result)
-    if match:
-        provider = match.group(1)
-        if provider == "":
-            provider = "取得失敗（不明）"
-        else:
-            # '株式会社'を含む場合は削除する
-            provider = provider.replace("株式会社", "")
-        return provider
-    else:
-        return "取得失敗(JPNIC管理外)"
+
+def _query_jpnic_whois_many(ip_addresses) -> dict:
+    """
+    複数のIPアドレスのプロバイダ名をWHOISで取得する。
+    問い合わせは共有のスケジューラで間隔を空けて行い、同じ割り振りブロックの
+    IPアドレスはキャッシュから解決する。
+
+    Returns
+    -------
+    providers : dict
+        IPアドレスをキー、プロバイダ名を値とする辞書。
+    """
+    return _get_whois_scheduler().lookup_many(ip_addresses)
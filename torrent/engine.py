@@ -0,0 +1,189 @@
+# libtorrentのアラートを待ち受け、torrentごとのイベントとして待機中のコルーチンへ配信するモジュール
+# 標準ライブラリ
+import asyncio
+from collections import namedtuple
+import logging
+import threading
+from typing import Optional
+
+# サードパーティライブラリ
+import libtorrent as lt
+
+# kind: イベント種別の文字列、alert: 元のアラート（"status"の場合はtorrent_status）
+# data: アラートから配信時に取り出した値（アラートは次のpop_alertsまでしか有効でないため）
+TorrentEvent = namedtuple("TorrentEvent", ["kind", "alert", "data"], defaults=(None,))
+
+# 配信対象のアラートと、イベント種別の対応
+ALERT_KINDS = (
+    (lt.state_changed_alert, "state_changed"),
+    (lt.peer_connect_alert, "peer_connected"),
+    (lt.piece_finished_alert, "piece_finished"),
+    (lt.hash_failed_alert, "hash_failed"),
+    (lt.block_finished_alert, "block_finished"),
+    (lt.read_piece_alert, "read_piece"),
+    (lt.torrent_finished_alert, "finished"),
+    (lt.save_resume_data_alert, "resume_saved"),
+    (lt.save_resume_data_failed_alert, "resume_failed"),
+)
+
+
+def _alert_data(kind: str, alert):
+    # 受信側で参照する値を、アラートが有効なうちに取り出す
+    if kind in ("piece_finished", "hash_failed"):
+        return alert.piece_index
+    if kind == "block_finished":
+        return (alert.piece_index, alert.block_index, tuple(alert.endpoint))
+    if kind == "read_piece":
+        # エラーの場合、bufferは空になる
+        return (alert.piece, bytes(alert.buffer) if not alert.error.value() else None)
+    if kind == "resume_saved":
+        return lt.write_resume_data_buf(alert.params)
+    if kind == "resume_failed":
+        return alert.message()
+    return None
+
+
+# 上記のアラートを受け取るために必要なアラートカテゴリ
+ALERT_MASK = (
+    lt.alert_category.error
+    | lt.alert_category.status
+    | lt.alert_category.connect
+    | lt.alert_category.piece_progress
+    | lt.alert_category.storage
+)
+
+
+class AlertEngine:
+    """
+    共有セッションのアラートをasyncioのイベントループ上で配信する。
+
+    wait_for_alertはスレッドプールで待機させ、受け取ったアラートを
+    info_hashごとのキューに振り分ける。post_torrent_updatesによる
+    状態更新（state_update_alert）は"status"イベントとして配信する。
+    """
+
+    WAIT_MS = 500  # 1回のwait_for_alertで待機する最大時間（ミリ秒）
+    UPDATE_INTERVAL = 1.0  # post_torrent_updatesを要求する間隔（秒）
+
+    _instances: dict = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, session_manager) -> None:
+        self.session = session_manager.session
+        self.session.apply_settings({"alert_mask": ALERT_MASK})
+        self.alert_mask = ALERT_MASK
+        self.logger = logging.getLogger(__name__)
+        self._queues: dict[str, list[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._users = 0
+
+    @classmethod
+    def get_instance(cls, session_manager) -> "AlertEngine":
+        """
+        セッションごとに1つだけ生成されるAlertEngineを返す。
+        同じセッションのアラートを複数のエンジンで奪い合わないようにするため。
+        """
+        with cls._instances_lock:
+            engine = cls._instances.get(id(session_manager))
+            if engine is None or engine.session is not session_manager.session:
+                engine = cls(session_manager)
+                cls._instances[id(session_manager)] = engine
+            return engine
+
+    def enable_alerts(self, categories) -> None:
+        """
+        標準では受け取らないアラートカテゴリ（block_progressなど）を追加で有効にする。
+        """
+        self.alert_mask |= categories
+        self.session.apply_settings({"alert_mask": self.alert_mask})
+
+    async def __aenter__(self) -> "AlertEngine":
+        self._users += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._pump())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._users -= 1
+        if self._users == 0 and self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def subscribe(self, handle) -> asyncio.Queue:
+        """
+        指定したtorrentのイベントを受け取るキューを登録する。
+
+        Parameters
+        ----------
+        handle : torrent_handle
+            イベントを受け取る対象のtorrent。
+
+        Returns
+        -------
+        queue : asyncio.Queue
+            TorrentEventが順に格納されるキュー。
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._queues.setdefault(str(handle.info_hash()), []).append(queue)
+        return queue
+
+    def unsubscribe(self, handle, queue: asyncio.Queue) -> None:
+        key = str(handle.info_hash())
+        queues = self._queues.get(key, [])
+        if queue in queues:
+            queues.remove(queue)
+        if not queues:
+            self._queues.pop(key, None)
+
+    async def _pump(self) -> None:
+        loop = asyncio.get_running_loop()
+        last_update = 0.0
+
+        while True:
+            if loop.time() - last_update >= self.UPDATE_INTERVAL:
+                self.session.post_torrent_updates()
+                last_update = loop.time()
+
+            # ブロックする待機はスレッドプールに任せ、イベントループを止めない
+            await loop.run_in_executor(None, self.session.wait_for_alert, self.WAIT_MS)
+
+            for alert in self.session.pop_alerts():
+                try:
+                    self._dispatch(alert)
+                except Exception as e:
+                    self.logger.warning(f"アラートの配信中に例外が発生: {e}")
+
+    def _dispatch(self, alert) -> None:
+        if isinstance(alert, lt.state_update_alert):
+            for status in alert.status:
+                self._publish(status.handle, TorrentEvent("status", status))
+            return
+
+        for alert_type, kind in ALERT_KINDS:
+            if isinstance(alert, alert_type):
+                self._publish(
+                    alert.handle, TorrentEvent(kind, alert, _alert_data(kind, alert))
+                )
+                return
+
+    def _publish(self, handle, event: TorrentEvent) -> None:
+        if not handle.is_valid():
+            return
+        for queue in self._queues.get(str(handle.info_hash()), []):
+            queue.put_nowait(event)
+
+
+async def next_event(queue: asyncio.Queue, timeout: float):
+    """
+    キューから次のイベントを取り出す。timeout秒以内に届かなければNoneを返す。
+    """
+    if not queue.empty():
+        return queue.get_nowait()
+    try:
+        return await asyncio.wait_for(queue.get(), timeout=max(timeout, 0))
+    except asyncio.TimeoutError:
+        return None
@@ -0,0 +1,141 @@
+# ピア収集の周回ごとに、接続済みのシーダーを判定して収録するモジュール
+# 標準ライブラリ
+import logging
+from typing import Optional
+
+# 独自モジュール
+from torrent.attribution import PieceAttribution
+from torrent.bitfield_store import BitfieldStore
+from torrent.peer_registry import PeerRecord, PeerRegistry
+
+logger = logging.getLogger(__name__)
+
+MIN_PAYLOAD_SPEED = 10240  # 収録するピアのダウンロード速度の下限（B/s）
+
+
+class Harvest:
+    """
+    1つのtorrentのピア収集の状態（収録済みのピア、ビットフィールド、ピースの帰属）を保持し、
+    周回ごとに接続済みのピアから収録対象のシーダーを判定する。
+
+    対象範囲の判定はIPフィルタに頼らず周回ごとに行うため、IPフィルタを適用しない
+    torrent（本体ファイルのダウンロード中など）でも同じ基準で収録できる。
+    """
+
+    def __init__(
+        self,
+        ip_index,
+        ipv4: Optional[str],
+        ipv6: Optional[str],
+        excluded_ipv6_network=None,
+        add_all_peers: bool = False,
+        round_interval: float = 3,
+        bitfields: Optional[BitfieldStore] = None,
+        attribution: Optional[PieceAttribution] = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        ip_index : IPRangeIndex
+            収録を許可するIPアドレスの範囲。
+        ipv4 : str
+            自分自身のIPv4アドレス。取得できなかった場合はNone。
+        ipv6 : str
+            自分自身のIPv6アドレス。取得できなかった場合はNone。
+        excluded_ipv6_network : IPv6Network
+            収録しない自分自身の/64。
+        add_all_peers : bool
+            Trueの場合、IP範囲を問わずシーダーをすべて収録する。
+        round_interval : float
+            既知のピアを追加収録する間隔（秒）。
+        bitfields : BitfieldStore
+            対象範囲のピアのビットフィールドの記録先。Noneの場合は記録しない。
+        attribution : PieceAttribution
+            ピースの帰属。指定した場合、破損ピースの有無をピアごとに判定する。
+        """
+        self.ip_index = ip_index
+        self.self_ips = {ip for ip in (ipv4, ipv6) if ip}
+        self.excluded_networks = [excluded_ipv6_network]
+        self.add_all_peers = add_all_peers
+        self.round_interval = round_interval
+        self.bitfields = bitfields
+        self.attribution = attribution
+        self.registry = PeerRegistry()  # 収録済みのピアとその記録
+        self.valid_piece = True  # 破損ピースが検出されていなければTrue
+
+    def __len__(self) -> int:
+        return len(self.registry)
+
+    def is_valid(self, peer: tuple[str, int]) -> bool:
+        """
+        ピアの記録に付ける、破損ピースの有無を返す（破損ピースがなければTrue）。
+        """
+        if self.attribution is None:
+            return self.valid_piece
+        return self.attribution.is_valid(peer)
+
+    def collect(self, peer_info_list, timestamp: str, now: float) -> int:
+        """
+        接続済みのピアのうち、条件を満たすシーダーを収録する。
+
+        Parameters
+        ----------
+        peer_info_list : list of peer_info
+            handle.get_peer_info()の結果。
+        timestamp : str
+            記録時刻の文字列。
+        now : float
+            周回の時刻（time.time）。
+
+        Returns
+        -------
+        count : int
+            今回追加した記録の数。
+        """
+        registry = self.registry
+        count = 0
+
+        # 接続済みピアのIPアドレスが許可範囲内か（自分自身の/64を除く）をまとめて判定
+        peer_ips = [p.ip[0] for p in peer_info_list]
+        in_range = dict(
+            zip(peer_ips, self.ip_index.classify(peer_ips, self.excluded_networks))
+        )
+
+        for p in peer_info_list:
+            peer_ip = p.ip[0]
+            key = (peer_ip, p.ip[1])
+            if (
+                self.bitfields is not None
+                and peer_ip not in self.self_ips
+                and (self.add_all_peers or in_range[peer_ip])
+            ):
+                # シーダーに限らず、保有しているピースを記録（前回から変化がなければ記録しない）
+                self.bitfields.record(key, p.pieces, timestamp)
+
+            if not p.seed:
+                continue  # シーダーでなければ収録しない
+
+            valid = self.is_valid(key)
+            if key in registry and p.last_active == 0:
+                # すでに存在するピアは、最終接続時刻（int秒前）が0なら周回ごとに追加収録
+                if now - registry.last_logged(key) >= self.round_interval:
+                    registry.log(PeerRecord.from_peer_info(p, timestamp, valid), now)
+                    count += 1
+                continue
+
+            if peer_ip in self.self_ips:
+                continue  # 自分自身のIPと一致する場合は収録しない
+
+            if not p.last_active == 0 or p.payload_down_speed <= MIN_PAYLOAD_SPEED:
+                continue  # 最終接続時刻が0秒前で、10KB/s以上のUP速度があるピアのみ収録
+
+            # IPアドレスが同じでポート番号が異なるピアは、同じ周回では重複して収録しない
+            if registry.has_ip(peer_ip):
+                continue
+
+            # IP範囲を問わずシーダーをすべて収録する場合を除き、
+            # 設定ファイルの範囲内で、自分自身の/64に含まれないピアのみ収録
+            if self.add_all_peers or in_range[peer_ip]:
+                registry.log(PeerRecord.from_peer_info(p, timestamp, valid), now)
+                count += 1
+        return count
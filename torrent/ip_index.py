@@ -0,0 +1,228 @@
+# IPアドレス範囲を統合済みの整数区間として保持し、二分探索で範囲内かどうかを判定するモジュール
+# 標準ライブラリ
+from bisect import bisect_right
+import ipaddress
+import logging
+import os
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IPRangeIndex:
+    """
+    設定ファイル（ipv4.txt, ipv6.txt）のIPアドレス範囲を、IPバージョンごとに
+    重複・隣接を統合した整数区間のソート済みリストとして保持する。
+
+    1件の判定はネットワーク数nに対してO(log n)で行える。m件をまとめて判定する場合は、
+    ソートした値と区間を1回ずつ走査するため、O(m log m + n)で行える。
+    """
+
+    def __init__(self, networks=()) -> None:
+        """
+        Parameters
+        ----------
+        networks : iterable of IPv4Network, IPv6Network or str
+            索引に含めるIPアドレス範囲。
+        """
+        intervals: dict[int, list[tuple[int, int]]] = {4: [], 6: []}
+        for network in networks:
+            if isinstance(network, str):
+                network = ipaddress.ip_network(network.strip(), strict=False)
+            intervals[network.version].append(
+                (int(network.network_address), int(network.broadcast_address))
+            )
+
+        self._starts: dict[int, list[int]] = {}
+        self._ends: dict[int, list[int]] = {}
+        for version, ranges in intervals.items():
+            merged = _merge_intervals(ranges)
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+
+    def __len__(self) -> int:
+        # 統合後の区間の数
+        return len(self._starts[4]) + len(self._starts[6])
+
+    def __contains__(self, ip) -> bool:
+        return self.contains(ip)
+
+    def intervals(self, version: int) -> list[tuple[int, int]]:
+        """
+        統合済みの区間を(開始, 終了)の整数のタプルのリストで返す。
+
+        Parameters
+        ----------
+        version : int
+            IPバージョン（4または6）。
+        """
+        return list(zip(self._starts[version], self._ends[version]))
+
+    def contains(self, ip) -> bool:
+        """
+        指定されたIPアドレスが、索引の範囲に収まっているかを返す。
+
+        Parameters
+        ----------
+        ip : str or IPv4Address or IPv6Address
+            判定対象のIPアドレス。
+        """
+        try:
+            ip_obj = ipaddress.ip_address(ip)
+        except ValueError:
+            logger.warning(f"{ip} はIPアドレスとして不正な形式です。")
+            return False
+
+        return self._contains_int(ip_obj.version, int(ip_obj))
+
+    def classify(self, ips, excluded_networks=()) -> list[bool]:
+        """
+        複数のIPアドレスをまとめて判定する。
+
+        Parameters
+        ----------
+        ips : iterable of str
+            判定対象のIPアドレス。get_peer_info()の各ピアのp.ip[0]を想定。
+        excluded_networks : iterable of IPv4Network or IPv6Network
+            範囲内であっても除外するネットワーク（自分自身のIPv6 /64など）。
+            Noneを含んでいてもよい。
+
+        Returns
+        -------
+        results : list of bool
+            ipsと同じ順序で、範囲内かつ除外対象でなければTrue。
+        """
+        ips = list(ips)
+        values: dict[str, Optional[tuple[int, int]]] = {}  # IPアドレス→(バージョン, 整数値)
+        for ip in ips:
+            if ip in values:
+                continue  # 同じ回に同じIPが複数回現れる場合（ポート違い）
+            try:
+                ip_obj = ipaddress.ip_address(ip)
+            except ValueError:
+                logger.warning(f"{ip} はIPアドレスとして不正な形式です。")
+                values[ip] = None
+                continue
+            values[ip] = (ip_obj.version, int(ip_obj))
+
+        excluded: dict[int, list[tuple[int, int]]] = {4: [], 6: []}
+        for net in excluded_networks:
+            if net is not None:
+                excluded[net.version].append(
+                    (int(net.network_address), int(net.broadcast_address))
+                )
+
+        # バージョンごとに整数値をソートし、区間のリストと1回ずつ突き合わせる
+        allowed: set[tuple[int, int]] = set()
+        for version in (4, 6):
+            targets = sorted(
+                {item[1] for item in values.values() if item is not None and item[0] == version}
+            )
+            inside = _sweep(targets, self._starts[version], self._ends[version])
+            merged = _merge_intervals(excluded[version])
+            inside -= _sweep(
+                sorted(inside), [start for start, _ in merged], [end for _, end in merged]
+            )
+            allowed.update((version, value) for value in inside)
+
+        return [values[ip] in allowed for ip in ips]
+
+    def _contains_int(self, version: int, value: int) -> bool:
+        starts = self._starts[version]
+        i = bisect_right(starts, value) - 1
+        return i >= 0 and value <= self._ends[version][i]
+
+
+class IPRangeCache:
+    """
+    設定ファイル（ipv4.txt, ipv6.txt）の解析結果と索引を、ファイルの更新時刻が
+    変わるまでメモリ上に保持する。
+    """
+
+    def __init__(self, setting_folder: str) -> None:
+        self.paths = {
+            4: os.path.join(setting_folder, "ipv4.txt"),
+            6: os.path.join(setting_folder, "ipv6.txt"),
+        }
+        self._lock = threading.Lock()
+        self._signature: Optional[tuple] = None
+        self._ranges: dict[int, list] = {4: [], 6: []}
+        self._index = IPRangeIndex()
+
+    def signature(self) -> tuple:
+        """
+        両ファイルの更新時刻（ナノ秒）のタプルを返す。ファイルがなければNone。
+        """
+        signature: list[Optional[int]] = []
+        for version in (4, 6):
+            try:
+                signature.append(os.stat(self.paths[version]).st_mtime_ns)
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def get_ranges(self, version: int) -> list:
+        """
+        指定したバージョンのIPアドレス範囲をip_networkのリストで返す。
+        """
+        self._refresh()
+        return list(self._ranges[version])
+
+    def get_index(self) -> IPRangeIndex:
+        """
+        IPv4とIPv6の範囲をまとめたIPRangeIndexを返す。
+        """
+        self._refresh()
+        return self._index
+
+    def _refresh(self) -> None:
+        with self._lock:
+            signature = self.signature()
+            if signature == self._signature:
+                return
+
+            for version in (4, 6):
+                self._ranges[version] = _read_ip_ranges(self.paths[version])
+            self._index = IPRangeIndex(self._ranges[4] + self._ranges[6])
+            self._signature = signature
+            logger.info(f"IPアドレス範囲を読み込みました（統合後 {len(self._index)} 区間）。")
+
+
+def _read_ip_ranges(ip_range_file: str) -> list:
+    # IP範囲をファイルから読み込む
+    if not os.path.exists(ip_range_file):
+        return []
+
+    with open(ip_range_file, "r") as f:
+        return [
+            ipaddress.ip_network(line.strip(), strict=False)
+            for line in f.readlines()
+            if line.strip()
+        ]
+
+
+def _sweep(values: list[int], starts: list[int], ends: list[int]) -> set[int]:
+    # ソート済みの整数値と区間を先頭から同時に走査し、区間に含まれる値を返す
+    inside = set()
+    i = 0
+    for value in values:
+        while i < len(starts) and ends[i] < value:
+            i += 1
+        if i == len(starts):
+            break
+        if starts[i] <= value:
+            inside.add(value)
+    return inside
+
+
+def _merge_intervals(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    # 開始位置でソートし、重複または隣接する区間を1つにまとめる
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
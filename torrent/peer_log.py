@@ -0,0 +1,281 @@
+# ピア別のログファイル（peers/<IP>_<ポート>_<ハッシュ>.log）への書き込みと、その索引を扱うモジュール
+# 標準ライブラリ
+from collections import defaultdict
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN = "未取得"  # プロバイダ・リモートホストを取得する前の値
+
+
+class PeerLogWriter:
+    """
+    1回の記録で発生したピアのログ行を、書き込み先のファイルごとにまとめて保持し、
+    flushで各ファイルに1度だけ書き込む。
+
+    新規ファイルのヘッダーは最初の行とあわせて書き込み、fsyncを有効にした場合も
+    ファイルごとに1回だけ行う。
+    """
+
+    def __init__(
+        self,
+        save_path: str,
+        info_hash: str,
+        name: str,
+        version: str,
+        fsync: bool = False,
+        index=None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        save_path : str
+            証拠フォルダのパス。ログはその中のpeersフォルダに書き込む。
+        info_hash : str
+            torrentのinfo_hash。
+        name : str
+            torrentのファイル名。
+        version : str
+            P2Pクローラのバージョン。
+        fsync : bool
+            Trueの場合、書き込んだファイルをflushの最後にfsyncする。
+        index : PeerLogIndex
+            新しく作成したログファイルを登録する索引。
+        """
+        self.peers_folder = os.path.join(save_path, "peers")
+        self.info_hash = str(info_hash)
+        self.name = name
+        self.version = version
+        self.fsync = fsync
+        self.index = index
+        self._pending: dict[str, list[tuple]] = defaultdict(list)  # ファイルパス→記録する行
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._pending.values())
+
+    def path_for(self, ip: str, port) -> str:
+        """
+        ピアのログファイルのパスを返す。IPv6アドレスの「:」は「-」に置き換える。
+        """
+        file_name = f"{ip.replace(':', '-')}_{port}_{self.info_hash}.log"
+        return os.path.join(self.peers_folder, file_name)
+
+    def add(
+        self, ip: str, port, client: str, speed: float, timestamp: str, valid: bool
+    ) -> None:
+        """
+        ログ行をバッファに追加する。ファイルへはflushまで書き込まない。
+
+        Parameters
+        ----------
+        ip : str
+            ピアのIPアドレス。
+        port : int or str
+            ピアのポート番号。
+        client : str
+            ピアのクライアント名。
+        speed : float
+            ダウンロード速度（KB/s）。
+        timestamp : str
+            記録時刻の文字列。
+        valid : bool
+            破損ピースを受け取っていなければTrue。
+        """
+        self._pending[self.path_for(ip, port)].append(
+            (ip, str(port), client, speed, timestamp, valid)
+        )
+
+    def flush(self) -> list[str]:
+        """
+        バッファの内容をファイルごとに1回の書き込みで記録する。
+
+        Returns
+        -------
+        created : list of str
+            今回新しく作成したログファイルのパス。
+        """
+        if not self._pending:
+            return []
+
+        os.makedirs(self.peers_folder, exist_ok=True)
+        created = []
+
+        for path, entries in self._pending.items():
+            chunks = []
+            is_new = not os.path.exists(path)
+            if is_new:
+                # 新規ファイルの場合は、最初の記録の内容でヘッダーを作成
+                chunks.append(self._header(*entries[0]))
+                created.append(path)
+                if self.index is not None:
+                    self.index.add(entries[0][0], path)
+            chunks.extend(self._line(*entry) for entry in entries)
+
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("".join(chunks))
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+
+        if self.fsync and created:
+            _fsync_directory(self.peers_folder)
+
+        self._pending.clear()
+        return created
+
+    def _header(self, ip, port, client, speed, timestamp, valid) -> str:
+        return (
+            f"IPアドレス：{ip}\n"
+            f"ポート番号：{port}\n"
+            f"クライアント：{client}\n"
+            f"プロバイダ：{UNKNOWN}\n"
+            f"リモートホスト：{UNKNOWN}\n"
+            f"ファイル名：{self.name}\n"
+            f"ファイルハッシュ: {self.info_hash}\n"
+            f"証拠収集開始時刻: {timestamp}\n"
+            f"P2Pクローラ {self.version}\n"
+            "------------------------------------\n"
+        )
+
+    def _line(self, ip, port, client, speed, timestamp, valid) -> str:
+        # 破損ピースがなかった場合、なにも記入しない
+        validity_str = "" if valid else "破損ピース：あり"
+        return f"{timestamp}　{client}　速度：{speed:.1f} KB/s　{validity_str}\n"
+
+
+def _fsync_directory(folder: str) -> None:
+    # 新規作成したファイルのディレクトリエントリを確定させる（Windowsでは不要・不可）
+    if os.name == "nt":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        logger.warning(f"{folder} のfsyncに失敗しました: {e}")
+    finally:
+        os.close(fd)
+
+
+class PeerLogIndex:
+    """
+    peersフォルダ内のログファイルを、IPアドレスごとに索引化する。
+
+    フォルダの一覧は最初に1度だけ取得し、以降はPeerLogWriterが作成したファイルを
+    登録していく。ヘッダーのプロバイダ・リモートホストが「未取得」のままの
+    可能性があるファイルだけを記録し、backfillではそれらのファイルだけを書き換える。
+    """
+
+    def __init__(self, peers_folder: str) -> None:
+        self.peers_folder = peers_folder
+        self._paths: dict[str, set[str]] = defaultdict(set)  # IPアドレス→ログファイルのパス
+        self._unfilled: set[str] = set()  # ヘッダーが未取得のままの可能性があるファイル
+        self._lock = threading.Lock()
+
+        if os.path.isdir(peers_folder):
+            for file_name in os.listdir(peers_folder):
+                ip = ip_from_log_name(file_name)
+                if ip is not None:
+                    self.add(ip, os.path.join(peers_folder, file_name))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(paths) for paths in self._paths.values())
+
+    def add(self, ip: str, path: str) -> None:
+        """
+        新しく作成したログファイルを登録する。
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            self._paths[ip].add(path)
+            self._unfilled.add(path)
+
+    def paths(self, ip: str) -> list[str]:
+        """
+        IPアドレスのログファイルのパスを返す。
+        """
+        with self._lock:
+            return sorted(self._paths.get(ip, ()))
+
+    def unfilled(self, ip: str) -> list[str]:
+        """
+        IPアドレスのログファイルのうち、ヘッダーが未取得のままの可能性があるものを返す。
+        """
+        with self._lock:
+            return sorted(self._paths.get(ip, set()) & self._unfilled)
+
+    def backfill(self, attributions: dict) -> int:
+        """
+        ヘッダーの「未取得」を、取得したリモートホストとプロバイダ名で置き換える。
+
+        Parameters
+        ----------
+        attributions : dict
+            IPアドレスをキー、(リモートホスト, プロバイダ名)を値とする辞書。
+
+        Returns
+        -------
+        count : int
+            書き換えたファイルの数。
+        """
+        count = 0
+        for ip, (remote_host, provider) in attributions.items():
+            for path in self.unfilled(ip):
+                try:
+                    if _fill_header(path, remote_host, provider):
+                        count += 1
+                except FileNotFoundError:
+                    with self._lock:
+                        self._paths[ip].discard(path)
+                with self._lock:
+                    self._unfilled.discard(path)
+        return count
+
+
+def ip_from_log_name(file_name: str):
+    """
+    ログファイル名（<IPアドレス>_<ポート番号>_<ハッシュ>.log）からIPアドレスを取り出す。
+    IPv6アドレスの「-」は「:」に戻す。形式が異なる場合はNone。
+    """
+    if not file_name.endswith(".log"):
+        return None
+    parts = file_name[: -len(".log")].rsplit("_", 2)
+    if len(parts) != 3:
+        return None
+    return parts[0].replace("-", ":")
+
+
+def _fill_header(path: str, remote_host: str, provider: str) -> bool:
+    # 4行目（プロバイダ）と5行目（リモートホスト）の「未取得」を置き換える
+    with open(path, "r+", encoding="utf-8") as log_file:
+        lines = log_file.readlines()
+        changed = False
+        if len(lines) >= 5 and UNKNOWN in lines[4]:
+            lines[4] = lines[4].replace(UNKNOWN, remote_host)
+            changed = True
+        if len(lines) >= 4 and UNKNOWN in lines[3]:
+            lines[3] = lines[3].replace(UNKNOWN, provider)
+            changed = True
+        if changed:
+            log_file.seek(0)  # ファイルの先頭に戻る
+            log_file.writelines(lines)  # 変更内容を書き込む
+            log_file.truncate()  # ファイルの末尾を現在の位置で切り捨てる
+    return changed
+
+
+_indexes: dict[str, PeerLogIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_peer_log_index(peers_folder: str) -> PeerLogIndex:
+    """
+    peersフォルダごとに、プロセス内で共有するPeerLogIndexを返す。
+    """
+    key = os.path.abspath(peers_folder)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = PeerLogIndex(key)
+        return index
@@ -0,0 +1,114 @@
+# ピア収集中に収録したピアと、その記録を保持するモジュール
+# 標準ライブラリ
+from collections import defaultdict
+
+
+class PeerRecord:
+    """
+    ログに記録するピアの1回分の情報。libtorrentのpeer_infoは保持せず、
+    記録に必要な値だけを持つ。
+    """
+
+    __slots__ = ("ip", "port", "client", "speed", "timestamp", "valid")
+
+    def __init__(
+        self, ip: str, port: int, client: str, speed: float, timestamp: str, valid: bool
+    ) -> None:
+        """
+        Parameters
+        ----------
+        ip : str
+            ピアのIPアドレス。
+        port : int
+            ピアのポート番号。
+        client : str
+            ピアのクライアント名。
+        speed : float
+            ダウンロード速度（KB/s）。
+        timestamp : str
+            記録時刻の文字列。
+        valid : bool
+            破損ピースを受け取っていなければTrue。
+        """
+        self.ip = ip
+        self.port = port
+        self.client = client
+        self.speed = speed
+        self.timestamp = timestamp
+        self.valid = valid
+
+    @classmethod
+    def from_peer_info(cls, p, timestamp: str, valid: bool) -> "PeerRecord":
+        """
+        libtorrentのpeer_infoから記録を作成する。
+        """
+        client = p.client.decode("utf-8", "replace") if isinstance(p.client, bytes) else p.client
+        return cls(p.ip[0], p.ip[1], client, p.payload_down_speed / 1000, timestamp, valid)
+
+    @property
+    def key(self) -> tuple[str, int]:
+        return (self.ip, self.port)
+
+    def __repr__(self) -> str:
+        return (
+            f"PeerRecord({self.ip!r}, {self.port}, {self.client!r}, {self.speed:.1f}, "
+            f"{self.timestamp!r}, {self.valid})"
+        )
+
+
+class PeerRegistry:
+    """
+    収録済みのピアを(IPアドレス, ポート番号)とIPアドレスで索引化し、
+    記録（PeerRecord）を収録順に保持する。
+    """
+
+    def __init__(self) -> None:
+        self.records: list[PeerRecord] = []
+        self._last_logged: dict[tuple[str, int], float] = {}  # ピアごとの最終収録時刻
+        self._ports: dict[str, set[int]] = defaultdict(set)  # IPアドレス→ポート番号
+
+    def __len__(self) -> int:
+        # 収録済みのピア（IPアドレスとポート番号の組）の数
+        return len(self._last_logged)
+
+    def __contains__(self, key) -> bool:
+        return key in self._last_logged
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def has_ip(self, ip: str) -> bool:
+        """
+        同じIPアドレスのピアを収録済みかどうかを返す。
+        """
+        return ip in self._ports
+
+    def last_logged(self, key) -> float:
+        """
+        ピアを最後に収録した時刻を返す。未収録の場合は0。
+        """
+        return self._last_logged.get(key, 0.0)
+
+    def log(self, record: PeerRecord, logged_at: float) -> PeerRecord:
+        """
+        ピアの記録を追加する。初めてのピアであれば索引にも登録する。
+
+        Parameters
+        ----------
+        record : PeerRecord
+            追加する記録。
+        logged_at : float
+            収録した時刻（time.time）。
+        """
+        key = record.key
+        if key not in self._last_logged:
+            self._ports[record.ip].add(record.port)
+        self._last_logged[key] = logged_at
+        self.records.append(record)
+        return record
+
+    def peers(self) -> list[tuple[str, int]]:
+        """
+        収録済みのピアを(IPアドレス, ポート番号)のリストで返す。
+        """
+        return list(self._last_logged)
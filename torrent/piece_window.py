@@ -0,0 +1,116 @@
+# ピア収集中にダウンロードするピースを、少数のピースからなる窓に限定して順に移動させるモジュール
+# 標準ライブラリ
+from collections import deque
+import random
+from typing import Optional
+
+PRIORITY_SKIP = 0  # ダウンロードしない
+PRIORITY_WINDOW = 4  # 窓に含まれるピース（libtorrentの標準の優先度）
+LOOKAHEAD = 64  # 1回の完了通知で、保有するピアがいるかを確認するピースの最大数
+
+
+class PieceWindow:
+    """
+    ダウンロード対象を窓（size個のピース）に限定し、ピースが完了するたびに
+    未取得のピースを1つずつ窓に加える。
+
+    最後の1ピースは窓に加えずに残しておき、torrentが完了してシーダーとの接続が
+    切れる（シーダー同士は接続を保たない）ことを防ぐ。ただし1ピースのtorrentでは
+    残すとダウンロードするピースがなくなるため、そのピースを窓に加え、完了するまで
+    シーダーを観測する。
+    """
+
+    def __init__(self, num_pieces: int, size: int = 16, have=(), start: Optional[int] = None) -> None:
+        """
+        Parameters
+        ----------
+        num_pieces : int
+            torrentのピース数。
+        size : int
+            同時にダウンロードするピースの数。
+        have : iterable of int
+            すでに取得済みのピースのインデックス。
+        start : int
+            窓を開始するピースのインデックス。Noneの場合はランダムに決める
+            （複数のクローラが同じピースに集中しないようにするため）。
+        """
+        self.num_pieces = num_pieces
+        self.size = max(1, int(size))
+        if start is None:
+            start = random.randrange(num_pieces) if num_pieces else 0
+
+        have = set(have)
+        order = [(start + i) % num_pieces for i in range(num_pieces)]
+        order = [piece for piece in order if piece not in have]
+        # 未取得のピースのうち、最後の1つは取得しない（1ピースのtorrentを除く）
+        if num_pieces == 1:
+            self._queue = deque(order)
+            self.reserved = None
+        else:
+            self._queue = deque(order[:-1])
+            self.reserved = order[-1] if order else None
+        self.window: set[int] = set()
+        self.completed: set[int] = set(have)
+        while self._queue and len(self.window) < self.size:
+            self.window.add(self._queue.popleft())
+
+    @property
+    def exhausted(self) -> bool:
+        """
+        窓に加えられる未取得のピースがなくなったかどうか。
+        """
+        return not self.window and not self._queue
+
+    def priorities(self) -> list[int]:
+        """
+        全ピースの優先度のリストを返す。add_torrent_paramsのpiece_prioritiesに使う。
+        """
+        priorities = [PRIORITY_SKIP] * self.num_pieces
+        for piece in self.window:
+            priorities[piece] = PRIORITY_WINDOW
+        return priorities
+
+    def complete(self, piece: int, available=None) -> list[tuple[int, int]]:
+        """
+        ピースの完了を反映し、窓を進める。
+
+        Parameters
+        ----------
+        piece : int
+            完了したピースのインデックス。
+        available : callable
+            ピースのインデックスを受け取り、そのピースを保有するピアがいればTrueを返す関数。
+            指定した場合、保有するピアが見つからないピースは後回しにする（1回に確認するのは
+            LOOKAHEAD個まで）。
+
+        Returns
+        -------
+        changes : list of (int, int)
+            優先度を変更するピースと、新しい優先度の組。
+        """
+        self.completed.add(piece)
+        if piece not in self.window:
+            return []
+
+        self.window.discard(piece)
+        changes = []
+        deferred: list[int] = []
+        # 確認するピースの数をLOOKAHEADまでに限り、完了通知ごとにキュー全体を回さない
+        while self._queue and len(self.window) < self.size and len(deferred) < LOOKAHEAD:
+            next_piece = self._queue.popleft()
+            if next_piece in self.completed:
+                continue
+            if available is not None and not available(next_piece):
+                deferred.append(next_piece)
+                continue
+            self.window.add(next_piece)
+            changes.append((next_piece, PRIORITY_WINDOW))
+
+        # 後回しにしたピースはキューの末尾に戻す（窓が空になる場合はそのまま加える）
+        for next_piece in deferred:
+            if not self.window:
+                self.window.add(next_piece)
+                changes.append((next_piece, PRIORITY_WINDOW))
+            else:
+                self._queue.append(next_piece)
+        return changes
@@ -0,0 +1,137 @@
+# 本体ファイルのfast-resumeデータを証拠フォルダに保存し、次回の追加時に読み込むモジュール
+# 標準ライブラリ
+import json
+import logging
+import os
+import tempfile
+
+# サードパーティライブラリ
+import libtorrent as lt
+
+logger = logging.getLogger(__name__)
+
+RESUME_FILE = "source.fastresume"  # source.torrentと同じフォルダに保存するresumeデータ
+SIGNATURE_FILE = "source.fastresume.json"  # 保存時の本体ファイルのサイズと更新時刻
+
+
+def resume_paths(torrent_path: str) -> tuple[str, str]:
+    """
+    .torrentファイルと同じフォルダの、resumeデータとその検証用ファイルのパスを返す。
+    """
+    folder = os.path.dirname(torrent_path)
+    return os.path.join(folder, RESUME_FILE), os.path.join(folder, SIGNATURE_FILE)
+
+
+def file_signature(info, save_path: str):
+    """
+    torrentに含まれる各ファイルの[相対パス, サイズ, 更新時刻（ナノ秒）]のリストを返す。
+    パディングファイル（ディスクに存在しない）は含めない。存在しないファイルがある場合はNone。
+    """
+    files = info.files()
+    signature = []
+    for i in range(files.num_files()):
+        if files.file_flags(i) & lt.file_storage.flag_pad_file:
+            continue
+        relative_path = files.file_path(i)
+        try:
+            st = os.stat(os.path.join(save_path, relative_path))
+        except OSError:
+            return None
+        signature.append([relative_path, st.st_size, st.st_mtime_ns])
+    return signature
+
+
+def load_resume(torrent_path: str, save_path: str, info):
+    """
+    保存済みのresumeデータを読み込む。
+
+    保存時から本体ファイルのサイズ・更新時刻が変わっていない場合のみ使い、
+    変わっている場合やデータが読めない場合はNoneを返す（libtorrentが再チェックする）。
+
+    Parameters
+    ----------
+    torrent_path : str
+        .torrentファイルへのパス。
+    save_path : str
+        本体ファイルの保存先のパス。
+    info : torrent_info
+        torrentの情報。
+
+    Returns
+    -------
+    params : add_torrent_params or None
+        resumeデータから復元した追加パラメータ。
+    """
+    resume_path, signature_path = resume_paths(torrent_path)
+    try:
+        with open(signature_path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        with open(resume_path, "rb") as f:
+            data = f.read()
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if saved.get("info_hash") != str(info.info_hash()):
+        return None
+    if saved.get("files") != file_signature(info, save_path):
+        logger.info("本体ファイルが変更されているため、resumeデータを使わずに再チェックします。")
+        return None
+
+    try:
+        params = lt.read_resume_data(data)
+    except Exception as e:
+        logger.warning(f"resumeデータの読み込みに失敗しました: {e}")
+        return None
+    return params
+
+
+def save_resume(torrent_path: str, save_path: str, info, data: bytes) -> bool:
+    """
+    resumeデータと、現在の本体ファイルのサイズ・更新時刻を保存する。
+
+    Parameters
+    ----------
+    torrent_path : str
+        .torrentファイルへのパス。
+    save_path : str
+        本体ファイルの保存先のパス。
+    info : torrent_info
+        torrentの情報。
+    data : bytes
+        write_resume_data_bufで書き出したresumeデータ。
+
+    Returns
+    -------
+    result : bool
+        保存した場合はTrue。
+    """
+    signature = file_signature(info, save_path)
+    if signature is None:
+        return False
+
+    resume_path, signature_path = resume_paths(torrent_path)
+    sidecar = {"info_hash": str(info.info_hash()), "files": signature}
+    try:
+        # resumeデータを先に置き換え、検証用ファイルは最後に書く（途中で失敗しても再チェックになる）
+        _replace(resume_path, data)
+        _replace(
+            signature_path,
+            json.dumps(sidecar, ensure_ascii=False, indent=4).encode("utf-8"),
+        )
+    except OSError as e:
+        logger.warning(f"resumeデータの保存に失敗しました: {e}")
+        return False
+    return True
+
+
+def _replace(path: str, data: bytes) -> None:
+    # 一時ファイルに書き込んでから置き換える
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
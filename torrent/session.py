@@ -0,0 +1,232 @@
+# プロセス内で1つのlibtorrentセッションを共有し、複数のtorrentの追加・削除を管理するモジュール
+# 標準ライブラリ
+import logging
+import threading
+import time
+from typing import Optional
+
+# サードパーティライブラリ
+import libtorrent as lt
+
+REMOVE_TIMEOUT = 10  # 削除中の同じtorrentがセッションから消えるまで待つ最大の秒数
+
+
+class SessionManager:
+    """
+    収集サイクル全体で使い回すlibtorrentセッションを保持する。
+
+    torrentごとにセッションを作り直すと、ソケットの確保やDHT・トラッカーの
+    ウォームアップ、IPフィルタの構築が毎回発生するため、1プロセスにつき
+    1つのセッションを生成し、torrentの追加と削除だけを行う。
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+        self.logger = logging.getLogger(__name__)
+        # 設定ファイルで指定したポートをリスナーに設定し、セッションを開始
+        self.session = lt.session(
+            {"listen_interfaces": f"0.0.0.0:{port},[::]:{port}"}
+        )
+        self.handles: dict[str, lt.torrent_handle] = {}  # info_hash文字列をキーとするハンドル
+        self.allowed_addresses: set[str] = set()  # 各torrentのトラッカーなど、常に許可するアドレス
+        self._filter_template = None  # 適用中のIPフィルタの元になったテンプレート
+        self._filter_blocked: tuple = ()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, port: int) -> "SessionManager":
+        """
+        プロセス内で共有されるSessionManagerを返す。
+
+        Parameters
+        ----------
+        port : int
+            リスナーに使うポート番号。既存のセッションと異なる場合は作り直す。
+
+        Returns
+        -------
+        manager : SessionManager
+            共有のセッションマネージャ。
+        """
+        with cls._instance_lock:
+            if cls._instance is not None and cls._instance.port != port:
+                cls._instance.close()
+                cls._instance = None
+
+            if cls._instance is None:
+                cls._instance = cls(port)
+
+            return cls._instance
+
+    @classmethod
+    def current(cls) -> Optional["SessionManager"]:
+        """
+        プロセス内で共有中のSessionManagerを返す。まだ生成されていない場合はNone。
+        """
+        return cls._instance
+
+    def add_torrent(
+        self,
+        info,
+        save_path: str,
+        apply_ip_filter: bool = True,
+        piece_priorities=None,
+        resume_params=None,
+        seed_mode: bool = False,
+    ) -> lt.torrent_handle:
+        """
+        共有セッションにtorrentを追加する。
+
+        Parameters
+        ----------
+        info : torrent_info
+            追加するtorrentの情報。
+        save_path : str
+            本体ファイルの保存先のパス。
+        apply_ip_filter : bool
+            セッションのIPフィルタをこのtorrentに適用するかどうか。
+        piece_priorities : list of int
+            ピースごとの優先度。指定した場合、追加した時点から適用される。
+        resume_params : add_torrent_params
+            read_resume_dataで復元したパラメータ。指定した場合、ハッシュの再チェックを省く。
+        seed_mode : bool
+            本体ファイルを検証済みとして扱い、ハッシュの再チェックを省く。
+
+        Returns
+        -------
+        handle : torrent_handle
+            追加したtorrentのハンドル。
+        """
+        params = resume_params if resume_params is not None else lt.add_torrent_params()
+        params.ti = info
+        params.save_path = save_path
+        if apply_ip_filter:
+            params.flags |= lt.torrent_flags.apply_ip_filter
+        else:
+            params.flags &= ~lt.torrent_flags.apply_ip_filter
+        if seed_mode:
+            params.flags |= lt.torrent_flags.seed_mode
+        if piece_priorities is not None:
+            params.piece_priorities = list(piece_priorities)
+
+        key = str(info.info_hash())
+        with self._lock:
+            # 同じtorrentが残っている場合は、いったん取り除いてから追加し直す
+            old_handle = self.handles.pop(key, None)
+            if old_handle is not None and old_handle.is_valid():
+                self.logger.info("セッション内に残っていた " + key + " を削除します。")
+                self.session.remove_torrent(old_handle)
+            # remove_torrentは非同期に処理されるため、消えるまで待ってから追加する
+            self._wait_removed(info.info_hash())
+
+            handle = self.session.add_torrent(params)
+            self.handles[key] = handle
+
+        return handle
+
+    def _wait_removed(self, info_hash) -> None:
+        # 同じinfo hashのtorrentがセッションに残っている間は待つ
+        # （期限を過ぎた場合はそのまま追加し、libtorrentのエラーに任せる）
+        deadline = time.monotonic() + REMOVE_TIMEOUT
+        while self.session.find_torrent(info_hash).is_valid():
+            if time.monotonic() >= deadline:
+                self.logger.warning(str(info_hash) + " の削除が完了しませんでした。")
+                return
+            time.sleep(0.05)
+
+    def remove_torrent(self, handle: lt.torrent_handle) -> None:
+        """
+        共有セッションからtorrentを削除する。
+
+        Parameters
+        ----------
+        handle : torrent_handle
+            削除するtorrentのハンドル。
+        """
+        with self._lock:
+            if not handle.is_valid():
+                return
+            self.handles.pop(str(handle.info_hash()), None)
+            self.session.remove_torrent(handle)
+
+    def apply_ip_filter(self, template, blocked=()) -> None:
+        """
+        構築済みのIPフィルタ（テンプレート）に禁止範囲を加えて、セッション全体に適用する。
+        テンプレートは複製して使うため変更されない。allow_addressesで許可済みの
+        アドレスも引き継ぐ。テンプレートと禁止範囲が前回と同じ場合は何もしない。
+
+        Parameters
+        ----------
+        template : ip_filter
+            再利用するIPフィルタ。
+        blocked : iterable of (str, str)
+            追加で禁止する範囲の(開始, 終了)のタプル。自分自身のIPアドレスなど。
+        """
+        blocked = tuple(blocked)
+        with self._lock:
+            if (
+                template is self._filter_template
+                and blocked == self._filter_blocked
+            ):
+                return
+
+            # set_ip_filterはフィルタを複製するため、テンプレートを汚さずに加工できる
+            self.session.set_ip_filter(template)
+            ip_filter = self.session.get_ip_filter()
+            for start, end in blocked:
+                ip_filter.add_rule(start, end, 1)  # 1は禁止を意味する
+            for address in self.allowed_addresses:
+                ip_filter.add_rule(address, address, 0)
+            self.session.set_ip_filter(ip_filter)
+
+            self._filter_template = template
+            self._filter_blocked = blocked
+
+    def update_blocked(self, blocked) -> None:
+        """
+        適用中のテンプレートはそのままに、禁止範囲だけを置き換える。
+        まだIPフィルタを適用していない場合は何もしない。
+
+        Parameters
+        ----------
+        blocked : iterable of (str, str)
+            新しい禁止範囲の(開始, 終了)のタプル。
+        """
+        template = self._filter_template
+        if template is not None:
+            self.apply_ip_filter(template, blocked)
+
+    def allow_addresses(self, addresses) -> None:
+        """
+        現在のIPフィルタに許可アドレスを追加する。
+        並行して収集中の他のtorrentの許可設定を消さないよう、差し替えではなく追記する。
+
+        Parameters
+        ----------
+        addresses : iterable of str
+            許可するIPアドレス。
+        """
+        with self._lock:
+            new_addresses = set(addresses) - self.allowed_addresses
+            if not new_addresses:
+                return
+
+            self.allowed_addresses |= new_addresses
+            ip_filter = self.session.get_ip_filter()
+            for address in new_addresses:
+                ip_filter.add_rule(address, address, 0)
+            self.session.set_ip_filter(ip_filter)
+
+    def close(self) -> None:
+        """
+        セッション内のtorrentをすべて削除し、通信を停止する。
+        """
+        with self._lock:
+            for handle in self.handles.values():
+                if handle.is_valid():
+                    self.session.remove_torrent(handle)
+            self.handles.clear()
+            self.session.pause()
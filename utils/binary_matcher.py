@@ -1,14 +1,21 @@
 # 対象フォルダ内のsource.torrentの情報をもとに、同フォルダ以下にあるピースと
 # 本体ファイルのバイナリマッチを実行するモジュール
-import bencodepy
+from collections import defaultdict
+import hashlib
 import os
 
+import bencodepy
+
+from utils.piece_reader import HASH_SIZE, PieceReader
+from utils.piece_verifier import PieceVerifier
+
 
 class BinaryMatcher:
     def __init__(self, source_file):
         self.source_file = source_file
         self.torrent_data = self.load_torrent_file()
-        self.concatenated_data = self.load_concatenated_data()
+        self.reader = self.load_reader()
+        self.piece_table = self.load_piece_table()
 
     def load_torrent_file(self):
         # ファイル存在チェック
@@ -18,88 +25,88 @@ class BinaryMatcher:
         with open(self.source_file, "rb") as f:
             return bencodepy.decode(f.read())
 
-    def load_concatenated_data(self):
-        source_folder = os.path.dirname(self.source_file)
-
-        # ダウンロード対象のファイルまたはフォルダ名の取得
-        download_file_name = self.torrent_data[b"info"][b"name"].decode(
-            "utf-8", errors="replace"
-        )
-        download_file = os.path.join(source_folder, download_file_name)
+    def load_reader(self):
+        # 本体ファイルを連結して読み込む代わりに、torrentのファイル構成の順に
+        # ピース単位でメモリマップから読み出すPieceReaderを用意する
+        reader = PieceReader(self.source_file)
 
         # ファイル存在チェック
-        if not os.path.exists(download_file):
-            print(f"{download_file_name} が見つかりませんでした。")
+        if not reader.exists:
+            print(f"{reader.name} が見つかりませんでした。")
             return None  # 存在しない場合はNoneを返す
 
-        # ダウンロードしたファイルまたはフォルダ内の全てのファイルを連結
-        if os.path.isdir(download_file):
-            # ディレクトリ内のファイルの並び順をソートして保証
-            file_paths = [
-                os.path.join(root, file)
-                for root, _, files in os.walk(download_file)
-                for file in sorted(files)
-            ]
-            concatenated_data = b"".join(
-                open(file_path, "rb").read() for file_path in file_paths
-            )
-        else:
-            with open(download_file, "rb") as f:
-                concatenated_data = f.read()
-
-        return concatenated_data
+        return reader
+
+    def load_piece_table(self):
+        # torrentのpiecesのSHA-1ハッシュから、ピースのインデックスを引く辞書を作成
+        # （内容が同じピースは同じハッシュになるため、インデックスはリストで持つ）
+        pieces = self.torrent_data[b"info"].get(b"pieces", b"")
+        table = defaultdict(list)
+        for piece_index in range(len(pieces) // HASH_SIZE):
+            digest = pieces[piece_index * HASH_SIZE : (piece_index + 1) * HASH_SIZE]
+            table[digest].append(piece_index)
+        return dict(table)
+
+    def lookup(self, bin_data):
+        # ピースのデータのSHA-1ハッシュと一致するピースのインデックスのリストを返す
+        return self.piece_table.get(hashlib.sha1(bin_data).digest(), [])
+
+    def verify_reference(self):
+        # 本体ファイルをsource.torrentのピースハッシュで検証し、VerificationResultを返す
+        return PieceVerifier(self.source_file).verify()
 
     def binary_match(self, bin_file, piece_folder):
-        # self.concatenated_dataがNoneなら、その時点でFalseを返す
-        if self.concatenated_data is None:
+        # self.readerがNoneなら、その時点でFalseを返す
+        if self.reader is None:
             return False
 
         # binファイルの読み込み
         with open(os.path.join(piece_folder, bin_file), "rb") as f:
             bin_data = f.read()
 
+        return self.match_bytes(bin_data)
+
+    def match_bytes(self, bin_data):
+        # 読み込み済みのピースのデータについて、一致するピースのインデックスを返す
+        # self.readerがNoneなら、その時点でFalseを返す
+        if self.reader is None:
+            return False
+
         # binファイルが空なら、その時点でFalseを返す
         if len(bin_data) == 0:
             return False
 
-        # ピースのバイナリマッチングを行う
-        piece_length = self.torrent_data[b"info"][b"piece length"]
-        for i in range(
-            0, len(self.concatenated_data) - len(bin_data) + 1, piece_length
-        ):
-            chunk = self.concatenated_data[i : i + piece_length]
-            if bin_data == chunk:
-                piece_index = int(i / piece_length)
+        # ハッシュからピースのインデックスを引き、本体ファイルの該当ピースとの
+        # バイナリマッチで確認する
+        if self.piece_table:
+            for piece_index in self.lookup(bin_data):
+                if bin_data == self.reader.read(piece_index):
+                    return piece_index
+            return False
+
+        # ピースハッシュがない（v2のみの）torrentでは、すべてのピースと比較する
+        # （長さが異なるピースは読み出さない）
+        for piece_index in range(len(self.reader)):
+            if self.reader.piece_size(piece_index) != len(bin_data):
+                continue
+            if bin_data == self.reader.read(piece_index):
                 return piece_index
 
         return False
 
     def instant_binary_match(self, bin_data, piece_index):
-        # self.concatenated_dataがNoneなら、その時点でFalseを返す
-        if self.concatenated_data is None:
+        # self.readerがNoneなら、その時点でFalseを返す
+        if self.reader is None:
             return False
 
         # ピースダウンロードメソッド中にバイナリマッチを行う
-        # ダウンロード元となったtorrentファイルからピース長の情報を取得
-        piece_length = self.torrent_data[b"info"][b"piece length"]
-
-        # 全ピース数を計算
-        total_pieces = len(self.concatenated_data) // piece_length
-        if len(self.concatenated_data) % piece_length != 0:
-            total_pieces += 1
-
         # 指定されたpiece_indexが全ピース数未満であるか確認
-        if piece_index >= total_pieces:
+        if not 0 <= piece_index < len(self.reader):
             print("指定されたpiece_indexが範囲外です。")
             return False
 
         # 指定されたpiece_indexのみを検証する
-        start_index = piece_index * piece_length
-        end_index = (piece_index + 1) * piece_length
-
-        # 指定された範囲内でバイナリマッチングを試行
-        chunk = self.concatenated_data[start_index:end_index]
-        if bin_data == chunk:
+        if bin_data == self.reader.read(piece_index):
             return piece_index
 
         return False
@@ -69,7 +69,47 @@ class Config:
                 self.UPLOAD_LIMIT = data["max_upload_limit"]
             else:
                 self.UPLOAD_LIMIT = 100
+            if "max_concurrent_torrents" in data:
+                self.MAX_CONCURRENT = data["max_concurrent_torrents"]
+            else:
+                self.MAX_CONCURRENT = 4
+            # 自分自身のグローバルIPアドレスを問い合わせる先と、結果の有効期限（秒）
+            self.PUBLIC_IPV4_URL = data.get(
+                "public_ipv4_url", "https://api.ipify.org?format=json"
+            )
+            self.PUBLIC_IPV6_URL = data.get(
+                "public_ipv6_url", "https://api6.ipify.org?format=json"
+            )
+            self.PUBLIC_IP_TTL = data.get("public_ip_ttl", 300)
+            # ピア別ログを記録のたびにfsyncするかどうか
+            self.PEER_LOG_FSYNC = data.get("fsync_peer_log", False)
+            # プロバイダ名を問い合わせるWHOISサーバーと、問い合わせの間隔（秒）
+            self.WHOIS_SERVER = data.get("whois_server", "whois.nic.ad.jp")
+            self.WHOIS_PORT = data.get("whois_port", 43)
+            self.WHOIS_INTERVAL = data.get("whois_interval", 5)
+            # ピア収集中にダウンロードするピースの数（0の場合は進捗80%まで全体をダウンロード）
+            self.PIECE_WINDOW = data.get("piece_window", 0)
+            # ピースの送信元をピアごとに記録するか、検証済みのピースを保存するか
+            self.PIECE_ATTRIBUTION = data.get("piece_attribution", False)
+            self.CAPTURE_PIECES = data.get("capture_pieces", False)
+            # 接続済みピアのビットフィールドを記録するか
+            self.RECORD_BITFIELDS = data.get("record_bitfields", False)
+            # 本体ファイルのダウンロード中にピアを収集するか
+            self.SINGLE_PASS = data.get("single_pass", False)
         else:
             self.MY_PORT = 6881
             self.MAX_LIST_SIZE = 100
             self.UPLOAD_LIMIT = 100
+            self.MAX_CONCURRENT = 4
+            self.PUBLIC_IPV4_URL = "https://api.ipify.org?format=json"
+            self.PUBLIC_IPV6_URL = "https://api6.ipify.org?format=json"
+            self.PUBLIC_IP_TTL = 300
+            self.PEER_LOG_FSYNC = False
+            self.WHOIS_SERVER = "whois.nic.ad.jp"
+            self.WHOIS_PORT = 43
+            self.WHOIS_INTERVAL = 5
+            self.PIECE_WINDOW = 0
+            self.PIECE_ATTRIBUTION = False
+            self.CAPTURE_PIECES = False
+            self.RECORD_BITFIELDS = False
+            self.SINGLE_PASS = False
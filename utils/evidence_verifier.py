@@ -0,0 +1,222 @@
+# 証拠フォルダ（またはevi/tor全体）のピースファイルを、プロセスプールで一括してバイナリマッチするモジュール
+# 標準ライブラリ
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+# 独自モジュール
+from utils.binary_matcher import BinaryMatcher
+from utils.config import Config
+import utils.time as ut
+
+logger = logging.getLogger(__name__)
+
+REPORT_FILE = "binary_match_report.json"  # 既定の結果の保存先（対象フォルダ内）
+MAX_BATCH = 256  # 1回の受け渡しで照合するピースファイルの最大数
+
+MATCHED = "matched"  # 本体ファイルのピースと一致した
+MISMATCHED = "mismatched"  # 一致するピースがなかった
+BLANK = "blank"  # 一致するピースがなく、内容がすべて空白（0x20）またはNullバイト（0x00）だった
+ERROR = "error"  # source.torrentや本体ファイルを読み込めず、照合できなかった
+
+_matchers: dict[str, BinaryMatcher] = {}  # ワーカープロセスごとの、source.torrent→BinaryMatcher
+
+
+def find_piece_folders(root: str) -> dict[str, list[str]]:
+    """
+    source.torrentを含む証拠フォルダと、その直下の.binファイルを含むフォルダを探す。
+
+    Parameters
+    ----------
+    root : str
+        証拠フォルダ、またはそれらを含むフォルダ（evi/torなど）のパス。
+
+    Returns
+    -------
+    folders : dict
+        source.torrentのパスをキー、ピースフォルダのパスのリストを値とする辞書。
+    """
+    folders = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        if "source.torrent" not in filenames:
+            continue
+        piece_folders = []
+        for dirname in sorted(dirnames):
+            piece_folder = os.path.join(dirpath, dirname)
+            if any(name.endswith(".bin") for name in os.listdir(piece_folder)):
+                piece_folders.append(piece_folder)
+        if piece_folders:
+            folders[os.path.join(dirpath, "source.torrent")] = piece_folders
+    return folders
+
+
+def is_blank(data: bytes) -> bool:
+    """
+    内容がすべて空白（0x20）またはNullバイト（0x00）であればTrue。
+    """
+    return len(data) > 0 and not data.strip(b" \x00")
+
+
+def verify_pieces(torrent_path: str, bin_paths: list[str]) -> list[tuple[str, str, object, int]]:
+    """
+    1つのtorrentのピースファイルを照合する（ワーカープロセスで実行する）。
+
+    Returns
+    -------
+    results : list of (str, str, int or None, int)
+        ピースファイルのパス、結果、一致したピースのインデックス、ファイルサイズ。
+
+    Raises
+    ------
+    FileNotFoundError
+        source.torrentまたは本体ファイルが見つからない場合。
+    """
+    matcher = _matchers.get(torrent_path)
+    if matcher is None:
+        matcher = _matchers[torrent_path] = BinaryMatcher(torrent_path)
+    # 本体ファイルがなければ、すべてのピースが不一致と判定されるため照合しない
+    if matcher.reader is None:
+        raise FileNotFoundError(f"{torrent_path} の本体ファイルが見つかりません。")
+
+    results = []
+    for bin_path in bin_paths:
+        with open(bin_path, "rb") as f:
+            data = f.read()
+        piece_index = matcher.match_bytes(data)
+        if piece_index is False:
+            piece_index = None
+        # 本体ファイルと一致したピースは、内容が空白でも一致として扱う
+        if piece_index is not None:
+            status = MATCHED
+        elif is_blank(data):
+            status = BLANK
+        else:
+            status = MISMATCHED
+        results.append((bin_path, status, piece_index, len(data)))
+    return results
+
+
+def verify_evidence(root: str, workers: Optional[int] = None) -> dict:
+    """
+    フォルダ以下のすべてのピースファイルを、プロセスプールで並列に照合する。
+
+    Parameters
+    ----------
+    root : str
+        証拠フォルダ、またはそれらを含むフォルダ（evi/torなど）のパス。
+    workers : int
+        ワーカープロセスの数。Noneの場合はCPUのコア数。
+
+    Returns
+    -------
+    report : dict
+        結果の集計と、ピースファイルごとの結果（evidence, peer, file, status, piece_index）。
+        照合できなかったピースファイルはstatusをerrorとし、errorに理由を記録する。
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    started = time.perf_counter()
+
+    tasks = []
+    for torrent_path, piece_folders in find_piece_folders(root).items():
+        bin_paths = [
+            os.path.join(piece_folder, name)
+            for piece_folder in piece_folders
+            for name in sorted(os.listdir(piece_folder))
+            if name.endswith(".bin") and os.path.isfile(os.path.join(piece_folder, name))
+        ]
+        # 各プロセスがtorrentごとにBinaryMatcherを作る回数を抑えつつ、均等に割り当てる
+        size = min(MAX_BATCH, max(1, len(bin_paths) // (workers * 4)))
+        for i in range(0, len(bin_paths), size):
+            tasks.append((torrent_path, bin_paths[i : i + size]))
+
+    results = []
+    total_bytes = 0
+    summary = {MATCHED: 0, MISMATCHED: 0, BLANK: 0, ERROR: 0}
+    if tasks:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            futures = [executor.submit(verify_pieces, *task) for task in tasks]
+            for (torrent_path, bin_paths), future in zip(tasks, futures):
+                try:
+                    rows = future.result()
+                    error = None
+                except Exception as e:
+                    # 1つのtorrentの失敗で、他のtorrentの結果を捨てないようにする
+                    error = f"{type(e).__name__}: {e}"
+                    logger.warning(f"{torrent_path} のピースを照合できませんでした: {error}")
+                    rows = [(bin_path, ERROR, None, 0) for bin_path in bin_paths]
+                for bin_path, status, piece_index, size in rows:
+                    piece_folder, file_name = os.path.split(bin_path)
+                    evidence, peer = os.path.split(piece_folder)
+                    result = {
+                        "evidence": evidence,
+                        "peer": peer,
+                        "file": file_name,
+                        "status": status,
+                        "piece_index": piece_index,
+                    }
+                    if error is not None:
+                        result["error"] = error
+                    results.append(result)
+                    summary[status] += 1
+                    total_bytes += size
+
+    elapsed = time.perf_counter() - started
+    return {
+        "root": os.path.abspath(root),
+        "created": ut.get_jst_str(),
+        "workers": workers,
+        "files": len(results),
+        "bytes": total_bytes,
+        "elapsed": round(elapsed, 3),
+        "mbps": round(total_bytes / 1048576 / elapsed, 1) if elapsed > 0 else 0.0,
+        "files_per_second": round(len(results) / elapsed, 1) if elapsed > 0 else 0.0,
+        "summary": summary,
+        "results": results,
+    }
+
+
+def save_report(report: dict, path: str) -> None:
+    # 結果をJSONで保存する
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+
+
+def main(argv=None) -> dict:
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(
+        description="証拠フォルダのピースファイルを、本体ファイルと一括してバイナリマッチします。"
+    )
+    parser.add_argument(
+        "root",
+        nargs="?",
+        help="証拠フォルダ、またはそれらを含むフォルダ（省略時はevi/tor）",
+    )
+    parser.add_argument("-o", "--output", help=f"結果の保存先（省略時は対象フォルダ内の{REPORT_FILE}）")
+    parser.add_argument("-w", "--workers", type=int, help="ワーカープロセスの数（省略時はCPUのコア数）")
+    args = parser.parse_args(argv)
+
+    root = args.root or Config(base_path=current_dir, level=1).TORRENT_FOLDER
+    report = verify_evidence(root, args.workers)
+    output = args.output or os.path.join(root, REPORT_FILE)
+    save_report(report, output)
+
+    summary = report["summary"]
+    print(
+        f"一致 {summary[MATCHED]} 件、不一致 {summary[MISMATCHED]} 件、空白 {summary[BLANK]} 件、"
+        f"エラー {summary[ERROR]} 件"
+    )
+    print(
+        f"{report['files']} 件（{report['bytes'] / 1048576:.1f} MB）を {report['elapsed']:.1f} 秒で照合"
+        f"（{report['mbps']:.1f} MB/s、{report['files_per_second']:.1f} 件/秒、"
+        f"{report['workers']} プロセス）"
+    )
+    print(f"結果を {output} に保存しました。")
+    return report
+
+
+if __name__ == "__main__":
+    main()
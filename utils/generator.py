@@ -47,6 +47,19 @@ class SettingsGenerator:
                 "port": 6881,
                 "max_list_size": 50,
                 "max_upload_limit": 100,
+                "max_concurrent_torrents": 4,
+                "public_ipv4_url": "https://api.ipify.org?format=json",
+                "public_ipv6_url": "https://api6.ipify.org?format=json",
+                "public_ip_ttl": 300,
+                "fsync_peer_log": False,
+                "whois_server": "whois.nic.ad.jp",
+                "whois_port": 43,
+                "whois_interval": 5,
+                "piece_window": 0,
+                "piece_attribution": False,
+                "capture_pieces": False,
+                "record_bitfields": False,
+                "single_pass": False,
                 "ip_last_modified": 0,
                 "add_all_peers": False,
                 "mail_user": "",
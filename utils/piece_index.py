@@ -0,0 +1,256 @@
+# 証拠フォルダのsource.torrentのピースハッシュを索引化し、別のtorrentと内容を比較検証するモジュール
+# 標準ライブラリ
+from collections import defaultdict, namedtuple
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+# サードパーティライブラリ
+import bencodepy
+
+# 独自モジュール
+from utils.piece_reader import HASH_SIZE
+
+logger = logging.getLogger(__name__)
+
+PIECE_INDEX_FILE = "piece_index.sqlite3"  # 設定フォルダ内の索引のファイル名
+FALSE_MARK = ".false"  # 誤検出として分類された証拠フォルダの印
+QUERY_CHUNK = 500  # 1回の問い合わせに含めるハッシュの数（SQLiteの変数の上限を超えないように）
+
+# info_hash: 一致したtorrentのinfo_hash、name: 名前、path: source.torrentのパス
+# shared: 一致したピースの数、num_pieces: 一致したtorrentの全ピース数
+# pieces: (照合したtorrentのピース番号, 一致したtorrentのピース番号)のリスト
+PieceMatch = namedtuple("PieceMatch", ["info_hash", "name", "path", "shared", "num_pieces", "pieces"])
+
+
+def read_torrent(torrent_path: str):
+    """
+    .torrentファイルから、info_hash（v1）、名前、ピース長、SHA-1ピースハッシュを読み取る。
+    """
+    with open(torrent_path, "rb") as f:
+        info = bencodepy.decode(f.read())[b"info"]
+    info_hash = hashlib.sha1(bencodepy.encode(info)).hexdigest()
+    name = info.get(b"name.utf-8", info[b"name"]).decode("utf-8", errors="replace")
+    return info_hash, name, info[b"piece length"], info.get(b"pieces", b"")
+
+
+def _split_hashes(pieces: bytes) -> list[bytes]:
+    return [pieces[i : i + HASH_SIZE] for i in range(0, len(pieces) - HASH_SIZE + 1, HASH_SIZE)]
+
+
+class PieceIndex:
+    """
+    source.torrentのピースハッシュ（SHA-1）から、(info_hash, ピース番号)を引く索引をSQLiteに保存する。
+
+    同じ作品が別のinfo_hashで再アップロードされても、ピース長が同じであれば
+    ピースのハッシュが一致するため、既知のtorrentとの一致をピース単位で調べられる。
+    .torrentファイルの更新時刻とサイズを記録し、変化がなければ読み直さない。
+    """
+
+    def __init__(self, db_path: str) -> None:
+        """
+        Parameters
+        ----------
+        db_path : str
+            SQLiteのデータベースファイルのパス。
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS torrents (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    info_hash TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    piece_length INTEGER NOT NULL,
+                    num_pieces INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pieces (
+                    hash BLOB NOT NULL,
+                    torrent INTEGER NOT NULL,
+                    piece INTEGER NOT NULL,
+                    PRIMARY KEY (hash, torrent, piece)
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS pieces_torrent ON pieces (torrent)"
+            )
+
+    def __len__(self) -> int:
+        # 索引に含まれるtorrent（source.torrentのファイル）の数
+        with self._lock:
+            return int(self._conn.execute("SELECT COUNT(*) FROM torrents").fetchone()[0])
+
+    def add(self, torrent_path: str) -> bool:
+        """
+        .torrentファイルのピースハッシュを索引に加える。
+        前回から更新時刻とサイズが変わっていなければ何もしない。
+
+        Returns
+        -------
+        added : bool
+            索引を更新した場合はTrue。
+        """
+        path = os.path.abspath(torrent_path)
+        st = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM torrents WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, st.st_size, st.st_mtime_ns),
+            ).fetchone()
+        if row is not None:
+            return False
+
+        info_hash, name, piece_length, pieces = read_torrent(path)
+        hashes = _split_hashes(pieces)
+        with self._lock, self._conn:
+            # 同じパスの古い記録（別のtorrentに置き換えられた場合を含む）を消してから追加
+            self._delete(path)
+            torrent_id = self._conn.execute(
+                "INSERT INTO torrents (path, info_hash, name, piece_length, num_pieces, size, mtime_ns) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, info_hash, name, piece_length, len(hashes), st.st_size, st.st_mtime_ns),
+            ).lastrowid
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO pieces VALUES (?, ?, ?)",
+                ((digest, torrent_id, piece) for piece, digest in enumerate(hashes)),
+            )
+        return True
+
+    def remove(self, torrent_path: str) -> None:
+        """
+        .torrentファイルを索引から取り除く。
+        """
+        with self._lock, self._conn:
+            self._delete(os.path.abspath(torrent_path))
+
+    def _delete(self, path: str) -> None:
+        # ロックとトランザクションの中で呼び出す
+        for (torrent_id,) in self._conn.execute(
+            "SELECT id FROM torrents WHERE path = ?", (path,)
+        ).fetchall():
+            self._conn.execute("DELETE FROM pieces WHERE torrent = ?", (torrent_id,))
+            self._conn.execute("DELETE FROM torrents WHERE id = ?", (torrent_id,))
+
+    def build(self, root: str) -> tuple[int, int]:
+        """
+        フォルダ以下のすべてのsource.torrentを索引に加え、存在しなくなったものを取り除く。
+
+        Parameters
+        ----------
+        root : str
+            証拠フォルダを含むフォルダ（TORRENT_FOLDERなど）のパス。
+
+        Returns
+        -------
+        (added, removed) : (int, int)
+            追加・更新したtorrentと、取り除いたtorrentの数。
+        """
+        added = 0
+        for dirpath, _, filenames in os.walk(root):
+            if "source.torrent" not in filenames:
+                continue
+            try:
+                if self.add(os.path.join(dirpath, "source.torrent")):
+                    added += 1
+            except (OSError, KeyError, bencodepy.DecodingError) as e:
+                logger.warning(f"{dirpath} のsource.torrentを索引に加えられませんでした: {e}")
+
+        with self._lock:
+            paths = [row[0] for row in self._conn.execute("SELECT path FROM torrents")]
+        removed = 0
+        for path in paths:
+            if not os.path.exists(path):
+                self.remove(path)
+                removed += 1
+        return added, removed
+
+    def lookup(self, digest: bytes) -> list[tuple[str, int]]:
+        """
+        ピースのハッシュと一致する(info_hash, ピース番号)のリストを返す。
+        """
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT DISTINCT t.info_hash, p.piece FROM pieces p
+                JOIN torrents t ON t.id = p.torrent
+                WHERE p.hash = ? ORDER BY t.info_hash, p.piece
+                """,
+                (digest,),
+            ).fetchall()
+
+    def match(self, torrent_path: str, exclude_false: bool = True) -> list[PieceMatch]:
+        """
+        .torrentファイルのピースハッシュと一致するピースを持つ、既知のtorrentを返す。
+
+        Parameters
+        ----------
+        torrent_path : str
+            照合する.torrentファイルのパス（索引に含まれていなくてもよい）。
+        exclude_false : bool
+            Trueの場合、誤検出として分類された（.falseのある）証拠フォルダのtorrentを除く。
+
+        Returns
+        -------
+        matches : list of PieceMatch
+            一致したピースの多い順に並べた、既知のtorrent（証拠フォルダ）ごとの結果。
+            照合した.torrentファイル自身は含まないが、同じinfo_hashの別の証拠フォルダは含む。
+        """
+        self_path = os.path.abspath(torrent_path)
+        _, _, _, pieces = read_torrent(torrent_path)
+        positions = defaultdict(list)  # ハッシュ→照合したtorrentのピース番号
+        for piece, digest in enumerate(_split_hashes(pieces)):
+            positions[digest].append(piece)
+
+        shared = defaultdict(list)  # torrentのid→(ピース番号, 一致したピース番号)
+        digests = list(positions)
+        with self._lock:
+            for i in range(0, len(digests), QUERY_CHUNK):
+                chunk = digests[i : i + QUERY_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT hash, torrent, piece FROM pieces WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for digest, torrent_id, other_piece in rows:
+                    for piece in positions[digest]:
+                        shared[torrent_id].append((piece, other_piece))
+
+            torrents = {
+                row[0]: row[1:]
+                for row in self._conn.execute(
+                    "SELECT id, info_hash, name, path, num_pieces FROM torrents"
+                ).fetchall()
+                if row[0] in shared
+            }
+
+        matches = []
+        for torrent_id, pairs in shared.items():
+            if torrent_id not in torrents:
+                continue
+            info_hash, name, path, num_pieces = torrents[torrent_id]
+            if path == self_path:
+                continue
+            if exclude_false and os.path.isfile(os.path.join(os.path.dirname(path), FALSE_MARK)):
+                continue
+            pairs.sort()
+            matches.append(
+                PieceMatch(info_hash, name, path, len({p for p, _ in pairs}), num_pieces, pairs)
+            )
+        matches.sort(key=lambda m: (-m.shared, m.path))
+        return matches
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,239 @@
+# source.torrentのファイル構成をもとに、本体ファイルからピースをメモリマップで読み出すモジュール
+# 標準ライブラリ
+from bisect import bisect_right
+import mmap
+import os
+import threading
+from typing import Iterator, Optional, Union
+
+# サードパーティライブラリ
+import bencodepy
+
+HASH_SIZE = 20  # SHA-1のハッシュ長（バイト）
+
+
+class PieceReader:
+    """
+    ピースのインデックスを、info内のファイルの順に並べた(ファイル, オフセット, 長さ)の
+    範囲に対応づけ、本体ファイルのメモリマップから読み出す。
+
+    ファイルは最初に参照した時点でマップし、closeまで保持する。1つのファイルに
+    収まるピースはコピーせずにmemoryviewで返すため、本体ファイルの大きさによらず
+    メモリ使用量は一定になる。with文で使うと、終了時にマップを閉じる。
+    """
+
+    def __init__(self, torrent_path: str, save_path: Optional[str] = None) -> None:
+        """
+        Parameters
+        ----------
+        torrent_path : str
+            .torrentファイルへのパス。
+        save_path : str
+            本体ファイルの保存先のパス。Noneの場合は.torrentファイルと同じフォルダ。
+        """
+        with open(torrent_path, "rb") as f:
+            info = bencodepy.decode(f.read())[b"info"]
+
+        self.save_path = save_path or os.path.dirname(torrent_path)
+        self.piece_length: int = info[b"piece length"]
+        self.hashes: bytes = info.get(b"pieces", b"")  # v2のみのtorrentでは空
+        name = info.get(b"name.utf-8", info[b"name"])
+        self.name = _decode_path([name])
+        self.root = os.path.join(self.save_path, self.name)  # 本体ファイル（フォルダ）のパス
+
+        # (ファイルパス, サイズ)のリスト。パディングファイルのパスはNone（内容はすべて0）
+        self.files: list[tuple[Optional[str], int]] = []
+        if b"files" in info:
+            for entry in info[b"files"]:
+                length = entry[b"length"]
+                if b"p" in entry.get(b"attr", b""):
+                    self.files.append((None, length))
+                    continue
+                path = _decode_path(entry.get(b"path.utf-8", entry[b"path"]))
+                self.files.append((os.path.join(self.root, path), length))
+        elif b"length" in info:
+            self.files.append((self.root, info[b"length"]))
+        else:
+            # v2のみのtorrentはfile treeだけを持ち、各ファイルはピースの境界から始まる
+            entries = list(_walk_file_tree(info[b"file tree"]))
+            single = len(entries) == 1 and entries[0][0] == [name]
+            for i, (parts, length) in enumerate(entries):
+                path = self.root if single else os.path.join(self.root, _decode_path(parts))
+                self.files.append((path, length))
+                if i < len(entries) - 1 and length % self.piece_length:
+                    self.files.append((None, self.piece_length - length % self.piece_length))
+
+        self._offsets: list[int] = []  # 各ファイルの、torrent全体での開始位置
+        offset = 0
+        for _, length in self.files:
+            self._offsets.append(offset)
+            offset += length
+        self.total_size = offset
+        self.num_pieces: int = -(-self.total_size // self.piece_length)
+
+        # ファイルのインデックス→memoryview（読めなければNone）
+        self._views: dict[int, Optional[memoryview]] = {}
+        self._handles: list = []  # (ファイルオブジェクト, mmap)
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "PieceReader":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.num_pieces
+
+    @property
+    def exists(self) -> bool:
+        """
+        本体ファイル（フォルダ）が存在するかどうか。
+        """
+        return os.path.exists(self.root)
+
+    def piece_hash(self, piece: int) -> bytes:
+        """
+        ピースのSHA-1ハッシュ（20バイト）を返す。
+        """
+        return self.hashes[piece * HASH_SIZE : (piece + 1) * HASH_SIZE]
+
+    def piece_size(self, piece: int) -> int:
+        """
+        ピースの長さを返す（最後のピースは短い場合がある）。
+        """
+        start = piece * self.piece_length
+        return max(0, min(self.piece_length, self.total_size - start))
+
+    def spans(self, piece: int) -> list[tuple[int, int, int]]:
+        """
+        ピースを構成する(ファイルのインデックス, ファイル内のオフセット, 長さ)のリストを返す。
+
+        Parameters
+        ----------
+        piece : int
+            ピースのインデックス。
+
+        Returns
+        -------
+        spans : list of (int, int, int)
+            info内のファイルの順に並べた範囲。長さ0のファイルは含まない。
+        """
+        if not 0 <= piece < self.num_pieces:
+            raise IndexError(f"ピースのインデックス {piece} が範囲外です。")
+        start = piece * self.piece_length
+        end = start + self.piece_size(piece)
+        spans = []
+        i = bisect_right(self._offsets, start) - 1
+        position = start
+        while position < end:
+            file_start = self._offsets[i]
+            span_end = min(end, file_start + self.files[i][1])
+            if span_end > position:
+                spans.append((i, position - file_start, span_end - position))
+            position = span_end
+            i += 1
+        return spans
+
+    def views(self, piece: int):
+        """
+        ピースを構成する各範囲のデータを、コピーせずに返す。
+
+        Returns
+        -------
+        views : list of memoryview or bytes, or None
+            範囲ごとのデータ（パディングファイルは0で埋めたbytes）。
+            ファイルが存在しない・サイズが足りない場合はNone。
+        """
+        views: list[Union[memoryview, bytes]] = []
+        for i, offset, length in self.spans(piece):
+            if self.files[i][0] is None:
+                views.append(bytes(length))
+                continue
+            view = self._view(i)
+            if view is None:
+                return None
+            views.append(view[offset : offset + length])
+        return views
+
+    def read(self, piece: int):
+        """
+        ピースのデータを返す。1つのファイルに収まるピースはコピーせずmemoryviewで返し、
+        ファイルの境界をまたぐピースは連結したbytesを返す。読めない場合はNone。
+        """
+        views = self.views(piece)
+        if views is None:
+            return None
+        if len(views) == 1:
+            return views[0]
+        return b"".join(views)
+
+    def open(self) -> "PieceReader":
+        """
+        すべてのファイルをあらかじめマップする（複数のスレッドから読み出す前に呼ぶ）。
+        """
+        for i, (path, length) in enumerate(self.files):
+            if path is not None and length > 0:
+                self._view(i)
+        return self
+
+    def close(self) -> None:
+        """
+        マップを閉じる。読み出したmemoryviewが残っている場合、そのマップは参照が
+        なくなった時点で解放される。
+        """
+        with self._lock:
+            for view in self._views.values():
+                if view is not None:
+                    view.release()
+            for f, mapped in self._handles:
+                try:
+                    mapped.close()
+                except BufferError:
+                    pass  # 呼び出し元がまだビューを保持している
+                f.close()
+            self._views.clear()
+            self._handles.clear()
+
+    def _view(self, i: int) -> Optional[memoryview]:
+        # ファイルのメモリマップのビューを返す（初回のみマップする）
+        if i in self._views:
+            return self._views[i]
+        with self._lock:
+            if i in self._views:
+                return self._views[i]
+            path, length = self.files[i]
+            view = None
+            f = None
+            if path is not None:
+                try:
+                    f = open(path, "rb")
+                except OSError:
+                    pass
+            if f is not None:
+                try:
+                    if os.fstat(f.fileno()).st_size < length:
+                        raise OSError("ファイルサイズが不足しています。")
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    f.close()
+                else:
+                    self._handles.append((f, mapped))
+                    view = memoryview(mapped)
+            self._views[i] = view
+            return view
+
+
+def _walk_file_tree(
+    tree: dict, parts: Optional[list[bytes]] = None
+) -> Iterator[tuple[list[bytes], int]]:
+    # v2のfile treeを辿り、(パスの各要素, サイズ)をinfo内の順に返す
+    for key, value in tree.items():
+        if key == b"":
+            yield parts or [], value[b"length"]
+        else:
+            yield from _walk_file_tree(value, (parts or []) + [key])
+
+
+def _decode_path(parts: list[bytes]) -> str:
+    return os.path.join(*(p.decode("utf-8", errors="replace") for p in parts))
@@ -0,0 +1,136 @@
+# source.torrentのSHA-1ピースハッシュをもとに、ダウンロード済みの本体ファイルを検証するモジュール
+# 標準ライブラリ
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import time
+from typing import Optional
+
+# 独自モジュール
+from utils.piece_reader import PieceReader
+
+
+class VerificationResult:
+    """
+    ピースごとの検証結果。
+
+    piecesの各要素は、ハッシュが一致すればTrue、一致しなければFalse、
+    本体ファイルが存在しない・サイズが足りないなどで検証できなければNone。
+    """
+
+    __slots__ = ("pieces", "bytes_hashed", "elapsed")
+
+    def __init__(self, pieces: list[Optional[bool]], bytes_hashed: int, elapsed: float) -> None:
+        self.pieces = pieces
+        self.bytes_hashed = bytes_hashed
+        self.elapsed = elapsed
+
+    def __len__(self) -> int:
+        return len(self.pieces)
+
+    @property
+    def complete(self) -> bool:
+        """
+        すべてのピースのハッシュが一致したかどうか。
+        """
+        return all(ok is True for ok in self.pieces)
+
+    @property
+    def failed(self) -> list[int]:
+        # ハッシュが一致しなかったピースのインデックス
+        return [i for i, ok in enumerate(self.pieces) if ok is False]
+
+    @property
+    def missing(self) -> list[int]:
+        # 検証できなかったピースのインデックス
+        return [i for i, ok in enumerate(self.pieces) if ok is None]
+
+    @property
+    def mbps(self) -> float:
+        """
+        ハッシュ計算のスループット（MB/s）。
+        """
+        if self.elapsed <= 0:
+            return 0.0
+        return self.bytes_hashed / 1048576 / self.elapsed
+
+    def __repr__(self) -> str:
+        return (
+            f"VerificationResult({len(self.pieces)} pieces, failed={len(self.failed)}, "
+            f"missing={len(self.missing)}, {self.mbps:.1f} MB/s)"
+        )
+
+
+class PieceVerifier:
+    """
+    本体ファイルをPieceReaderのメモリマップで読み、ピースのSHA-1ハッシュを
+    スレッドプールで並列に計算する。
+
+    hashlibはハッシュ計算中にGILを解放するため、スレッドでも全コアを使える。
+    ファイルの境界をまたぐピースも、各ファイルの範囲をコピーせずに順に読み込む。
+    """
+
+    def __init__(
+        self, torrent_path: str, save_path: Optional[str] = None, workers: Optional[int] = None
+    ) -> None:
+        """
+        Parameters
+        ----------
+        torrent_path : str
+            .torrentファイルへのパス。
+        save_path : str
+            本体ファイルの保存先のパス。Noneの場合は.torrentファイルと同じフォルダ。
+        workers : int
+            ハッシュ計算に使うスレッド数。Noneの場合はCPUのコア数。
+        """
+        self.reader = PieceReader(torrent_path, save_path)
+        if not self.reader.hashes:
+            raise ValueError(f"{torrent_path} にSHA-1のピースハッシュがありません。")
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.num_pieces = self.reader.num_pieces
+
+    def verify(self, pieces=None) -> VerificationResult:
+        """
+        本体ファイルのピースを検証する。
+
+        Parameters
+        ----------
+        pieces : iterable of int
+            検証するピースのインデックス。Noneの場合はすべてのピース。
+
+        Returns
+        -------
+        result : VerificationResult
+            ピースごとの結果とスループット。指定しなかったピースはNone。
+        """
+        targets = list(range(self.num_pieces) if pieces is None else sorted(set(pieces)))
+        results: list[Optional[bool]] = [None] * self.num_pieces
+        started = time.perf_counter()
+        hashed = 0
+
+        with self.reader.open():
+            # スレッドごとの受け渡しの回数を抑えるため、ピースをまとめて割り当てる
+            chunk = max(1, len(targets) // (self.workers * 4))
+            batches = [targets[i : i + chunk] for i in range(0, len(targets), chunk)]
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for batch in executor.map(self._hash_batch, batches):
+                    for piece, ok, size in batch:
+                        results[piece] = ok
+                        hashed += size
+
+        return VerificationResult(results, hashed, time.perf_counter() - started)
+
+    def _hash_batch(self, batch: list[int]) -> list[tuple[int, Optional[bool], int]]:
+        results: list[tuple[int, Optional[bool], int]] = []
+        for piece in batch:
+            views = self.reader.views(piece)
+            if views is None:
+                results.append((piece, None, 0))
+                continue
+            sha1 = hashlib.sha1()
+            for view in views:
+                sha1.update(view)
+            del views  # マップを閉じられるよう、ビューを手放す
+            ok = sha1.digest() == self.reader.piece_hash(piece)
+            results.append((piece, ok, self.reader.piece_size(piece)))
+        return results
@@ -0,0 +1,192 @@
+# 自分自身のグローバルIPアドレス（IPv4/IPv6）を取得し、有効期限付きでキャッシュするモジュール
+# 標準ライブラリ
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+# サードパーティライブラリ
+import requests
+from requests.exceptions import RequestException
+
+# 独自モジュール
+from utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IPV4_URL = "https://api.ipify.org?format=json"
+DEFAULT_IPV6_URL = "https://api6.ipify.org?format=json"
+
+
+class PublicIPService:
+    """
+    グローバルIPアドレスを有効期限（TTL）付きで保持し、必要に応じてバックグラウンドで更新する。
+    アドレスが変わった場合は、subscribeで登録されたコールバックに通知する。
+    """
+
+    def __init__(
+        self,
+        ipv4_url: str = DEFAULT_IPV4_URL,
+        ipv6_url: str = DEFAULT_IPV6_URL,
+        ttl: float = 300,
+        timeout: float = 10,
+        retry_interval: float = 30,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        ipv4_url : str
+            IPv4アドレスを{"ip": ...}形式のJSONで返すエンドポイント。
+        ipv6_url : str
+            IPv6アドレスを{"ip": ...}形式のJSONで返すエンドポイント。
+        ttl : float
+            取得したアドレスを再利用する秒数。
+        timeout : float
+            1回の問い合わせのタイムアウト秒数。
+        retry_interval : float
+            問い合わせに失敗した場合に、ttlを待たずに問い合わせ直すまでの秒数。
+        """
+        self.urls = {4: ipv4_url, 6: ipv6_url}
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.ipv4: Optional[str] = None
+        self.ipv6: Optional[str] = None
+        self.fetched_at = 0.0  # 最後に取得した時刻（time.monotonic）
+        self.failed = False  # 最後の問い合わせで、取得できるはずのアドレスを取得できなかったか
+        self._subscribers: list = []
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self) -> tuple[Optional[str], Optional[str]]:
+        """
+        現在のIPv4とIPv6アドレスを返す。有効期限切れの場合のみ問い合わせを行う。
+
+        Returns
+        -------
+        tuple:
+            現在のIPv4, IPv6アドレスのタプル。取得できなかったものはNone。
+        """
+        # 他のスレッドが更新中であれば、その結果を待って再利用する
+        with self._refresh_lock:
+            with self._lock:
+                age = time.monotonic() - self.fetched_at
+                if self.fetched_at and age < self._expiry():
+                    return self.ipv4, self.ipv6
+            return self.refresh()
+
+    def refresh(self) -> tuple[Optional[str], Optional[str]]:
+        """
+        IPv4とIPv6アドレスを並行して問い合わせ、キャッシュを更新する。
+        取得に失敗した場合は、前回取得したアドレスを引き続き使い、retry_interval秒後に問い合わせ直す。
+        """
+        with self._refresh_lock:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                ipv4_future = executor.submit(self._fetch, 4)
+                ipv6_future = executor.submit(self._fetch, 6)
+                ipv4, ipv6 = ipv4_future.result(), ipv6_future.result()
+
+            with self._lock:
+                old = (self.ipv4, self.ipv6)
+                # 取得済みのアドレスを取得できなかった場合や、どちらも取得できなかった場合は失敗とする
+                # （IPv6を使えない環境では、IPv6の失敗だけでは失敗としない）
+                self.failed = (ipv4, ipv6) == (None, None) or any(
+                    new is None and prev is not None for new, prev in zip((ipv4, ipv6), old)
+                )
+                if ipv4 is not None:
+                    self.ipv4 = ipv4
+                if ipv6 is not None:
+                    self.ipv6 = ipv6
+                self.fetched_at = time.monotonic()
+                current = (self.ipv4, self.ipv6)
+                subscribers = list(self._subscribers)
+
+            if current != old:
+                logger.info(f"グローバルIPアドレスを更新しました: {current[0]}, {current[1]}")
+                for callback in subscribers:
+                    try:
+                        callback(*current)
+                    except Exception as e:
+                        logger.warning(f"IPアドレス変更の通知中に例外が発生: {e}")
+
+            return current
+
+    def subscribe(self, callback) -> None:
+        """
+        アドレスが変わったときに呼び出すコールバックを登録する。
+
+        Parameters
+        ----------
+        callback : callable
+            callback(ipv4, ipv6)の形で呼び出される。バックグラウンドのスレッドから
+            呼ばれる場合がある。
+        """
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def start(self) -> None:
+        """
+        TTLごとにアドレスを更新するバックグラウンドスレッドを開始する。
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            thread = threading.Thread(target=self._run, daemon=True)
+            self._thread = thread
+            thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self.refresh()
+            with self._lock:
+                interval = self._expiry()
+            self._stop_event.wait(interval)
+
+    def _expiry(self) -> float:
+        # 失敗した結果は、ttlより短いretry_interval秒だけ再利用する
+        return min(self.ttl, self.retry_interval) if self.failed else self.ttl
+
+    def _fetch(self, version: int):
+        try:
+            response = requests.get(self.urls[version], timeout=self.timeout)
+            response.raise_for_status()
+            return response.json().get("ip")
+        except (RequestException, ValueError) as e:
+            logger.warning(f"IPv{version}の取得に失敗しました: {e}")
+            return None
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_public_ip_service() -> PublicIPService:
+    """
+    設定ファイルのエンドポイントとTTLで生成した、プロセス内で共有のPublicIPServiceを返す。
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            con = Config(base_path=current_dir, level=1)
+            _service = PublicIPService(
+                con.PUBLIC_IPV4_URL, con.PUBLIC_IPV6_URL, con.PUBLIC_IP_TTL
+            )
+        return _service
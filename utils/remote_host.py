@@ -0,0 +1,137 @@
+# リモートホスト名からプロバイダ名を判定する対応表（remote_host.csv）を索引化するモジュール
+# 標準ライブラリ
+from collections import deque
+import csv
+import logging
+import os
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderMatcher:
+    """
+    remote_host.csvの各行（ホスト名の一部, プロバイダ名）から、Aho–Corasick法の
+    オートマトンを構築する。ホスト名の長さに比例する時間で、ホスト名に含まれる
+    パターンのうちファイル上で最初の行のプロバイダ名を返す。
+    """
+
+    def __init__(self, rows=()) -> None:
+        """
+        Parameters
+        ----------
+        rows : iterable of (str, str)
+            (ホスト名に含まれる文字列, プロバイダ名)の組。先に現れたものほど優先される。
+        """
+        self.providers: list[str] = []
+        self._goto: list[dict[str, int]] = [{}]  # ノード→(文字→次のノード)
+        self._fail: list[int] = [0]
+        self._best: list[int] = [-1]  # ノードで一致する（失敗リンク先を含む）最も先の行番号
+        self._empty = -1  # 空文字のパターンはすべてのホスト名に一致する
+
+        for pattern, provider in rows:
+            index = len(self.providers)
+            self.providers.append(provider)
+            if pattern == "":
+                if self._empty < 0:
+                    self._empty = index
+                continue
+            self._insert(pattern, index)
+
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self.providers)
+
+    def match(self, remote_host: str):
+        """
+        ホスト名に対応するプロバイダ名を返す。
+
+        Returns
+        -------
+        provider : str or None
+            一致するパターンがない場合はNone。
+        """
+        best = self._empty
+        node = 0
+        for char in remote_host:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            found = self._best[node]
+            if found >= 0 and (best < 0 or found < best):
+                best = found
+                if best == 0:
+                    break
+        return self.providers[best] if best >= 0 else None
+
+    def _insert(self, pattern: str, index: int) -> None:
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(-1)
+            node = next_node
+        if self._best[node] < 0:
+            self._best[node] = index
+
+    def _build(self) -> None:
+        # 幅優先で失敗リンクを張り、失敗リンク先で一致する行番号も引き継ぐ
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                inherited = self._best[self._fail[child]]
+                if inherited >= 0 and (
+                    self._best[child] < 0 or inherited < self._best[child]
+                ):
+                    self._best[child] = inherited
+                queue.append(child)
+
+
+class ProviderTable:
+    """
+    remote_host.csvから構築したProviderMatcherを、ファイルの更新時刻が変わるまで保持する。
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._signature: Optional[int] = None
+        self._matcher = ProviderMatcher()
+
+    def get_matcher(self) -> ProviderMatcher:
+        with self._lock:
+            signature: Optional[int]
+            try:
+                signature = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                signature = None
+
+            if signature != self._signature:
+                self._matcher = ProviderMatcher(_read_rows(self.path))
+                self._signature = signature
+                logger.info(f"リモートホストの対応表を読み込みました（{len(self._matcher)} 件）。")
+            return self._matcher
+
+    def match(self, remote_host: str):
+        """
+        ホスト名に対応するプロバイダ名を返す。一致するものがなければNone。
+        """
+        return self.get_matcher().match(remote_host)
+
+
+def _read_rows(path: str) -> list[tuple[str, str]]:
+    if not os.path.exists(path):
+        return []
+    with open(path, mode="r", encoding="utf-8") as file:
+        return [(row[0], row[1]) for row in csv.reader(file) if len(row) >= 2]
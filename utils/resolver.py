@@ -0,0 +1,278 @@
+# ホスト名の名前解決・IPアドレスの逆引きを並行して行い、結果を有効期限付きでキャッシュするモジュール
+# 標準ライブラリ
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait
+import ipaddress
+import logging
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HostResolver:
+    """
+    複数のホスト名を並行して名前解決し、成功・失敗の結果をプロセス内でキャッシュする。
+
+    getaddrinfoはDNSのTTLを返さないため、成功時はpositive_ttl秒、
+    失敗・タイムアウト時はnegative_ttl秒のあいだ結果を再利用する。
+    """
+
+    def __init__(
+        self,
+        positive_ttl: float = 3600,
+        negative_ttl: float = 300,
+        timeout: float = 5,
+        max_workers: int = 8,
+        backend=socket.getaddrinfo,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        positive_ttl : float
+            解決に成功した結果を再利用する秒数。
+        negative_ttl : float
+            解決に失敗した結果を再利用する秒数。
+        timeout : float
+            1件の名前解決を待つ最大秒数。
+        max_workers : int
+            同時に実行する名前解決の数。
+        backend : callable
+            socket.getaddrinfoと同じ形式で呼び出せる名前解決の関数。
+        """
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="resolver"
+        )
+        self._cache: dict[str, tuple[float, list[str]]] = {}  # ホスト名→(有効期限, IPアドレス)
+        self._lock = threading.Lock()
+
+    def resolve(self, hostname: str) -> list[str]:
+        """
+        1つのホスト名を名前解決する。
+
+        Returns
+        -------
+        addresses : list of str
+            IPアドレスのリスト。解決できなかった場合は空のリスト。
+        """
+        return self.resolve_many([hostname]).get(hostname, [])
+
+    def resolve_many(self, hostnames) -> dict[str, list[str]]:
+        """
+        複数のホスト名をまとめて名前解決する。キャッシュにないものだけを並行して問い合わせ、
+        全体でtimeout秒を超えて応答のないものは失敗として扱う。
+
+        Parameters
+        ----------
+        hostnames : iterable of str
+            名前解決するホスト名。Noneや空文字は無視する。
+
+        Returns
+        -------
+        results : dict
+            ホスト名をキー、IPアドレスのリストを値とする辞書。
+        """
+        results: dict[str, list[str]] = {}
+        pending = []
+        now = time.monotonic()
+
+        with self._lock:
+            for hostname in dict.fromkeys(h for h in hostnames if h):
+                cached = self._cache.get(hostname)
+                if cached is not None and cached[0] > now:
+                    results[hostname] = cached[1]
+                else:
+                    pending.append(hostname)
+
+        if not pending:
+            return results
+
+        futures = {
+            self._executor.submit(self._lookup, hostname): hostname
+            for hostname in pending
+        }
+        done, _ = wait(futures, timeout=self.timeout)
+
+        for future, hostname in futures.items():
+            addresses = []
+            if future in done:
+                addresses = future.result()
+            else:
+                logger.info(f"{hostname} の名前解決がタイムアウトしました。")
+            results[hostname] = addresses
+            self._store(hostname, addresses)
+
+        return results
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def _lookup(self, hostname: str) -> list[str]:
+        try:
+            addr_infos = self.backend(hostname, None)
+        except OSError:
+            # ホスト名を解決できない場合
+            return []
+        # 重複を除きつつ、得られた順序を保つ
+        return list(dict.fromkeys(sockaddr[0] for *_, sockaddr in addr_infos))
+
+    def _store(self, hostname: str, addresses: list[str]) -> None:
+        ttl = self.positive_ttl if addresses else self.negative_ttl
+        with self._lock:
+            self._cache[hostname] = (time.monotonic() + ttl, addresses)
+
+
+def _gethostbyaddr(ip: str) -> str:
+    return socket.gethostbyaddr(ip)[0]
+
+
+class ReverseResolver:
+    """
+    IPアドレスの逆引き（PTRレコードの取得）を、同時実行数を制限しながら非同期に行う。
+    結果はHostResolverと同様に、成功・失敗それぞれの有効期限付きでキャッシュする。
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 16,
+        timeout: float = 5,
+        positive_ttl: float = 3600,
+        negative_ttl: float = 300,
+        backend=_gethostbyaddr,
+        queue_timeout: float = 30,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        concurrency : int
+            同時に実行する逆引きの数。
+        timeout : float
+            1件の逆引きを待つ最大秒数。
+        positive_ttl : float
+            逆引きに成功した結果を再利用する秒数。
+        negative_ttl : float
+            逆引きに失敗した結果を再利用する秒数。
+        backend : callable
+            IPアドレスを受け取りホスト名を返す関数、またはコルーチン関数。
+            解決できない場合はOSErrorを送出する。
+        queue_timeout : float
+            同期的なbackendの場合に、逆引きを実行するスレッドの空きを待つ最大秒数。
+        """
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = timeout
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.backend = backend
+        self.queue_timeout = queue_timeout
+        self._async_backend = asyncio.iscoroutinefunction(
+            backend
+        ) or asyncio.iscoroutinefunction(getattr(backend, "__call__", None))
+        # タイムアウトしたgethostbyaddrは中断できないため、スレッド数の上限を設ける
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="reverse-resolver"
+        )
+        self._cache: dict[str, tuple[float, str]] = {}  # IPアドレス→(有効期限, ホスト名)
+        self._lock = threading.Lock()
+
+    async def resolve(self, ip: str):
+        """
+        1つのIPアドレスを逆引きする。
+
+        Returns
+        -------
+        host_name : str or None
+            ホスト名。解決できなかった場合はNone。
+        """
+        return (await self.resolve_many([ip])).get(ip)
+
+    async def resolve_many(self, ips) -> dict:
+        """
+        複数のIPアドレスをまとめて逆引きする。キャッシュにないものだけを、
+        同時実行数concurrencyの範囲で並行して問い合わせる。
+
+        Parameters
+        ----------
+        ips : iterable of str
+            逆引きするIPアドレス。
+
+        Returns
+        -------
+        results : dict
+            IPアドレスをキー、ホスト名（解決できなかった場合はNone）を値とする辞書。
+        """
+        results = {}
+        pending = []
+        now = time.monotonic()
+
+        with self._lock:
+            for ip in dict.fromkeys(ips):
+                cached = self._cache.get(ip)
+                if cached is not None and cached[0] > now:
+                    results[ip] = cached[1]
+                else:
+                    pending.append(ip)
+
+        if pending:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            host_names = await asyncio.gather(
+                *(self._lookup(ip, semaphore) for ip in pending)
+            )
+            for ip, host_name in zip(pending, host_names):
+                results[ip] = host_name
+                ttl = self.positive_ttl if host_name else self.negative_ttl
+                with self._lock:
+                    self._cache[ip] = (time.monotonic() + ttl, host_name)
+
+        return results
+
+    def resolve_many_sync(self, ips) -> dict:
+        """
+        resolve_manyを同期的に実行する。イベントループが動いていないスレッドから呼び出す。
+        """
+        return asyncio.run(self.resolve_many(ips))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    async def _lookup(self, ip: str, semaphore: asyncio.Semaphore):
+        try:
+            ipaddress.ip_address(ip)
+        except ValueError:
+            logger.warning(f"{ip} はIPアドレスとして不正な形式です。")
+            return None
+
+        async with semaphore:
+            try:
+                if self._async_backend:
+                    query = self.backend(ip)
+                else:
+                    loop = asyncio.get_running_loop()
+                    started = asyncio.Event()
+
+                    def run():
+                        loop.call_soon_threadsafe(started.set)
+                        return self.backend(ip)
+
+                    query = loop.run_in_executor(self._executor, run)
+                    # タイムアウトしたスレッドが空くまでの待ち時間は、タイムアウトに含めない
+                    # （ただし、スレッドが空かないまま待ち続けないようqueue_timeout秒で打ち切る）
+                    try:
+                        await asyncio.wait_for(started.wait(), self.queue_timeout)
+                    except asyncio.TimeoutError:
+                        query.cancel()
+                        logger.info(f"{ip} の逆引きを開始できませんでした。")
+                        return None
+                return await asyncio.wait_for(query, self.timeout) or None
+            except asyncio.TimeoutError:
+                logger.info(f"{ip} の逆引きがタイムアウトしました。")
+                return None
+            except OSError:
+                # PTRレコードがない場合など
+                return None
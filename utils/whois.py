@@ -0,0 +1,468 @@
+# JPNIC WHOISへの問い合わせを間隔制限つきで行い、割り振りブロック単位でプロバイダ名を永続的にキャッシュするモジュール
+# 標準ライブラリ
+import asyncio
+from concurrent.futures import Future, as_completed
+import ipaddress
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WHOIS_SERVER = "whois.nic.ad.jp"
+WHOIS_CACHE_FILE = "whois_cache.sqlite3"  # 設定フォルダに作成するキャッシュのファイル名
+FAILED_UNKNOWN = "取得失敗（不明）"
+FAILED_NOT_JPNIC = "取得失敗(JPNIC管理外)"
+
+
+def parse_whois_reply(
+    text: str, ip: Optional[str] = None
+) -> tuple[str, Optional[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]]:
+    """
+    JPNIC WHOISの応答から組織名とネットワークアドレスを取り出す。
+
+    Parameters
+    ----------
+    text : str
+        デコード済みのWHOISの応答。
+    ip : str
+        問い合わせたIPアドレス。指定した場合、このアドレスを含まないネットワークは無視する。
+
+    Returns
+    -------
+    provider : str
+        組織名（「株式会社」は削除）。取得できなかった場合は「取得失敗」から始まる文字列。
+    network : IPv4Network, IPv6Network or None
+        割り振りブロックのうち、問い合わせたアドレスを含む最も狭いもの。
+    """
+    match = re.search(r"\[組織名\]\s+(.+)", text)
+    if match:
+        provider = match.group(1).strip()
+        if provider == "":
+            provider = FAILED_UNKNOWN
+        else:
+            # '株式会社'を含む場合は削除する
+            provider = provider.replace("株式会社", "")
+    else:
+        provider = FAILED_NOT_JPNIC
+
+    try:
+        target = ipaddress.ip_address(ip) if ip else None
+    except ValueError:
+        target = None
+    network = None
+    for value in re.findall(r"\[(?:IP)?ネットワークアドレス\]\s+(\S+)", text):
+        for candidate in _parse_network(value):
+            if target is not None and (
+                candidate.version != target.version or target not in candidate
+            ):
+                continue
+            if network is None or candidate.prefixlen > network.prefixlen:
+                network = candidate
+
+    return provider, network
+
+
+def _parse_network(value: str) -> list:
+    # 「192.0.2.0/24」形式と「192.0.2.0-192.0.2.127」形式の両方に対応する
+    try:
+        if "-" in value:
+            first, last = value.split("-", 1)
+            return list(
+                ipaddress.summarize_address_range(
+                    ipaddress.ip_address(first.strip()), ipaddress.ip_address(last.strip())
+                )
+            )
+        return [ipaddress.ip_network(value, strict=False)]
+    except (ValueError, TypeError):
+        return []
+
+
+class WhoisCache:
+    """
+    WHOISで得たプロバイダ名を、割り振りブロック（IPアドレスの範囲）単位でSQLiteに保存する。
+    同じブロックに属する別のIPアドレスは、WHOISに問い合わせずにキャッシュから解決できる。
+
+    範囲の始端・終端はゼロ埋めした16進数の文字列で保存し、文字列の大小比較が
+    アドレスの大小と一致するようにしている。
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        failure_ttl: float = 7 * 24 * 3600,
+        ipv4_prefix: int = 24,
+        ipv6_prefix: int = 48,
+        ipv4_failure_prefix: int = 32,
+        ipv6_failure_prefix: int = 64,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        db_path : str
+            SQLiteのデータベースファイルのパス。
+        failure_ttl : float
+            取得に失敗した結果（JPNIC管理外など）を再利用する秒数。
+        ipv4_prefix, ipv6_prefix : int
+            応答からネットワークアドレスを読み取れなかった場合に、成功した結果を
+            まとめる範囲のプレフィックス長。
+        ipv4_failure_prefix, ipv6_failure_prefix : int
+            取得に失敗した結果をまとめる範囲のプレフィックス長。
+        """
+        self.db_path = db_path
+        self.failure_ttl = failure_ttl
+        self.prefixes = {
+            (4, False): ipv4_prefix,
+            (6, False): ipv6_prefix,
+            (4, True): ipv4_failure_prefix,
+            (6, True): ipv6_failure_prefix,
+        }
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS whois_blocks (
+                    version INTEGER NOT NULL,
+                    start TEXT NOT NULL,
+                    end TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    failed INTEGER NOT NULL,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (version, start, end)
+                )
+                """
+            )
+
+    def lookup(self, ip: str):
+        """
+        IPアドレスを含むブロックのプロバイダ名を返す。
+
+        Returns
+        -------
+        provider : str or None
+            キャッシュにない、または失敗の記録が期限切れの場合はNone。
+        """
+        try:
+            ip_obj = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+
+        value = _to_hex(ip_obj.version, int(ip_obj))
+        with self._lock:
+            # 入れ子になったブロックがある場合は、最も狭い（始端が大きく終端が小さい）ものを使う
+            row = self._conn.execute(
+                """
+                SELECT provider, failed, updated FROM whois_blocks
+                WHERE version = ? AND start <= ? AND end >= ?
+                ORDER BY start DESC, end ASC LIMIT 1
+                """,
+                (ip_obj.version, value, value),
+            ).fetchone()
+
+        if row is None:
+            return None
+        provider, failed, updated = row
+        if failed and time.time() - updated > self.failure_ttl:
+            return None
+        return provider
+
+    def store(self, ip: str, provider: str, network=None, failed: bool = False):
+        """
+        WHOISの結果を保存する。
+
+        Parameters
+        ----------
+        ip : str
+            問い合わせたIPアドレス。
+        provider : str
+            プロバイダ名、または「取得失敗」から始まる文字列。
+        network : IPv4Network or IPv6Network
+            応答から読み取った割り振りブロック。Noneの場合はプレフィックス長の設定でまとめる。
+        failed : bool
+            取得に失敗した結果の場合はTrue。
+
+        Returns
+        -------
+        network : IPv4Network or IPv6Network
+            保存したブロック。
+        """
+        ip_obj = ipaddress.ip_address(ip)
+        if failed or network is None or ip_obj not in network:
+            prefix = self.prefixes[(ip_obj.version, failed)]
+            network = ipaddress.ip_network(f"{ip_obj}/{prefix}", strict=False)
+
+        version = network.version
+        start = _to_hex(version, int(network.network_address))
+        end = _to_hex(version, int(network.broadcast_address))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO whois_blocks VALUES (?, ?, ?, ?, ?, ?)",
+                (version, start, end, provider, int(failed), time.time()),
+            )
+        return network
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _to_hex(version: int, value: int) -> str:
+    # IPv4は8桁、IPv6は32桁の16進数
+    return format(value, "08x" if version == 4 else "032x")
+
+
+class _TokenBucket:
+    # rate件/秒で補充され、最大burst件まで貯められるトークンバケット
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class WhoisScheduler:
+    """
+    すべてのtorrentからのWHOIS問い合わせを1つのキューで受け付け、専用スレッドの
+    イベントループ上で、トークンバケットによる間隔制限のもとで順に問い合わせる。
+
+    - 同じIPアドレスの問い合わせが処理中であれば、同じFutureを返して1回にまとめる。
+    - サーバーに接続を拒否・リセットされた場合は待機時間を倍々に延ばし、再試行する。
+    - cacheを指定した場合、同じ割り振りブロックが記録済みのIPアドレスは問い合わせない。
+    """
+
+    def __init__(
+        self,
+        host: str = DEFAULT_WHOIS_SERVER,
+        port: int = 43,
+        interval: float = 5,
+        burst: int = 1,
+        timeout: float = 10,
+        cache: Optional[WhoisCache] = None,
+        max_retries: int = 3,
+        initial_backoff: float = 10,
+        max_backoff: float = 600,
+        encoding: str = "iso-2022-jp",
+    ) -> None:
+        """
+        Parameters
+        ----------
+        host : str
+            WHOISサーバーのホスト名。
+        port : int
+            WHOISサーバーのポート番号。
+        interval : float
+            問い合わせの平均間隔（秒）。
+        burst : int
+            間隔を空けずに続けて問い合わせてよい件数。
+        timeout : float
+            1回の問い合わせのタイムアウト秒数。
+        cache : WhoisCache
+            結果を記録・再利用するキャッシュ。
+        max_retries : int
+            拒否された問い合わせを再試行する回数。
+        initial_backoff, max_backoff : float
+            拒否された後に問い合わせを止める秒数の初期値と上限。
+        encoding : str
+            応答の文字コード。
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cache = cache
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.encoding = encoding
+        self.backoff = 0.0  # 現在の待機時間（拒否されるたびに倍増し、成功すると半減する）
+        self._bucket = _TokenBucket(1 / interval if interval > 0 else float("inf"), burst)
+        self._resume_at = 0.0  # この時刻（time.monotonic）まで問い合わせを止める
+        self._inflight: dict[str, Future[str]] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue[Optional[str]]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    def submit(self, ip: str) -> "Future[str]":
+        """
+        IPアドレスの問い合わせを予約する。
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            プロバイダ名（取得できなかった場合は「取得失敗」から始まる文字列）を結果に持つ。
+        """
+        with self._lock:
+            inflight = self._inflight.get(ip)
+            if inflight is not None:
+                return inflight
+
+            future: Future[str] = Future()
+            cached = self.cache.lookup(ip) if self.cache is not None else None
+            if cached is not None:
+                future.set_result(cached)
+                return future
+
+            self._inflight[ip] = future
+
+        loop, queue = self.start()
+        loop.call_soon_threadsafe(queue.put_nowait, ip)
+        return future
+
+    def lookup(self, ip: str) -> str:
+        """
+        1つのIPアドレスを問い合わせ、結果を待って返す。
+        """
+        return self.submit(ip).result()
+
+    def lookup_many(self, ips, callback=None) -> dict:
+        """
+        複数のIPアドレスをまとめて予約し、すべての結果を待つ。
+
+        Parameters
+        ----------
+        ips : iterable of str
+            問い合わせるIPアドレス。
+        callback : callable
+            結果が得られたものから順にcallback(ip, provider)の形で呼び出される。
+
+        Returns
+        -------
+        results : dict
+            IPアドレスをキー、プロバイダ名を値とする辞書。
+        """
+        futures = {self.submit(ip): ip for ip in dict.fromkeys(ips)}
+        results = {}
+        for future in as_completed(futures):
+            ip = futures[future]
+            results[ip] = future.result()
+            if callback is not None:
+                callback(ip, results[ip])
+        return results
+
+    def start(self) -> tuple[asyncio.AbstractEventLoop, "asyncio.Queue[Optional[str]]"]:
+        """
+        問い合わせを処理するスレッドを開始する。submitから自動的に呼び出される。
+
+        Returns
+        -------
+        (loop, queue) : (AbstractEventLoop, asyncio.Queue)
+            スレッドのイベントループと、問い合わせを受け付けるキュー。
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._ready.clear()
+                thread = threading.Thread(target=self._run, daemon=True)
+                self._thread = thread
+                thread.start()
+        self._ready.wait()
+        assert self._loop is not None and self._queue is not None
+        return self._loop, self._queue
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, loop = self._thread, self._loop
+            self._thread = None
+        if thread is None or loop is None or self._queue is None:
+            return
+        loop.call_soon_threadsafe(self._queue.put_nowait, None)
+        thread.join()
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        queue: asyncio.Queue[Optional[str]] = asyncio.Queue()
+        self._loop, self._queue = loop, queue
+        self._ready.set()
+        try:
+            loop.run_until_complete(self._worker(queue))
+        finally:
+            loop.close()
+
+    async def _worker(self, queue: "asyncio.Queue[Optional[str]]") -> None:
+        while True:
+            ip = await queue.get()
+            if ip is None:
+                break
+
+            # 待っている間に、同じブロックの別のIPアドレスの結果が記録されていれば使う
+            provider = self.cache.lookup(ip) if self.cache is not None else None
+            if provider is None:
+                provider = await self._query_with_retry(ip)
+            self._resolve(ip, provider)
+
+        # 停止時に残っている問い合わせは失敗として返す
+        with self._lock:
+            inflight, self._inflight = self._inflight, {}
+        for future in inflight.values():
+            if not future.done():
+                future.set_result("取得失敗（中断）")
+
+    async def _query_with_retry(self, ip: str) -> str:
+        for attempt in range(self.max_retries + 1):
+            wait = self._resume_at - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self._bucket.acquire()
+
+            try:
+                reply = await self._query(ip)
+            except (ConnectionResetError, ConnectionRefusedError):
+                self.backoff = min(
+                    self.max_backoff, max(self.initial_backoff, self.backoff * 2)
+                )
+                self._resume_at = time.monotonic() + self.backoff
+                logger.warning(
+                    f"プロバイダ取得エラー：Whoisサーバーに拒否されました。{self.backoff:.0f} 秒待機します。"
+                )
+                continue
+            except (OSError, asyncio.TimeoutError) as e:
+                logger.warning(f"プロバイダ取得エラー：ソケットエラーが発生しました: {e}")
+                return "取得失敗（ソケットエラー）"
+
+            self.backoff /= 2
+            provider, network = parse_whois_reply(reply, ip)
+            if self.cache is not None:
+                # 応答に含まれる割り振りブロック単位で記録する（一時的な失敗は記録しない）
+                self.cache.store(ip, provider, network, failed=provider.startswith("取得失敗"))
+            return provider
+
+        return "取得失敗（Whoisサーバーからの拒否）"
+
+    async def _query(self, ip: str) -> str:
+        async def exchange() -> bytes:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                writer.write((ip + "\r\n").encode("utf-8"))
+                await writer.drain()
+                return await reader.read()
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except OSError:
+                    # 接続がリセットされた場合は、既に閉じられている
+                    pass
+
+        data = await asyncio.wait_for(exchange(), self.timeout)
+        return data.decode(self.encoding, "ignore")
+
+    def _resolve(self, ip: str, provider: str) -> None:
+        with self._lock:
+            future = self._inflight.pop(ip, None)
+        if future is not None and not future.done():
+            future.set_result(provider)